@@ -0,0 +1,121 @@
+"""Calibração de câmera: coeficientes e mapas de correção de distorção.
+
+Não depende de ``torch``/``ultralytics``, então pode ser usado tanto pelo
+engine quanto pelos caminhos que não carregam modelo (re-corte de jobs).
+
+Os mapas de correção são calculados uma única vez por (hash do arquivo de
+calibração, resolução, escala) e ficam em disco (``<dir da calibração>/maps``,
+ou ``UNDISTORT_MAPS_DIR``) como arrays ``.npy`` em ponto fixo (``CV_16SC2``),
+abertos com ``mmap``: jobs, workers do pool e shards com a mesma câmera dividem
+as mesmas páginas em memória e não recalculam nada.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from file_lock import locked
+
+# The undistorted frame is 10% larger than the source so the corners are not cropped
+UNDISTORT_SCALE = 1.1
+UNDISTORT_MAPS_DIR = os.environ.get("UNDISTORT_MAPS_DIR")
+# What the detector sees on calibrated jobs: "lowres" undistorts a small copy of each
+# sample, "raw" skips the remap and maps the detected boxes through the calibration
+UNDISTORT_MODES = ("lowres", "raw")
+
+
+def load_coefficients(path):
+    """ Loads camera matrix and distortion coefficients. """
+    # FILE_STORAGE_READ
+    cv_file = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+
+    # note we also have to specify the type to retrieve other wise we only get a
+    # FileNode object back instead of a matrix
+    camera_matrix = cv_file.getNode("K").mat()
+    dist_matrix = cv_file.getNode("D").mat()
+
+    cv_file.release()
+    return [camera_matrix, dist_matrix]
+
+
+def undistorted_size(w, h, scale=1.0):
+    """ Size of the undistorted frame for a w x h source, optionally downscaled by ``scale``. """
+    return int(w*UNDISTORT_SCALE*scale), int(h*UNDISTORT_SCALE*scale)
+
+
+def output_camera_matrix(camera_matrix, w, h, scale=1.0):
+    """ Camera matrix of the undistorted frame for a w x h source, optionally downscaled by ``scale``.
+
+    The principal point is centered in the (larger) undistorted frame, as OpenCV
+    does when no new camera matrix is given.
+    """
+    new_camera_matrix = cv2.getDefaultNewCameraMatrix(camera_matrix, undistorted_size(w, h), True)
+    new_camera_matrix[:2] *= scale
+    return new_camera_matrix
+
+
+def undistort_maps(camera_matrix, dist_matrix, w, h, scale=1.0, map_type=cv2.CV_32FC1):
+    """ Rectify maps for a w x h source frame (output is UNDISTORT_SCALE times larger).
+
+    With ``scale`` < 1 the maps sample the full-resolution source straight into a
+    downscaled undistorted frame, so a small copy for the detector costs one small remap.
+    """
+    _w, _h = undistorted_size(w, h, scale)
+    new_camera_matrix = output_camera_matrix(camera_matrix, w, h, scale)
+    return cv2.initUndistortRectifyMap(camera_matrix, dist_matrix, None, new_camera_matrix, (_w,_h), map_type)
+
+
+def undistort_boxes(boxes_xyxy, camera_matrix, dist_matrix, new_camera_matrix):
+    """ Boxes (xyxy) of the distorted source frame in the undistorted frame's coordinates.
+
+    Each box becomes the bounding box of its four corners after undistortion;
+    ``new_camera_matrix`` is the one from ``output_camera_matrix``.
+    """
+    boxes = np.asarray(boxes_xyxy, dtype=np.float32).reshape(-1, 4)
+    corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 1, 2)
+    points = cv2.undistortPoints(corners, camera_matrix, dist_matrix, P=new_camera_matrix).reshape(-1, 4, 2)
+    return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1).astype(np.float32)
+
+
+def calibration_hash(path) -> str:
+    """ SHA-256 (first 16 hex digits) of a calibration file. """
+    with open(path, "rb") as calibration_file:
+        return hashlib.sha256(calibration_file.read()).hexdigest()[:16]
+
+
+def maps_dir(calibration_file_path) -> Path:
+    if UNDISTORT_MAPS_DIR:
+        return Path(UNDISTORT_MAPS_DIR)
+    return Path(calibration_file_path).resolve().parent / "maps"
+
+
+def _save_maps(directory: Path, name, maps):
+    for suffix, array in zip(("map1", "map2"), maps):
+        temp_path = directory / f".{name}.{suffix}.{os.getpid()}.npy"
+        np.save(temp_path, array)
+        os.replace(temp_path, directory / f"{name}.{suffix}.npy")
+
+
+def cached_undistort_maps(calibration_file_path, w, h, scale=1.0):
+    """ Fixed-point (``CV_16SC2``) rectify maps for a w x h source, memory-mapped from the disk cache.
+
+    The first caller computes and saves them (under a lock, so pool workers and
+    shards starting together compute them once); if the cache directory is not
+    writable the maps are computed in memory.
+    """
+    directory = maps_dir(calibration_file_path)
+    name = f"{calibration_hash(calibration_file_path)}-{w}x{h}-{scale:.6f}"
+    paths = [directory / f"{name}.{suffix}.npy" for suffix in ("map1", "map2")]
+    if not all(path.exists() for path in paths):
+        camera_matrix, dist_matrix = load_coefficients(str(calibration_file_path))
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            with locked(directory / f"{name}.lock"):
+                if not all(path.exists() for path in paths):
+                    _save_maps(directory, name, undistort_maps(camera_matrix, dist_matrix, w, h, scale, cv2.CV_16SC2))
+        except OSError as e:
+            print(f"Undistortion map cache unavailable ({e}), computing the maps in memory")
+            return undistort_maps(camera_matrix, dist_matrix, w, h, scale, cv2.CV_16SC2)
+    return tuple(np.load(path, mmap_mode="r") for path in paths)
@@ -0,0 +1,175 @@
+"""Uploads em partes, retomáveis, para arquivos DVR de vários GB.
+
+O cliente cria uma sessão informando o tamanho total, envia partes com
+``PUT`` em qualquer ordem (inclusive em paralelo) indicando o offset, consulta
+os intervalos já recebidos e finaliza. Cada parte é gravada direto na posição
+certa do ``input.mp4`` do diretório do job, então finalizar não copia nada.
+O estado da sessão fica em ``upload.json`` no próprio diretório, para que o
+upload possa ser retomado mesmo depois de reiniciar o servidor. Como as
+partes podem chegar por workers diferentes do uvicorn, o registro de cada
+parte relê e regrava o ``upload.json`` sob um lock de arquivo.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from file_lock import locked
+
+SESSION_FILE = "upload.json"
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Adiciona [start, end) à lista ordenada de intervalos, unindo os que se tocam"""
+    merged = []
+    for current_start, current_end in sorted(ranges + [[start, end]]):
+        if merged and current_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], current_end)
+        else:
+            merged.append([current_start, current_end])
+    return merged
+
+
+class UploadSession:
+    """Sessão de upload em partes de um job"""
+
+    def __init__(self, upload_id: str, job_dir: Path, file_name: str, size: int, parameters: dict,
+                 ranges: Optional[List[List[int]]] = None, created_at: Optional[str] = None):
+        self.id = upload_id
+        self.job_dir = job_dir
+        self.file_name = file_name
+        self.size = size
+        self.parameters = parameters
+        self.ranges = ranges or []
+        self.created_at = created_at or datetime.now().isoformat()
+        self.lock = threading.Lock()
+
+    @property
+    def input_path(self) -> Path:
+        return self.job_dir / "input.mp4"
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    @property
+    def complete(self) -> bool:
+        return self.ranges == [[0, self.size]] or self.size == 0
+
+    def missing_ranges(self) -> List[List[int]]:
+        missing = []
+        position = 0
+        for start, end in self.ranges:
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+        if position < self.size:
+            missing.append([position, self.size])
+        return missing
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "file_name": self.file_name,
+            "size": self.size,
+            "parameters": self.parameters,
+            "ranges": self.ranges,
+            "created_at": self.created_at,
+        }
+
+    def save(self):
+        tmp_path = self.job_dir / (SESSION_FILE + ".tmp")
+        with open(tmp_path, "w") as session_file:
+            json.dump(self.to_dict(), session_file)
+        tmp_path.replace(self.job_dir / SESSION_FILE)
+
+    def write(self, offset: int, data: bytes):
+        """Grava um bloco na posição ``offset`` do arquivo de entrada (chamado fora do event loop)"""
+        if offset < 0 or offset + len(data) > self.size:
+            raise ValueError(f"Bloco fora do arquivo: offset {offset}, {len(data)} bytes, tamanho {self.size}")
+        with open(self.input_path, "r+b") as input_file:
+            input_file.seek(offset)
+            input_file.write(data)
+
+    def reload(self):
+        """Relê os intervalos recebidos (outros processos também gravam partes)"""
+        with open(self.job_dir / SESSION_FILE) as session_file:
+            self.ranges = json.load(session_file)["ranges"]
+
+    def mark_received(self, start: int, end: int):
+        """Registra [start, end) como recebido e persiste a sessão"""
+        with self.lock, locked(self.job_dir / (SESSION_FILE + ".lock")):
+            self.reload()
+            self.ranges = merge_range(self.ranges, start, end)
+            self.save()
+
+
+class UploadSessionStore:
+    """Sessões ativas, com fallback para o ``upload.json`` em disco"""
+
+    def __init__(self, jobs_dir: Path):
+        self.jobs_dir = jobs_dir
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def create(self, upload_id: str, file_name: str, size: int, parameters: dict) -> UploadSession:
+        job_dir = self.jobs_dir / upload_id
+        job_dir.mkdir(exist_ok=True)
+        session = UploadSession(upload_id, job_dir, file_name, size, parameters)
+        # Arquivo esparso com o tamanho final: as partes são gravadas direto na posição certa
+        with open(session.input_path, "wb") as input_file:
+            input_file.truncate(size)
+        session.save()
+        self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        session = self._sessions.get(upload_id)
+        if session is not None:
+            try:
+                session.reload()
+            except FileNotFoundError:
+                # Finalizada por outro processo
+                self._sessions.pop(upload_id, None)
+                return None
+            return session
+
+        session_path = self.jobs_dir / upload_id / SESSION_FILE
+        if not session_path.exists():
+            return None
+        with open(session_path) as session_file:
+            data = json.load(session_file)
+        session = UploadSession(
+            data["id"], self.jobs_dir / upload_id, data["file_name"], data["size"],
+            data["parameters"], data["ranges"], data["created_at"],
+        )
+        self._sessions[upload_id] = session
+        return session
+
+    def expired(self, ttl_seconds: float) -> List[str]:
+        """Ids das sessões sem nenhuma parte recebida há mais de ``ttl_seconds``
+
+        Cada parte regrava o ``upload.json``, então o mtime dele é a última atividade.
+        """
+        cutoff = time.time() - ttl_seconds
+        expired = []
+        for session_path in self.jobs_dir.glob(f"*/{SESSION_FILE}"):
+            try:
+                if session_path.stat().st_mtime < cutoff:
+                    expired.append(session_path.parent.name)
+            except FileNotFoundError:
+                # Finalizada durante a varredura
+                continue
+        return expired
+
+    def finish(self, upload_id: str):
+        """Remove a sessão (o arquivo de entrada fica no diretório do job)"""
+        session = self._sessions.pop(upload_id, None)
+        session_path = self.jobs_dir / upload_id / SESSION_FILE
+        if session_path.exists():
+            session_path.unlink()
+        lock_path = self.jobs_dir / upload_id / (SESSION_FILE + ".lock")
+        if lock_path.exists():
+            lock_path.unlink()
+        return session
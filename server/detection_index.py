@@ -0,0 +1,137 @@
+"""Índice de detecções por frame, salvo no diretório do job.
+
+O índice guarda todas as caixas que o YOLO encontrou (classe, confiança e
+caixa xyxy), independentemente do filtro de classes do job, em arquivos
+colunares binários que são abertos com ``numpy.memmap``. Com ele, mudar
+``classes``, confiança mínima, padding ou ``maxframes`` não exige uma nova
+passada de inferência.
+
+Arquivos em ``<job>/index/``:
+
+- ``frame_ref.bin`` (int32, um por frame): frame cujas detecções valem para
+  este frame (ele mesmo, ou o último frame analisado quando o filtro de
+  movimento pulou o detector); -1 para frames que o detector não viu (stride)
+- ``det_frame.bin`` (int32), ``det_cls.bin`` (int16), ``det_conf.bin``
+  (float32) e ``det_box.bin`` (float32, 4 por detecção): uma linha por caixa
+- ``meta.json``: fps, total de frames e de detecções
+"""
+import json
+import os
+
+import numpy as np
+
+COLUMNS = {
+    "frame_ref": (np.int32, ()),
+    "det_frame": (np.int32, ()),
+    "det_cls": (np.int16, ()),
+    "det_conf": (np.float32, ()),
+    "det_box": (np.float32, (4,)),
+}
+
+
+class DetectionIndexWriter:
+    """Escreve o índice de forma incremental, em anexo, durante a inferência"""
+
+    def __init__(self, index_dir: str, fps: float):
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.fps = fps
+        self.frames = 0
+        self.detections = 0
+        self._files = {
+            name: open(os.path.join(index_dir, f"{name}.bin"), "wb")
+            for name in COLUMNS
+        }
+
+    def add_frame(self, ref: int):
+        """Registra o próximo frame, apontando para o frame de referência (-1 = não analisado)"""
+        np.asarray([ref], dtype=np.int32).tofile(self._files["frame_ref"])
+        self.frames += 1
+
+    def add_detections(self, frame_index: int, result, scale: float = 1.0, offset=(0, 0), xyxy=None):
+        """Registra todas as caixas de um resultado do YOLO
+
+        ``scale`` é a escala do frame que o detector viu em relação ao frame de
+        saída e ``offset`` a origem do recorte da ROI nele; as caixas são
+        gravadas nas coordenadas do frame de saída. ``xyxy`` substitui as caixas
+        do resultado quando elas já foram convertidas para o frame de saída
+        (detecção no frame com distorção).
+        """
+        boxes = result.boxes
+        count = len(boxes)
+        if count == 0:
+            return
+        np.full(count, frame_index, dtype=np.int32).tofile(self._files["det_frame"])
+        boxes.cls.cpu().numpy().astype(np.int16).tofile(self._files["det_cls"])
+        boxes.conf.cpu().numpy().astype(np.float32).tofile(self._files["det_conf"])
+        if xyxy is None:
+            xyxy = (boxes.xyxy.cpu().numpy() + np.float32([offset[0], offset[1], offset[0], offset[1]])) / scale
+        np.asarray(xyxy, dtype=np.float32).tofile(self._files["det_box"])
+        self.detections += count
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        with open(os.path.join(self.index_dir, "meta.json"), "w") as meta:
+            json.dump({"fps": self.fps, "frames": self.frames, "detections": self.detections}, meta)
+
+
+def load_index(index_dir: str) -> dict:
+    """Abre o índice com memmap (sem carregar tudo em memória)"""
+    with open(os.path.join(index_dir, "meta.json")) as meta_file:
+        meta = json.load(meta_file)
+
+    index = {"meta": meta}
+    for name, (dtype, shape) in COLUMNS.items():
+        path = os.path.join(index_dir, f"{name}.bin")
+        rows = meta["frames"] if name == "frame_ref" else meta["detections"]
+        if rows == 0:
+            index[name] = np.zeros((0,) + shape, dtype=dtype)
+        else:
+            index[name] = np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + shape)
+    return index
+
+
+def frame_decisions(index: dict, classes=None, min_confidence: float = 0.0) -> list:
+    """Decisão por frame com outro filtro: True/False, ou None para frames não analisados"""
+    mask = index["det_conf"] >= min_confidence
+    if classes:
+        mask &= np.isin(index["det_cls"], np.asarray(classes, dtype=np.int16))
+
+    frame_ref = np.asarray(index["frame_ref"])
+    positive = np.zeros(len(frame_ref), dtype=bool)
+    positive[index["det_frame"][mask]] = True
+
+    analysed = frame_ref >= 0
+    decisions = np.where(analysed, positive[np.where(analysed, frame_ref, 0)], False)
+    return [bool(decision) if seen else None for decision, seen in zip(decisions, analysed)]
+
+
+def merge_indexes(index_dirs, index_dir: str, fps: float) -> dict:
+    """Concatena os índices de partes consecutivas do vídeo em um índice único
+
+    Os frames de cada parte são numerados a partir do fim da parte anterior.
+    Retorna o ``meta`` do índice gerado.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    files = {name: open(os.path.join(index_dir, f"{name}.bin"), "wb") for name in COLUMNS}
+    frames = 0
+    detections = 0
+    try:
+        for part_dir in index_dirs:
+            part = load_index(part_dir)
+            frame_ref = np.asarray(part["frame_ref"])
+            np.where(frame_ref >= 0, frame_ref + frames, -1).astype(np.int32).tofile(files["frame_ref"])
+            (np.asarray(part["det_frame"]) + frames).astype(np.int32).tofile(files["det_frame"])
+            for name in ("det_cls", "det_conf", "det_box"):
+                np.asarray(part[name]).tofile(files[name])
+            frames += part["meta"]["frames"]
+            detections += part["meta"]["detections"]
+    finally:
+        for file in files.values():
+            file.close()
+
+    meta = {"fps": fps, "frames": frames, "detections": detections}
+    with open(os.path.join(index_dir, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file)
+    return meta
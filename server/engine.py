@@ -0,0 +1,584 @@
+"""Engine compartilhado de filtragem de vídeo por classes YOLO.
+
+Os scripts ``scripts/filter_classes*.py`` são wrappers finos sobre este módulo
+(cada um só define o arquivo de pesos), e o pool de workers do servidor importa
+as mesmas funções para processar jobs com o modelo já carregado em memória.
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import subprocess as sp
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+import sharding
+import stream_cut
+from calibration import (UNDISTORT_MODES, cached_undistort_maps, load_coefficients, output_camera_matrix,
+                         undistort_boxes, undistorted_size)
+from detection_index import DetectionIndexWriter
+from fragmented_mp4 import FragmentedMp4Writer
+from inference_backend import model_source
+from live_input import LiveCapture, wait_until_complete
+from roi import RoiMask, parse_roi
+from segments import RangeRecorder, SegmentKeeper
+
+# Patch torch.load to use weights_only=False for compatibility with older model files
+os.environ['TORCH_WARN_WEIGHTS_ONLY'] = '0'
+original_torch_load = torch.load
+def patched_torch_load(f, map_location=None, pickle_module=None, weights_only=None, **kwargs):
+    return original_torch_load(f, map_location=map_location, pickle_module=pickle_module, weights_only=False, **kwargs)
+torch.load = patched_torch_load
+
+# termination criteria
+criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def load_model(weights_path, backend=None, precision="fp32"):
+    """ Loads a YOLO model (torch.load is already patched above).
+
+    With an ONNX/OpenVINO ``backend`` (default: INFERENCE_BACKEND), the weights are
+    exported once and the cached export is loaded instead of the ``.pt`` file;
+    ``precision="int8"`` loads the approved quantized variant.
+    """
+    return YOLO(model_source(weights_path, backend, precision), task="detect")
+
+
+def probe_fps(video_path, default=30):
+    """ Reads avg_frame_rate from the video file via ffprobe. """
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v', '-of', 'default=noprint_wrappers=1:nokey=1',
+               '-show_entries', 'stream=avg_frame_rate', video_path]
+    try:
+        num, _, den = sp.check_output(command).decode('utf-8').strip().partition('/')
+        return float(num) / float(den or 1)
+    except Exception:
+        return default
+
+
+def probe_frame_count(video_path, cap=None):
+    """ Total number of frames, from CAP_PROP_FRAME_COUNT or ffprobe as a fallback. """
+    if cap is not None:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if total > 0:
+            return total
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-of', 'default=noprint_wrappers=1:nokey=1',
+               '-show_entries', 'stream=nb_frames', video_path]
+    try:
+        return int(sp.check_output(command).decode('utf-8').strip())
+    except Exception:
+        return 0
+
+
+class ProgressTracker:
+    """ Counts processed/kept frames and time spent per stage, reporting periodically. """
+
+    def __init__(self, total_frames=0, callback=None, interval=1.0):
+        self.total_frames = total_frames
+        self.callback = callback
+        self.interval = interval
+        self.frames_processed = 0
+        self.frames_inferred = 0
+        self.frames_kept = 0
+        self.frames_gated = 0
+        self.decode_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        fps = self.frames_processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total_frames and fps > 0:
+            eta = max(self.total_frames - self.frames_processed, 0) / fps
+        return {
+            "frames_processed": self.frames_processed,
+            "total_frames": self.total_frames,
+            "frames_kept": self.frames_kept,
+            "frames_gated": self.frames_gated,
+            "motion_skip_ratio": round(self.frames_gated / (self.frames_gated + self.frames_inferred), 4) if self.frames_gated else 0.0,
+            "percent": round(100.0 * self.frames_processed / self.total_frames, 2) if self.total_frames else None,
+            "fps": round(fps, 2),
+            "decode_fps": round(self.frames_processed / self.decode_seconds, 2) if self.decode_seconds else None,
+            "inference_fps": round(self.frames_inferred / self.inference_seconds, 2) if self.inference_seconds else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        if self.callback is not None:
+            self.callback(self.stats())
+
+
+def print_progress(stats):
+    """ Progress callback used on the command line; the server parses these lines. """
+    print("PROGRESS " + json.dumps(stats), flush=True)
+
+
+def detection_imgsz(model, imgsz=0):
+    """ Long side of the frames sent to the detector: ``imgsz``, or the size the model was trained (or exported) at. """
+    if imgsz:
+        return int(imgsz)
+    size = (getattr(model, "overrides", None) or {}).get("imgsz") or 640
+    return int(max(size)) if isinstance(size, (list, tuple)) else int(size)
+
+
+def has_class_detection(result, classes_filter_int_array):
+    """ True if the result has any box of the requested classes (any class if the filter is empty). """
+    # {0: 'carro', 1: 'caminhao', 2: 'moto', 3: 'van', 4: 'onibus', 5: 'roda', 6: 'pessoa', 7: 'bicicleta', 8: 'carreta', 9: 'carretinha'}
+    for box in result.boxes:
+        if box.cls in classes_filter_int_array:
+            return True
+        elif classes_filter_int_array == []:
+            return True
+    return False
+
+
+class MotionGate:
+    """ Cheap pre-filter for static cameras: skips the detector when the scene did not change.
+
+    Frames are downscaled to ``width`` pixels, converted to gray and blurred, then
+    compared with the last frame the detector actually saw. The detector only runs
+    when the fraction of pixels that changed by more than ``pixel_delta`` reaches
+    ``threshold``; otherwise the previous keep/drop decision is reused.
+    """
+
+    def __init__(self, threshold, width=160, pixel_delta=25):
+        self.threshold = threshold
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self.reference = None
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed(self, frame):
+        """ True if the detector should run on this frame. """
+        small = self._small(frame)
+        if self.reference is None or self.reference.shape != small.shape:
+            self.reference = small
+            return True
+
+        diff = cv2.absdiff(small, self.reference)
+        changed_ratio = cv2.countNonZero(cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)[1]) / diff.size
+        if changed_ratio >= self.threshold:
+            self.reference = small
+            return True
+        return False
+
+
+# Frames buffered between pipeline stages (decode -> inference -> write)
+PIPELINE_DEPTH = 16
+# Full-resolution frames held while a batch of samples is collected (with a large
+# stride one batch spans batch_size * stride frames, about 1.5 GB at 4K, 8 x 8)
+PIPELINE_CHUNK_MAX_BYTES = int(os.environ.get("PIPELINE_CHUNK_MAX_BYTES", str(256 * 1024 * 1024)))
+_END = object()
+
+
+def _put(q, item, stop):
+    """ Blocking put that gives up when the pipeline is being stopped. """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def undistort_video(model,video_path,calibration_file_path,output_video_file_path,fps=30,max_frames=0,classes_filter_int_array=[],progress_callback=None,batch_size=1,stride=1,pad_before=None,pad_after=None,motion_threshold=0,stream_copy=False,exact_cuts=False,index_dir=None,cap=None,fragmented=False,detect_only=False,frame_offset=0,imgsz=0,roi=None,undistort_mode="lowres"):
+    # A live capture reads the file while it is still being uploaded; its frame count is
+    # only an estimate that improves as the upload progresses
+    live_input = isinstance(cap, LiveCapture)
+    if cap is None:
+        cap = cv2.VideoCapture(video_path)
+    progress = ProgressTracker(cap.estimated_frame_count() if live_input else probe_frame_count(video_path, cap), progress_callback)
+    progress.report(force=True)
+
+    # Initialize variables
+    writer = None
+
+    # Dual resolution: the detector sees a copy downscaled to ``imgsz`` on its long side
+    # (undistorted straight from the source by small maps when calibrated); the full
+    # resolution frame is only undistorted by the writer, for the frames that are kept
+    imgsz = detection_imgsz(model, imgsz)
+    detect_scale = 1.0
+    # Region of interest: the detector only sees the polygon's bounding box, at a
+    # matching (smaller) imgsz, and boxes centered outside the polygon are dropped
+    roi_mask = None
+    predict_imgsz = imgsz
+    # Raw detection (calibrated jobs): the detector sees a copy of the distorted frame, so
+    # nothing is remapped before the keep/drop decision and only kept frames are undistorted;
+    # the boxes are mapped through the calibration into the output frame's coordinates
+    raw_detection = bool(calibration_file_path) and undistort_mode == "raw"
+    if raw_detection:
+        camera_matrix, dist_matrix = load_coefficients(calibration_file_path)
+    box_camera_matrix = None
+
+    # Stream copy: the engine only records which frames are kept and ffmpeg builds the
+    # output from the source packets, so there is nothing to encode (or undistort)
+    stream_copy = stream_copy and not calibration_file_path
+    # Detect only (one shard of a sharded job): no output is written, only the
+    # detection index; ``frame_offset`` keeps the stride aligned with the whole video
+    record_only = stream_copy or detect_only
+    kept = RangeRecorder()
+
+    # Per-frame detection index, so the job can be re-cut later without running the model
+    index_writer = DetectionIndexWriter(index_dir, fps) if index_dir else None
+    last_ref = -1
+
+    # The engine runs as three stages connected by bounded FIFO queues, so decoding,
+    # inference and encoding overlap and throughput approaches the slowest stage:
+    #   decoder thread (read + undistort) -> this thread (detect + keep) -> writer thread
+    decoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+    to_write = queue.Queue(maxsize=PIPELINE_DEPTH)
+    stop = threading.Event()
+    errors = []
+
+    def decode():
+        nonlocal detect_scale, roi_mask, predict_imgsz, box_camera_matrix
+        h = 0
+        w = 0
+        map1 = None
+        map2 = None
+        crop = None
+        source_crop = None
+        crop_source = False
+        # Preallocated detector copies, reused round robin: enough for a full decoded
+        # queue plus the samples waiting for the next batch, so a buffer is never
+        # overwritten while the frame is still in use
+        buffers = []
+        next_buffer = 0
+        acc_errors=0
+        frame_index=0
+        try:
+            while cap.isOpened() and not stop.is_set():
+                # Read a frame from the video; in stream copy mode frames the detector
+                # will not see are only grabbed, skipping the conversion to BGR
+                is_sample = (frame_index + frame_offset) % stride == 0
+                t0 = time.monotonic()
+                if record_only and not is_sample:
+                    success, frame = cap.grab(), None
+                else:
+                    success, frame = cap.read()
+                progress.decode_seconds += time.monotonic() - t0
+
+                if success:
+                    acc_errors=0
+                    if frame is not None and ((h ==0) or (w == 0)):
+                        h,  w = frame.shape[:2]
+                        out_w, out_h = undistorted_size(w, h) if calibration_file_path else (w, h)
+                        if raw_detection:
+                            detect_scale = min(1.0, imgsz / max(w, h))
+                            crop = (0, 0, max(1, int(w * detect_scale)), max(1, int(h * detect_scale)))
+                            box_camera_matrix = output_camera_matrix(camera_matrix, w, h)
+                            if roi:
+                                # The polygon is in undistorted coordinates: the detector sees the
+                                # whole frame and the ROI is tested on the undistorted boxes
+                                roi_mask = RoiMask(roi, out_w, out_h)
+                        else:
+                            detect_scale = min(1.0, imgsz / max(out_w, out_h))
+                            crop = (0, 0, max(1, int(out_w * detect_scale)), max(1, int(out_h * detect_scale)))
+                            if roi:
+                                roi_mask = RoiMask(roi, out_w, out_h, detect_scale)
+                                crop = roi_mask.crop
+                                crop_source = True
+                                predict_imgsz = min(imgsz, math.ceil(max(roi_mask.size) / 32) * 32)
+                        x0, y0, x1, y1 = crop
+                        # Remove lens distortion using the calibration file: the maps go straight
+                        # from the source to the detector's resolution, and only cover the ROI
+                        if calibration_file_path and not raw_detection:
+                            map1, map2 = cached_undistort_maps(calibration_file_path, w, h, detect_scale)
+                            if crop_source:
+                                map1, map2 = map1[y0:y1, x0:x1].copy(), map2[y0:y1, x0:x1].copy()
+                        if detect_scale < 1.0 or map1 is not None:
+                            buffers = [np.empty((y1 - y0, x1 - x0, 3), np.uint8)
+                                       for _ in range(PIPELINE_DEPTH + batch_size + 3)]
+                        source_crop = (int(x0 / detect_scale), int(y0 / detect_scale),
+                                       min(w, math.ceil(x1 / detect_scale)), min(h, math.ceil(y1 / detect_scale)))
+
+                    # Only the frames the detector will see get a (small) copy; dropped frames
+                    # are never resized or remapped at full resolution
+                    detect_frame = None
+                    if is_sample and frame is not None:
+                        if map1 is not None:
+                            detect_frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=buffers[next_buffer])
+                            next_buffer = (next_buffer + 1) % len(buffers)
+                        else:
+                            sx0, sy0, sx1, sy1 = source_crop
+                            detect_frame = frame[sy0:sy1, sx0:sx1] if crop_source else frame
+                            if detect_scale < 1.0:
+                                detect_frame = cv2.resize(detect_frame, (crop[2] - crop[0], crop[3] - crop[1]),
+                                                          buffers[next_buffer], interpolation=cv2.INTER_AREA)
+                                next_buffer = (next_buffer + 1) % len(buffers)
+                            elif crop_source:
+                                detect_frame = detect_frame.copy()
+                    if record_only:
+                        frame = None
+
+                    if not _put(decoded, (frame_index, frame, detect_frame), stop):
+                        break
+                    frame_index += 1
+                else:
+                    # Break the loop if the end of the video is reached
+                    acc_errors+=1
+                    if (acc_errors>1000000):
+                        break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            cap.release()
+            _put(decoded, _END, stop)
+
+    def write():
+        map1 = None
+        map2 = None
+        # The writer encodes each frame before taking the next, so one buffer is enough
+        undistorted = None
+        while True:
+            frame = to_write.get()
+            if frame is _END:
+                break
+            if errors:
+                # Keep draining so the inference stage never blocks on a dead writer
+                continue
+            try:
+                # Full resolution undistortion, only for the frames that are kept
+                if calibration_file_path:
+                    if map1 is None:
+                        h, w = frame.shape[:2]
+                        map1, map2 = cached_undistort_maps(calibration_file_path, w, h)
+                        undistorted = np.empty(map2.shape + (3,), np.uint8)
+                    frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=undistorted)
+                writer.write(frame)
+            except Exception as e:
+                errors.append(e)
+
+    # Temporal stride: detect on every k-th frame and keep a window around each positive sample.
+    # By default the window covers the frames up to the neighbouring samples.
+    stride = max(1, int(stride))
+    if pad_before is None:
+        pad_before = stride - 1
+    if pad_after is None:
+        pad_after = stride - 1
+    keeper = SegmentKeeper(kept if record_only else to_write.put, pad_before, pad_after, max_frames)
+
+    # Motion gate: samples without significant change reuse the last detector decision
+    gate = MotionGate(motion_threshold) if motion_threshold > 0 else None
+    last_decision = False
+
+    # Decoded frames waiting for a single batched predict call (samples as their small
+    # detector copy); frames between samples wait with them so they reach the keeper in order
+    chunk = []
+    chunk_bytes = 0
+    samples = []
+    batch_size = max(1, int(batch_size))
+
+    def run_batch():
+        """ Runs the pending samples through the model and feeds the chunk to the keeper in order.
+        Returns True when max_frames has been exceeded. """
+        nonlocal last_decision, last_ref, chunk_bytes
+        detect = [frame for _, frame, run_detector in samples if run_detector]
+        results = []
+        if detect:
+            t0 = time.monotonic()
+            results = model.predict(source=detect, imgsz=predict_imgsz, save=False, save_txt=False, verbose=False)  # save predictions as labels
+            progress.inference_seconds += time.monotonic() - t0
+            progress.frames_inferred += len(detect)
+
+        decisions = {}
+        refs = {}
+        results = iter(results)
+        for index, _, run_detector in samples:
+            if run_detector:
+                result = next(results)
+                output_boxes = None
+                if raw_detection and len(result.boxes):
+                    output_boxes = undistort_boxes(result.boxes.xyxy.cpu().numpy() / detect_scale,
+                                                   camera_matrix, dist_matrix, box_camera_matrix)
+                if roi_mask is not None and len(result.boxes):
+                    if output_boxes is not None:
+                        inside = roi_mask.contains(output_boxes)
+                        output_boxes = output_boxes[inside]
+                    else:
+                        inside = roi_mask.inside(result.boxes.xyxy.cpu().numpy())
+                    result.boxes = result.boxes[torch.from_numpy(inside)]
+                last_decision = has_class_detection(result, classes_filter_int_array)
+                last_ref = index
+                if index_writer is not None:
+                    index_writer.add_detections(index, result, detect_scale,
+                                                roi_mask.crop[:2] if roi_mask is not None else (0, 0), output_boxes)
+            decisions[index] = last_decision
+            refs[index] = last_ref
+
+        items = list(chunk)
+        chunk.clear()
+        chunk_bytes = 0
+        samples.clear()
+        for index, frame in items:
+            if index_writer is not None:
+                index_writer.add_frame(refs.get(index, -1))
+            exceeded = keeper.push(index, index if record_only else frame, decisions.get(index))
+            progress.frames_kept = keeper.kept
+            if exceeded:
+                return True
+        return False
+
+    decoder_thread = threading.Thread(target=decode, name="decoder", daemon=True)
+    writer_thread = threading.Thread(target=write, name="writer", daemon=True)
+    decoder_thread.start()
+    if not record_only:
+        writer_thread.start()
+
+    try:
+        # Loop through the video frames
+        reached_max_frames = False
+        while not errors:
+            item = decoded.get()
+            if item is _END:
+                break
+            frame_index, frame, detect_frame = item
+            progress.frames_processed += 1
+
+            # Write the frame to the output video file
+            if writer is None and not record_only:
+                h,  w = frame.shape[:2]
+                if calibration_file_path:
+                    w, h = undistorted_size(w, h)
+                if fragmented:
+                    # Fragmented MP4: the part already written can be downloaded while the job runs
+                    writer = FragmentedMp4Writer(output_video_file_path, fps, (w, h))
+                else:
+                    fourcc = cv2.VideoWriter_fourcc(*"xvid")
+                    writer = cv2.VideoWriter(output_video_file_path, fourcc, fps, (w, h), True)
+
+            chunk.append((frame_index, frame))
+            chunk_bytes += frame.nbytes if frame is not None else 0
+            if detect_frame is not None:
+                run_detector = gate is None or gate.changed(detect_frame)
+                if not run_detector:
+                    progress.frames_gated += 1
+                samples.append((frame_index, detect_frame, run_detector))
+
+            # Flush when the batch is full, or when gated samples keep the chunk from growing past one batch;
+            # large frames flush a smaller batch instead of holding batch_size * stride of them
+            pending_detections = sum(1 for sample in samples if sample[2])
+            if (pending_detections >= batch_size or len(chunk) >= batch_size * stride
+                    or chunk_bytes >= PIPELINE_CHUNK_MAX_BYTES) and run_batch():
+                reached_max_frames = True
+                break
+
+            if live_input and progress.frames_processed % 100 == 0:
+                progress.total_frames = cap.estimated_frame_count()
+            progress.report()
+
+        if chunk and not reached_max_frames and not errors:
+            run_batch()
+    finally:
+        # Stop the decoder and let the writer drain what was already kept
+        stop.set()
+        decoder_thread.join()
+        if writer_thread.is_alive():
+            to_write.put(_END)
+            writer_thread.join()
+
+        if writer is not None:
+            writer.release()
+            print("Video writer released")
+        if index_writer is not None:
+            index_writer.close()
+
+    if errors:
+        raise errors[0]
+
+    if stream_copy and not detect_only:
+        if live_input:
+            # Stopped at max_frames before the upload finished: stream copy needs the whole file
+            wait_until_complete(video_path)
+        # Kept frame ranges -> time ranges -> ffmpeg stream copy of the source
+        stream_cut.cut_frame_ranges(video_path, kept.ranges, fps, output_video_file_path, exact=exact_cuts, fragmented=fragmented)
+
+    if live_input:
+        progress.total_frames = progress.frames_processed
+    progress.report(force=True)
+    print("Video processing completed successfully")
+
+
+def process(model, video_path, output_video_file_path, calibration_file_path=None, fps=0, max_frames=0, classes_filter_int_array=None, progress_callback=None, batch_size=1, stride=1, pad_before=None, pad_after=None, motion_threshold=0, stream_copy=False, exact_cuts=False, index_dir=None, live_input=False, fragmented=False, shards=1, weights_path=None, backend=None, precision="fp32", imgsz=0, roi=None, undistort_mode="lowres"):
+    """ Runs the whole filter for one video with an already loaded model.
+
+    With ``shards`` > 1 (and ``weights_path``), a long video is split at keyframes and
+    the shards are processed in parallel processes, each with its own model instance.
+    """
+    if shards > 1 and weights_path and not live_input:
+        if sharding.process_sharded(weights_path, video_path, output_video_file_path, calibration_file_path, fps,
+                                    max_frames, classes_filter_int_array or [], progress_callback, batch_size, stride,
+                                    pad_before, pad_after, motion_threshold, stream_copy, exact_cuts, index_dir,
+                                    fragmented, shards, backend, precision, imgsz, roi, undistort_mode):
+            return
+
+    # Live input: decode the part of the file already uploaded while the rest arrives
+    cap = LiveCapture(video_path) if live_input else None
+    if not fps:
+        fps = (cap.fps or 30) if cap is not None else probe_fps(video_path)
+    print(f"Video FPS: {fps}")
+    print("MAX_FRAMES:" ,max_frames)
+    undistort_video(model, video_path, calibration_file_path, output_video_file_path, fps, max_frames, classes_filter_int_array or [], progress_callback, batch_size, stride, pad_before, pad_after, motion_threshold, stream_copy, exact_cuts, index_dir, cap, fragmented, imgsz=imgsz, roi=roi, undistort_mode=undistort_mode)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Undistort a video file using a calibration file")
+    parser.add_argument("--video", help="path to video file")
+    parser.add_argument("--calibration", help="path to calibration file")
+    parser.add_argument("--output", help="path to output video file")
+    parser.add_argument("--fps", help="video FPS", default=0,type=int)
+    parser.add_argument("--maxframes", help="max frames to process", default=0,type=int)
+    parser.add_argument("--classes", help="filter classes", default=0,type=str)
+    parser.add_argument("--batch", help="frames per YOLO predict call", default=1,type=int)
+    parser.add_argument("--stride", help="run detection on every k-th frame", default=1,type=int)
+    parser.add_argument("--pad-before", help="frames kept before each positive sample (default: stride-1)", default=None,type=int)
+    parser.add_argument("--pad-after", help="frames kept after each positive sample (default: stride-1)", default=None,type=int)
+    parser.add_argument("--motion-threshold", help="fraction of changed pixels needed to run the detector (0 = off)", default=0,type=float)
+    parser.add_argument("--stream-copy", help="build the output by stream copy of the kept segments (no calibration)", action="store_true")
+    parser.add_argument("--exact-cuts", help="re-encode the boundary GOPs so stream copy cuts are frame exact", action="store_true")
+    parser.add_argument("--index", help="directory for the per-frame detection index", default=None)
+    parser.add_argument("--live-input", help="read the video while it is still being uploaded", action="store_true")
+    parser.add_argument("--fragmented", help="write the output as fragmented MP4 (H.264), readable while it is written", action="store_true")
+    parser.add_argument("--shards", help="split long videos into N parts processed in parallel", default=1,type=int)
+    parser.add_argument("--backend", help="inference backend: torch, onnx or openvino (default: INFERENCE_BACKEND)", default=None)
+    parser.add_argument("--precision", help="fp32, or int8 for the approved quantized variant", default="fp32")
+    parser.add_argument("--imgsz", help="long side of the frames sent to the detector (0 = the model's own size)", default=0,type=int)
+    parser.add_argument("--roi", help="region of interest polygon: JSON file or inline JSON", default=None)
+    parser.add_argument("--undistort-mode", help="detect on a low resolution undistorted copy (lowres) or on the distorted frame (raw)", default="lowres", choices=UNDISTORT_MODES)
+    return parser
+
+
+def main(weights_path):
+    """ Command line entry point used by the filter_classes*.py scripts. """
+    args = build_arg_parser().parse_args()
+
+    print("calibration_file: ",args.calibration)
+
+    classes_filter_int_array = []
+    if args.classes:
+        classes_filter_int_array = [int(x) for x in args.classes.split(",")]
+        print("classes_filter_int_array: ",classes_filter_int_array)
+
+    model = load_model(weights_path, args.backend, args.precision)
+    process(model, args.video, args.output, args.calibration, args.fps, args.maxframes, classes_filter_int_array, print_progress, args.batch,
+            args.stride, args.pad_before, args.pad_after, args.motion_threshold,
+            args.stream_copy, args.exact_cuts, args.index, args.live_input, args.fragmented, args.shards, weights_path, args.backend, args.precision, args.imgsz,
+            parse_roi(args.roi) if args.roi else None, args.undistort_mode)
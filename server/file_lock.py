@@ -0,0 +1,66 @@
+"""Locks entre processos baseados em arquivo (``fcntl.flock``).
+
+Usados quando vários workers do uvicorn (ou réplicas da API no mesmo host)
+dividem o diretório de jobs: um lock exclusivo elege o processo executor e
+locks curtos serializam a atualização de arquivos de estado compartilhados.
+Sem ``fcntl`` (Windows), os locks sempre são obtidos: nesse caso o servidor
+deve rodar com um único worker.
+"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def locked(path: Path):
+    """Lock exclusivo (bloqueante) durante o bloco ``with``"""
+    with open(path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ExclusiveLock:
+    """Lock não bloqueante mantido enquanto o processo viver (liberado pelo SO se ele morrer)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,168 @@
+"""Respostas de arquivo com suporte a ``Range``, ``If-Range`` e ``ETag``.
+
+O ``FileResponse`` desta versão do Starlette sempre envia o arquivo inteiro:
+downloads grandes não podem ser retomados, o player do navegador não consegue
+fazer seek e não dá para baixar partes em paralelo. Aqui a resposta é ``206``
+com ``Content-Range`` para um intervalo, ``multipart/byteranges`` para vários,
+``416`` para intervalos fora do arquivo e ``304`` para ``If-None-Match``.
+
+``size`` permite servir só o começo de um arquivo que ainda está sendo
+gravado (o trecho com fragmentos completos de um MP4 fragmentado).
+"""
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+READ_BLOCK = 1024 * 1024  # 1MB por leitura
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def make_etag(stat: os.stat_result, size: int) -> str:
+    """ETag forte derivado do tamanho servido e do mtime do arquivo"""
+    return f'"{size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Intervalos [início, fim] (inclusivos) de um header ``Range: bytes=...``
+
+    Retorna None se o header não é de bytes ou está malformado (o arquivo
+    inteiro é enviado, como manda a RFC 7233). Levanta ``RangeNotSatisfiable``
+    se nenhum intervalo cai dentro do arquivo.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first == "":
+                # Sufixo: os últimos N bytes
+                length = int(last)
+                if length <= 0 or size == 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                if start >= size:
+                    continue
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    # Unir intervalos sobrepostos para não enviar os mesmos bytes duas vezes
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(value: str, etag: str, last_modified: float) -> bool:
+    """Se o ``If-Range`` ainda corresponde ao arquivo (ETag forte ou data)"""
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def _etag_in(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def _read_ranges(path: Path, ranges: List[Tuple[int, int]], parts: Optional[List[bytes]] = None) -> AsyncIterator[bytes]:
+    input_file = await run_in_threadpool(open, path, "rb")
+    try:
+        for index, (start, end) in enumerate(ranges):
+            if parts is not None:
+                yield parts[index]
+            await run_in_threadpool(input_file.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(input_file.read, min(READ_BLOCK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if parts is not None:
+            yield parts[-1]
+    finally:
+        await run_in_threadpool(input_file.close)
+
+
+def ranged_file_response(request: Request, path: Path, media_type: str, headers: Optional[dict] = None,
+                         size: Optional[int] = None) -> Response:
+    """Resposta para ``path`` (ou os primeiros ``size`` bytes dele) respeitando os headers condicionais"""
+    stat = path.stat()
+    size = stat.st_size if size is None else size
+    etag = make_etag(stat, size)
+    headers = dict(headers or {})
+    headers.update({
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    })
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_in(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    ranges = None
+    if range_header and (not if_range or if_range_matches(if_range, etag, stat.st_mtime)):
+        try:
+            ranges = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if ranges is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_read_ranges(path, [(0, size - 1)] if size else []),
+                                 status_code=200, media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_read_ranges(path, ranges), status_code=206, media_type=media_type, headers=headers)
+
+    # Vários intervalos: multipart/byteranges, com o cabeçalho de cada parte antes dos dados
+    boundary = uuid.uuid4().hex
+    parts = []
+    for index, (start, end) in enumerate(ranges):
+        separator = "\r\n" if index else ""
+        parts.append((f"{separator}--{boundary}\r\nContent-Type: {media_type}\r\n"
+                      f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode())
+    parts.append(f"\r\n--{boundary}--\r\n".encode())
+    headers["Content-Length"] = str(sum(len(part) for part in parts) + sum(end - start + 1 for start, end in ranges))
+    headers.pop("Content-Disposition", None)
+    return StreamingResponse(_read_ranges(path, ranges, parts), status_code=206,
+                             media_type=f"multipart/byteranges; boundary={boundary}", headers=headers)
@@ -0,0 +1,145 @@
+"""Backends de inferência do YOLO: PyTorch ou runtimes otimizados para CPU.
+
+Com ``INFERENCE_BACKEND=onnx`` (ONNX Runtime) ou ``openvino`` (OpenVINO), cada
+arquivo de pesos ``.pt`` é exportado uma única vez e o artefato fica num cache
+ao lado dos pesos (``<dir dos pesos>/compiled``, ou ``COMPILED_MODELS_DIR``),
+numa pasta identificada pelo hash dos pesos: trocar o arquivo de pesos gera
+uma nova exportação e uma exportação interrompida nunca é usada. O modelo
+exportado é carregado pelo próprio ultralytics, então o pré-processamento, o
+NMS e as decisões de manter/descartar frames seguem o mesmo caminho do PyTorch.
+
+Variantes quantizadas em INT8 (``quantization.py``) ficam no mesmo cache e só
+são carregadas depois de aprovadas na comparação com o modelo FP32.
+
+Exportar precisa dos pacotes ``onnx`` (e ``openvino`` para o OpenVINO); rodar,
+de ``onnxruntime`` ou ``openvino``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from file_lock import locked
+
+BACKENDS = ("torch", "onnx", "openvino")
+# Precisão do modelo escolhida por job; "int8" usa a variante quantizada (ONNX Runtime)
+PRECISIONS = ("fp32", "int8")
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+COMPILED_MODELS_DIR = os.environ.get("COMPILED_MODELS_DIR")
+# Lado maior da imagem de entrada do modelo exportado (o mesmo padrão do predict)
+EXPORT_IMGSZ = int(os.environ.get("EXPORT_IMGSZ", "640"))
+MANIFEST = "model.json"
+HASH_BLOCK = 1024 * 1024
+
+# (caminho, tamanho, mtime) -> hash, para não reler os pesos a cada consulta
+_hashes = {}
+
+
+def weights_hash(weights_path) -> str:
+    """ SHA-256 (first 16 hex digits) of a weights file. """
+    stat = os.stat(weights_path)
+    key = (os.path.abspath(weights_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(weights_path, "rb") as weights_file:
+            for block in iter(lambda: weights_file.read(HASH_BLOCK), b""):
+                digest.update(block)
+        _hashes[key] = digest.hexdigest()[:16]
+    return _hashes[key]
+
+
+def cache_root(weights_path) -> Path:
+    if COMPILED_MODELS_DIR:
+        return Path(COMPILED_MODELS_DIR)
+    return Path(weights_path).resolve().parent / "compiled"
+
+
+def compiled_dir(weights_path, backend, variant="fp32") -> Path:
+    """ Cache directory of one exported variant of ``weights_path``. """
+    stem = Path(weights_path).stem
+    return cache_root(weights_path) / f"{stem}-{weights_hash(weights_path)}-{backend}-{variant}"
+
+
+def read_manifest(directory: Path) -> Optional[dict]:
+    try:
+        with open(directory / MANIFEST) as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _export(weights_path, backend, work_dir: Path) -> Path:
+    """ Exports a copy of the weights inside ``work_dir`` and returns the artifact. """
+    from ultralytics import YOLO
+
+    weights_copy = work_dir / Path(weights_path).name
+    shutil.copy2(weights_path, weights_copy)
+    exported = YOLO(str(weights_copy)).export(format=backend, imgsz=EXPORT_IMGSZ, dynamic=True, half=False)
+    weights_copy.unlink()
+    return Path(exported)
+
+
+def export_model(weights_path, backend) -> str:
+    """ Path of the ``backend`` export of ``weights_path``, exporting it on first use. """
+    target = compiled_dir(weights_path, backend)
+    manifest = read_manifest(target)
+    if manifest is None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Pool workers and shard processes start together: only one of them exports
+        with locked(target.parent / f"{target.name}.lock"):
+            manifest = read_manifest(target)
+            if manifest is None:
+                print(f"Exporting {weights_path} to {backend} (cached in {target})")
+                work_dir = Path(tempfile.mkdtemp(prefix=".export-", dir=target.parent))
+                try:
+                    artifact = _export(weights_path, backend, work_dir)
+                    manifest = {
+                        "weights": os.path.basename(weights_path),
+                        "weights_hash": weights_hash(weights_path),
+                        "backend": backend,
+                        "variant": "fp32",
+                        "imgsz": EXPORT_IMGSZ,
+                        "artifact": artifact.relative_to(work_dir).as_posix(),
+                    }
+                    with open(work_dir / MANIFEST, "w") as manifest_file:
+                        json.dump(manifest, manifest_file, indent=2)
+                    if target.exists():
+                        shutil.rmtree(target)
+                    os.rename(work_dir, target)
+                finally:
+                    if work_dir.exists():
+                        shutil.rmtree(work_dir, ignore_errors=True)
+    return str(target / manifest["artifact"])
+
+
+def int8_manifest(weights_path) -> Optional[dict]:
+    """ Manifest of the INT8 variant of ``weights_path`` (with the agreement check), if built. """
+    return read_manifest(compiled_dir(weights_path, "onnx", "int8"))
+
+
+def int8_variant_hash(weights_path) -> Optional[str]:
+    """ Hash of the INT8 variant's manifest; it changes every time the variant is rebuilt. """
+    manifest = int8_manifest(weights_path)
+    if manifest is None:
+        return None
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def model_source(weights_path, backend=None, precision="fp32") -> str:
+    """ What to pass to ``YOLO()`` for ``weights_path`` with the given (or configured) backend. """
+    if precision == "int8":
+        manifest = int8_manifest(weights_path)
+        if manifest is None or not manifest.get("passed"):
+            raise ValueError(f"No approved INT8 variant of {weights_path}")
+        return str(compiled_dir(weights_path, "onnx", "int8") / manifest["artifact"])
+    if precision != "fp32":
+        raise ValueError(f"Unknown precision '{precision}' (expected one of {', '.join(PRECISIONS)})")
+    backend = (backend or INFERENCE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    if backend == "torch":
+        return str(weights_path)
+    return export_model(weights_path, backend)
@@ -0,0 +1,146 @@
+"""Fila de jobs com prioridades e número máximo de jobs simultâneos, guardada no banco de jobs.
+
+Os jobs aguardam com ``status = 'queued'`` na tabela ``jobs`` e são
+reivindicados de forma atômica (``JobStore.claim_next``) por
+``max_concurrent`` tarefas no event loop do processo executor, por
+prioridade e depois por ordem de entrada na fila. Qualquer worker do uvicorn pode enfileirar um job (basta
+gravá-lo no banco); os consumidores são acordados na hora quando o job entra
+pelo mesmo processo e, nos demais casos, encontram o job no próximo
+``poll_interval``. O processamento em si acontece fora do loop (pool de
+workers ou subprocesso assíncrono), então a API continua respondendo
+enquanto os vídeos são processados.
+
+Cada job roda em sua própria task: um pedido de interrupção gravado no banco
+(cancelamento, de qualquer worker) cancela a task, e o handler encerra o
+processo que executa o job. Com ``preemption``, quando todos os slots estão
+ocupados e há um job na fila com prioridade maior que a de algum job em
+execução, o de menor prioridade é interrompido e volta para a fila.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from job_store import JobStore
+
+
+class JobQueue:
+    """Fila de jobs no banco (prioridade, depois FIFO), com concorrência limitada"""
+
+    def __init__(self, store: JobStore, handler: Callable[[str], Awaitable[None]], max_concurrent: int,
+                 owner: str, poll_interval: float = 1.0, preemption: bool = False):
+        self.store = store
+        self.handler = handler
+        self.max_concurrent = max(0, max_concurrent)
+        self.owner = owner
+        self.poll_interval = poll_interval
+        self.preemption = preemption
+        self._wake: Optional[asyncio.Event] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelling: Set[str] = set()
+        self._consumers: List[asyncio.Task] = []
+
+    def start(self):
+        """Inicia os consumidores da fila (deve ser chamado dentro do event loop)"""
+        self._wake = asyncio.Event()
+        self._consumers = [
+            asyncio.create_task(self._consume(index))
+            for index in range(self.max_concurrent)
+        ]
+        self._consumers.append(asyncio.create_task(self._watch()))
+        print(f"📋 Fila de jobs iniciada (máximo de {self.max_concurrent} job(s) simultâneo(s)"
+              f"{', com preempção' if self.preemption else ''})")
+
+    async def stop(self):
+        """Cancela os consumidores da fila"""
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+
+    def put(self, job_id: str):
+        """Acorda os consumidores deste processo (o job já está gravado como ``queued``)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """Interrompe um job em execução neste processo (o motivo fica em ``interrupt`` no banco)"""
+        task = self._running.get(job_id)
+        if task is None or task.done():
+            return False
+        self._cancelling.add(job_id)
+        task.cancel()
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posição do job na fila (1 = próximo), ou None se não estiver aguardando"""
+        return self.store.queue_position(job_id)
+
+    @property
+    def pending(self) -> int:
+        return self.store.count("queued")
+
+    @property
+    def running(self) -> int:
+        return self.store.count("processing")
+
+    @property
+    def running_here(self) -> List[str]:
+        """Jobs em execução neste processo"""
+        return list(self._running)
+
+    async def _next_job(self) -> str:
+        while True:
+            job_id = await run_in_threadpool(self.store.claim_next, self.owner)
+            if job_id is not None:
+                return job_id
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _consume(self, index: int):
+        while True:
+            job_id = await self._next_job()
+            task = asyncio.create_task(self.handler(job_id))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # Interrupção do job (a task foi cancelada, não este consumidor): seguir com a fila
+                if not task.cancelled() or job_id not in self._cancelling:
+                    raise
+            except Exception as e:
+                print(f"[Fila {index}] Erro não tratado no job {job_id}: {str(e)}")
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelling.discard(job_id)
+
+    async def _watch(self):
+        """Atende os pedidos de interrupção do banco e faz a preempção"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                interrupts = await run_in_threadpool(self.store.interrupts, self.owner)
+                for job_id in interrupts:
+                    if job_id not in self._cancelling:
+                        self.cancel(job_id)
+                if self.preemption:
+                    await self._preempt()
+            except Exception as e:
+                print(f"[Fila] Erro ao verificar interrupções: {str(e)}")
+
+    async def _preempt(self):
+        # Um job por vez, e só depois que a interrupção anterior liberou o slot
+        if len(self._running) < self.max_concurrent or self._cancelling:
+            return
+        waiting = await run_in_threadpool(self.store.highest_queued_priority)
+        if waiting is None:
+            return
+        victim = await run_in_threadpool(self.store.preemption_victim, self.owner, waiting)
+        if victim is None or victim not in self._running:
+            return
+        if await run_in_threadpool(self.store.request_interrupt, victim, "preempt"):
+            print(f"[Fila] ⏸️ Job {victim} interrompido para dar lugar a um job de prioridade maior")
+            self.cancel(victim)
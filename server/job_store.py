@@ -0,0 +1,369 @@
+"""Armazenamento persistente dos jobs em SQLite (modo WAL).
+
+Cada job é uma linha da tabela ``jobs``; os campos estruturados (parâmetros,
+estatísticas do engine, progresso do upload, re-corte pendente) ficam em
+colunas JSON. Os índices em ``status`` e ``created_at`` mantêm a listagem
+paginada e os filtros rápidos mesmo com milhares de jobs no histórico. O modo
+WAL permite leituras (polling de status) em paralelo com as escritas de
+progresso dos jobs em execução.
+
+O banco também é a fila e o estado compartilhado entre vários workers do
+uvicorn (ou réplicas da API no mesmo host): qualquer processo enfileira um job
+gravando ``status = 'queued'``, e o executor reivindica o próximo com
+``claim_next`` dentro de uma transação ``BEGIN IMMEDIATE``, então cada job é
+executado por um único processo. A fila é ordenada por prioridade
+(``priority``, maior primeiro) e depois por ordem de entrada. Pedidos de
+cancelamento e de preempção de um job em execução são gravados em
+``interrupt`` e atendidos pelo executor que tem o job. Workers remotos
+(``worker.py``) reivindicam jobs pela API com um ``claimed_by`` único por
+reivindicação e mandam heartbeats (``heartbeat_at``); um job cujo worker
+parou de mandar heartbeats volta para a fila. A limpeza após o download também é agendada
+no banco (``cleanup_at``) e feita pelo executor.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Colunas guardadas como JSON
+JSON_COLUMNS = ("parameters", "stats", "upload", "recut")
+
+COLUMNS = [
+    "id", "status", "stage", "progress", "file_name", "model", "parameters",
+    "created_at", "started_at", "completed_at", "error", "stats", "upload",
+    "recut", "content_hash", "cache_key", "live", "queued_at", "claimed_by",
+    "cleanup_at", "priority", "interrupt", "heartbeat_at", "updated_at",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress INTEGER NOT NULL DEFAULT 0,
+    file_name TEXT,
+    model TEXT,
+    parameters TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT,
+    error TEXT,
+    stats TEXT,
+    upload TEXT,
+    recut TEXT,
+    content_hash TEXT,
+    cache_key TEXT,
+    live INTEGER NOT NULL DEFAULT 0,
+    queued_at TEXT,
+    claimed_by TEXT,
+    cleanup_at TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    interrupt TEXT,
+    heartbeat_at TEXT,
+    updated_at TEXT
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs (status, created_at);
+DROP INDEX IF EXISTS idx_jobs_status_queued_at;
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, queued_at);
+"""
+
+# Colunas adicionadas depois da primeira versão do banco
+MIGRATIONS = {
+    "queued_at": "TEXT",
+    "claimed_by": "TEXT",
+    "cleanup_at": "TEXT",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "interrupt": "TEXT",
+    "heartbeat_at": "TEXT",
+}
+
+
+class JobStore:
+    """Jobs em SQLite, compartilhados entre as threads do servidor"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.executescript(SCHEMA)
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in MIGRATIONS.items():
+            if column not in existing:
+                self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._connection.executescript(INDEXES)
+
+    @staticmethod
+    def _to_value(column: str, value):
+        if column in JSON_COLUMNS and value is not None:
+            return json.dumps(value)
+        if column == "live":
+            return int(bool(value))
+        return value
+
+    @classmethod
+    def _to_row(cls, record: dict) -> list:
+        return [cls._to_value(column, record.get(column)) for column in COLUMNS]
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> dict:
+        record = dict(row)
+        for column in JSON_COLUMNS:
+            if record.get(column) is not None:
+                record[column] = json.loads(record[column])
+        record["live"] = bool(record.get("live"))
+        return record
+
+    def save(self, record: dict):
+        """Insere ou atualiza o job inteiro"""
+        record = dict(record, updated_at=datetime.now().isoformat())
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS if column != "id")
+        with self._lock:
+            self._connection.execute(
+                f"INSERT INTO jobs ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                self._to_row(record),
+            )
+
+    def update(self, job_id: str, fields: dict) -> bool:
+        """Atualiza só as colunas informadas (processos diferentes gravam campos diferentes do mesmo job)"""
+        fields = dict(fields, updated_at=datetime.now().isoformat())
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [self._to_value(column, value) for column, value in fields.items()]
+        with self._lock:
+            return self._connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", values + [job_id]
+            ).rowcount > 0
+
+    def _transaction(self, work):
+        """Executa ``work(connection)`` em uma transação que bloqueia outros escritores"""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._connection)
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return result
+
+    def claim_next(self, owner: str, remote: bool = False, models: Optional[List[str]] = None,
+                   int8_models: Optional[List[str]] = None) -> Optional[str]:
+        """Reivindica o próximo job da fila (status ``processing``) e retorna seu id
+
+        Workers remotos (``remote``) só recebem jobs com o arquivo completo e
+        sem re-corte pendente, e opcionalmente só dos ``models`` que carregam
+        (e, com ``int8_models``, jobs ``precision=int8`` só desses modelos);
+        a reivindicação já conta como o primeiro heartbeat.
+        """
+        conditions = ["status = 'queued'"]
+        values: list = []
+        if remote:
+            conditions.append("live = 0 AND recut IS NULL")
+        if models:
+            conditions.append(f"model IN ({', '.join('?' for _ in models)})")
+            values.extend(models)
+        if int8_models is not None:
+            int8_allowed = f"model IN ({', '.join('?' for _ in int8_models)})" if int8_models else "0"
+            conditions.append(f"(COALESCE(json_extract(parameters, '$.precision'), 'fp32') != 'int8' OR {int8_allowed})")
+            values.extend(int8_models)
+
+        def claim(connection):
+            row = connection.execute(
+                f"SELECT id FROM jobs WHERE {' AND '.join(conditions)} ORDER BY priority DESC, queued_at LIMIT 1",
+                values,
+            ).fetchone()
+            if row is None:
+                return None
+            now = datetime.now().isoformat()
+            connection.execute(
+                "UPDATE jobs SET status = 'processing', claimed_by = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (owner, now if remote else None, now, row["id"]),
+            )
+            return row["id"]
+        return self._transaction(claim)
+
+    def heartbeat(self, job_id: str, owner: str, fields: dict) -> Optional[dict]:
+        """Renova a reivindicação de um worker remoto e grava ``fields``
+
+        Retorna o job (com ``interrupt``), ou None se ele não pertence mais a ``owner``.
+        """
+        fields = dict(fields, heartbeat_at=datetime.now().isoformat(), updated_at=datetime.now().isoformat())
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [self._to_value(column, value) for column, value in fields.items()]
+        with self._lock:
+            updated = self._connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND claimed_by = ? AND status = 'processing'",
+                values + [job_id, owner],
+            ).rowcount
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone() if updated else None
+        return self._from_row(row) if row is not None else None
+
+    def finish_claim(self, job_id: str, owner: str, fields: dict) -> bool:
+        """Grava o resultado de um job, se ele ainda pertence a ``owner``"""
+        fields = dict(fields, claimed_by=None, heartbeat_at=None, interrupt=None, updated_at=datetime.now().isoformat())
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [self._to_value(column, value) for column, value in fields.items()]
+        with self._lock:
+            return self._connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND claimed_by = ? AND status = 'processing'",
+                values + [job_id, owner],
+            ).rowcount > 0
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Posição do job na fila (1 = próximo), ou None se não estiver aguardando"""
+        with self._lock:
+            job = self._connection.execute(
+                "SELECT priority, queued_at FROM jobs WHERE id = ? AND status = 'queued'", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            row = self._connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND queued_at <= ?))",
+                (job["priority"], job["priority"], job["queued_at"]),
+            ).fetchone()
+        return row[0] or None
+
+    def cancel_queued(self, job_id: str, message: str) -> bool:
+        """Cancela um job que ainda aguarda na fila (False se ele já foi reivindicado)"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            return self._connection.execute(
+                "UPDATE jobs SET status = 'cancelled', stage = ?, error = ?, progress = 0, completed_at = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'queued'",
+                (message, message, now, now, job_id),
+            ).rowcount > 0
+
+    def request_interrupt(self, job_id: str, reason: str) -> bool:
+        """Pede ao executor que interrompa um job em execução (``cancel`` ou ``preempt``)"""
+        with self._lock:
+            return self._connection.execute(
+                "UPDATE jobs SET interrupt = ?, updated_at = ? WHERE id = ? AND status = 'processing'",
+                (reason, datetime.now().isoformat(), job_id),
+            ).rowcount > 0
+
+    def interrupts(self, owner: str) -> Dict[str, str]:
+        """Pedidos de interrupção pendentes para os jobs em execução de ``owner``"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, interrupt FROM jobs WHERE status = 'processing' AND claimed_by = ? "
+                "AND interrupt IS NOT NULL",
+                (owner,),
+            ).fetchall()
+        return {row["id"]: row["interrupt"] for row in rows}
+
+    def highest_queued_priority(self) -> Optional[int]:
+        with self._lock:
+            return self._connection.execute("SELECT MAX(priority) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def preemption_victim(self, owner: str, priority: int) -> Optional[str]:
+        """Job de ``owner`` com prioridade menor que ``priority`` que perde menos trabalho ao ser interrompido"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM jobs WHERE status = 'processing' AND claimed_by = ? AND priority < ? "
+                "AND interrupt IS NULL ORDER BY priority, started_at DESC LIMIT 1",
+                (owner, priority),
+            ).fetchone()
+        return row["id"] if row is not None else None
+
+    def _requeue(self, condition: str, values: tuple) -> List[str]:
+        """Devolve para a fila os jobs em execução que atendem a ``condition``"""
+        def requeue(connection):
+            now = datetime.now().isoformat()
+            # Cancelamentos pedidos antes de o processo parar valem mesmo assim
+            connection.execute(
+                "UPDATE jobs SET status = 'cancelled', claimed_by = NULL, heartbeat_at = NULL, interrupt = NULL, "
+                "progress = 0, stage = 'Cancelado pelo usuário', error = 'Cancelado pelo usuário', "
+                f"completed_at = ?, updated_at = ? WHERE status = 'processing' AND interrupt = 'cancel' AND {condition}",
+                (now, now) + values,
+            )
+            ids = [row["id"] for row in connection.execute(
+                f"SELECT id FROM jobs WHERE status = 'processing' AND {condition}", values
+            )]
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', claimed_by = NULL, heartbeat_at = NULL, interrupt = NULL, "
+                "progress = 0, stage = 'Aguardando na fila de processamento (recuperado)', updated_at = ? "
+                f"WHERE status = 'processing' AND {condition}",
+                (now,) + values,
+            )
+            return ids
+        return self._transaction(requeue)
+
+    def requeue_orphans(self) -> List[str]:
+        """Devolve para a fila os jobs em execução de um executor local que parou"""
+        return self._requeue("heartbeat_at IS NULL", ())
+
+    def requeue_stale(self, cutoff: str) -> List[str]:
+        """Devolve para a fila os jobs de workers remotos sem heartbeat desde ``cutoff``"""
+        return self._requeue("heartbeat_at IS NOT NULL AND heartbeat_at < ?", (cutoff,))
+
+    def due_cleanups(self, now: str) -> List[str]:
+        """Jobs cuja limpeza agendada venceu (cada job é devolvido uma única vez)"""
+        def take(connection):
+            ids = [row["id"] for row in connection.execute(
+                "SELECT id FROM jobs WHERE cleanup_at IS NOT NULL AND cleanup_at <= ?", (now,)
+            )]
+            connection.executemany("UPDATE jobs SET cleanup_at = NULL WHERE id = ?", [(job_id,) for job_id in ids])
+            return ids
+        return self._transaction(take)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            return self._connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount > 0
+
+    def list(self, status: Optional[str] = None, model: Optional[str] = None,
+             created_after: Optional[str] = None, created_before: Optional[str] = None,
+             limit: int = 50, offset: int = 0) -> Tuple[List[dict], int]:
+        """Página de jobs (mais recentes primeiro) e o total que atende aos filtros"""
+        conditions = []
+        values: list = []
+        if status:
+            conditions.append("status = ?")
+            values.append(status)
+        if model:
+            conditions.append("model = ?")
+            values.append(model)
+        if created_after:
+            conditions.append("created_at >= ?")
+            values.append(created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            values.append(created_before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            total = self._connection.execute(f"SELECT COUNT(*) FROM jobs {where}", values).fetchone()[0]
+            rows = self._connection.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                values + [limit, offset],
+            ).fetchall()
+        return [self._from_row(row) for row in rows], total
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
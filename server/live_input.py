@@ -0,0 +1,257 @@
+"""Leitura de um vídeo que ainda está chegando pelo upload.
+
+O servidor grava o upload em ``input.mp4`` e mantém ao lado um arquivo de
+estado (``input.mp4.live``) com quantos bytes contíguos, a partir do início,
+já estão no disco e se o upload terminou (ou falhou). O engine lê o vídeo por
+um ``ffmpeg`` que recebe esses bytes por um pipe conforme chegam e devolve
+frames BGR, então a detecção começa com a primeira parte do arquivo e termina
+logo depois do último byte.
+
+Só formatos que podem ser lidos sequencialmente (MPEG-TS, .dav, MP4
+fragmentado ou MP4 com o ``moov`` no início) são lidos durante o upload. Num
+MP4 com o ``moov`` no final, o ffprobe só reconhece o arquivo quando o upload
+termina, e a leitura começa nesse momento, direto do arquivo.
+"""
+import json
+import os
+import subprocess as sp
+import threading
+import time
+
+import cv2
+import numpy as np
+
+LIVE_SUFFIX = ".live"
+
+# Bytes a mais no disco antes de tentar o ffprobe de novo no arquivo parcial
+PROBE_STEP = 1024 * 1024
+FEED_BLOCK = 1024 * 1024
+POLL_INTERVAL = 0.2
+# Upload sem novos bytes por mais tempo que isso é considerado interrompido
+# (cliente que sumiu ou worker da API que parou no meio do upload)
+STALL_TIMEOUT = float(os.environ.get("LIVE_UPLOAD_STALL_TIMEOUT", "300"))
+
+
+class UploadFailed(Exception):
+    pass
+
+
+def live_state_path(video_path):
+    return str(video_path) + LIVE_SUFFIX
+
+
+def write_live_state(video_path, received_bytes, total_bytes=None, complete=False, failed=False):
+    """ Atomically records how much of the upload is on disk (called by the server). """
+    path = live_state_path(video_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump({
+            "bytes": received_bytes,
+            "total_bytes": total_bytes,
+            "complete": complete,
+            "failed": failed,
+        }, state_file)
+    os.replace(tmp_path, path)
+
+
+def read_live_state(video_path):
+    """ Current upload state; a file without state is treated as completely uploaded. """
+    try:
+        with open(live_state_path(video_path)) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        size = os.path.getsize(video_path)
+        return {"bytes": size, "total_bytes": size, "complete": True, "failed": False}
+    except ValueError:
+        # Read while the state was being replaced; the caller polls again
+        return {"bytes": 0, "total_bytes": None, "complete": False, "failed": False}
+
+
+def _checked_state(video_path):
+    state = read_live_state(video_path)
+    if state["failed"]:
+        raise UploadFailed("Upload interrompido antes do fim do vídeo")
+    if not state["complete"]:
+        try:
+            stalled = time.time() - os.path.getmtime(live_state_path(video_path))
+        except FileNotFoundError:
+            stalled = 0
+        if stalled > STALL_TIMEOUT:
+            raise UploadFailed(f"Upload sem novos dados há {int(stalled)}s")
+    return state
+
+
+def wait_until_complete(video_path, poll_interval=POLL_INTERVAL):
+    """ Blocks until the whole file has been uploaded. """
+    while not _checked_state(video_path)["complete"]:
+        time.sleep(poll_interval)
+
+
+def probe_video_stream(video_path):
+    """ (width, height, fps) of the first video stream, or None if ffprobe cannot read it yet. """
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-of', 'json',
+               '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate', str(video_path)]
+    try:
+        streams = json.loads(sp.check_output(command, stderr=sp.DEVNULL)).get("streams") or []
+    except (sp.CalledProcessError, ValueError):
+        return None
+    if not streams or not streams[0].get("width"):
+        return None
+
+    stream = streams[0]
+    fps = 0.0
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = stream.get(key, "0/0").partition('/')
+        if float(num or 0) > 0 and float(den or 1) > 0:
+            fps = float(num) / float(den or 1)
+            break
+    return int(stream["width"]), int(stream["height"]), fps
+
+
+class LiveCapture:
+    """ ``cv2.VideoCapture``-like reader for a video that is still being uploaded.
+
+    Waits until ffprobe recognizes the partial file, then starts ``ffmpeg`` reading
+    from a pipe that a feeder thread fills with the bytes already on disk. If the
+    file only becomes readable once the upload is complete (MP4 with the ``moov``
+    atom at the end), it falls back to a regular ``cv2.VideoCapture``.
+    """
+
+    def __init__(self, video_path, poll_interval=POLL_INTERVAL):
+        self.video_path = str(video_path)
+        self.poll_interval = poll_interval
+        self.width = 0
+        self.height = 0
+        self.fps = 0.0
+        self.frames_read = 0
+        self.bytes_fed = 0
+        self._cap = None
+        self._process = None
+        self._feeder = None
+        self._stop = threading.Event()
+        self._opened = True
+        self._open()
+
+    def _open(self):
+        probed_at = -PROBE_STEP
+        while True:
+            state = _checked_state(self.video_path)
+            if state["complete"]:
+                # Readable from the start or not, the file is complete: read it directly
+                self._cap = cv2.VideoCapture(self.video_path)
+                info = probe_video_stream(self.video_path)
+                if info is not None:
+                    self.width, self.height, self.fps = info
+                else:
+                    self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+                return
+            if state["bytes"] - probed_at >= PROBE_STEP:
+                probed_at = state["bytes"]
+                info = probe_video_stream(self.video_path)
+                if info is not None:
+                    self.width, self.height, self.fps = info
+                    break
+            time.sleep(self.poll_interval)
+
+        print(f"Live input: {self.width}x{self.height} @ {self.fps:.2f} fps, reading while the upload arrives")
+        command = ['ffmpeg', '-v', 'error', '-i', 'pipe:0', '-map', '0:v:0', '-vsync', 'passthrough',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        self._process = sp.Popen(command, stdin=sp.PIPE, stdout=sp.PIPE, bufsize=0)
+        self._feeder = threading.Thread(target=self._feed, name="live-feeder", daemon=True)
+        self._feeder.start()
+
+    def _feed(self):
+        """ Copies the uploaded prefix of the file into ffmpeg's stdin as it grows. """
+        try:
+            with open(self.video_path, "rb") as video_file:
+                while not self._stop.is_set():
+                    state = _checked_state(self.video_path)
+                    available = state["bytes"] - self.bytes_fed
+                    if available <= 0:
+                        if state["complete"]:
+                            break
+                        time.sleep(self.poll_interval)
+                        continue
+                    data = video_file.read(min(available, FEED_BLOCK))
+                    if not data:
+                        time.sleep(self.poll_interval)
+                        continue
+                    self._process.stdin.write(data)
+                    self.bytes_fed += len(data)
+        except UploadFailed as e:
+            print(f"Live input: {e}")
+            self._process.kill()
+        except (BrokenPipeError, ValueError):
+            # ffmpeg exited or the capture was released
+            pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def _read_raw(self):
+        size = self.width * self.height * 3
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            count = self._process.stdout.readinto(view[received:])
+            if not count:
+                return None
+            received += count
+        return data
+
+    def read(self):
+        if self._cap is not None:
+            return self._cap.read()
+        data = self._read_raw() if self._opened else None
+        if data is None:
+            self._opened = False
+            return False, None
+        self.frames_read += 1
+        return True, np.frombuffer(data, np.uint8).reshape(self.height, self.width, 3)
+
+    def grab(self):
+        if self._cap is not None:
+            return self._cap.grab()
+        success, _ = self.read()
+        return success
+
+    def isOpened(self):
+        if self._cap is not None:
+            return self._cap.isOpened()
+        return self._opened
+
+    def estimated_frame_count(self):
+        """ Total frames extrapolated from the bytes decoded so far (0 while unknown). """
+        if self._cap is not None:
+            return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        total_bytes = read_live_state(self.video_path).get("total_bytes")
+        if not total_bytes or not self.frames_read or not self.bytes_fed:
+            return 0
+        return max(self.frames_read, int(self.frames_read * total_bytes / self.bytes_fed))
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.estimated_frame_count()
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return self._cap.get(prop) if self._cap is not None else 0
+
+    def release(self):
+        self._stop.set()
+        self._opened = False
+        if self._cap is not None:
+            self._cap.release()
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process.stdout.close()
+        if self._feeder is not None:
+            self._feeder.join()
@@ -1,16 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import shutil
-import subprocess
+import signal
 import json
+import re
 import uuid
+import socket
 import sys
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 import asyncio
-from typing import Optional, List
+from typing import Dict, Optional, List
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from calibration import UNDISTORT_MODES, calibration_hash
+from chunked_upload import UploadSessionStore
+from file_lock import ExclusiveLock
+from fragmented_mp4 import complete_prefix_size
+from http_ranges import ranged_file_response
+from inference_backend import INFERENCE_BACKEND, PRECISIONS, int8_manifest, int8_variant_hash
+from job_queue import JobQueue
+from job_store import JobStore
+from live_input import UploadFailed, read_live_state, wait_until_complete, write_live_state
+from quantization import QUANTIZATION_MODES
+from recut import recut_job
+from result_cache import ResultCache, new_content_hash
+from roi import parse_roi
+from streaming_upload import StreamedFile, UploadTooLarge, receive_multipart, receive_raw
+from worker_pool import WorkerPool
 
 app = FastAPI(
     title="Cut Media API", 
@@ -40,7 +61,7 @@ async def log_large_uploads(request: Request, call_next):
     start_time = datetime.now()
     
     # Log inicio do request
-    if request.url.path == "/api/upload":
+    if request.url.path.startswith("/api/upload"):
         print(f"🔄 Upload iniciado em {start_time}")
         
         # Check content length
@@ -58,7 +79,7 @@ async def log_large_uploads(request: Request, call_next):
     response = await call_next(request)
     
     # Log fim do request
-    if request.url.path == "/api/upload":
+    if request.url.path.startswith("/api/upload"):
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         print(f"✅ Upload concluído em {duration:.2f} segundos")
@@ -69,6 +90,8 @@ async def log_large_uploads(request: Request, call_next):
 UPLOAD_DIR = Path("uploads")
 JOBS_DIR = Path("jobs")
 MODELS_DIR = Path("/data/models")
+# Polígonos de região de interesse por câmera (<nome>.json; <modelo>.json é o padrão do modelo)
+ROI_DIR = Path(os.environ.get("ROI_DIR", "/data/roi"))
 SCRIPTS_DIR = Path("scripts")
 
 # Criar diretórios se não existirem
@@ -79,28 +102,188 @@ JOBS_DIR.mkdir(exist_ok=True)
 YOLO_MODELS = {
     "diurno": {
         "script": "filter_classesdiurno.py",
+        "weights": str(MODELS_DIR / "diurnov5.1.pt"),
     },
     "diurnoangulado": {
         "script": "filter_classesDiurnoAngulado.py", 
+        "weights": str(MODELS_DIR / "diurnoanguladov1.pt"),
     },
     "noturno": {
         "script": "filter_classesnight.py",
+        "weights": str(MODELS_DIR / "noturnov5.pt"),
     },
     "noturnoangulado": {
         "script": "filter_classesNoturnoAngulado.py",
+        "weights": str(MODELS_DIR / "noturnoanguladov1.2.pt"),
     },
     "noturnoiluminado": {
         "script": "filter_classesnotilu.py",
-
+        "weights": str(MODELS_DIR / "noturnoiluminadov1.pt"),
     }
 }
 
-# Storage para jobs em memória (em produção, usar Redis ou banco de dados)
-jobs_status = {}
+# Pool de workers com os modelos já carregados (0 = um subprocesso por job)
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "1"))
+worker_pool: Optional[WorkerPool] = None
+
+# Máximo de jobs processados ao mesmo tempo neste host; os demais aguardam na fila
+# (0 = nenhum: o host só distribui jobs para workers remotos)
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", str(max(WORKER_POOL_SIZE, 1))))
+
+# Workers remotos (worker.py): token exigido nas rotas /api/workers (se definido) e
+# tempo sem heartbeat até o job voltar para a fila
+WORKER_TOKEN = os.environ.get("WORKER_TOKEN")
+WORKER_HEARTBEAT_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", "60"))
+# Arquivos de resultado que um worker remoto pode enviar para o diretório do job
+WORKER_RESULT_FILES = re.compile(r"^(output\.mp4|segments\.json|index/[a-z_]+\.(bin|json))$")
+job_queue: Optional[JobQueue] = None
+
+# Modos de montagem da saída:
+#   auto     -> cópia de stream quando não há calibração, re-encode caso contrário
+#   reencode -> sempre re-encoda os frames mantidos (comportamento original)
+#   copy     -> cópia de stream alinhada a keyframes (sem calibração)
+#   exact    -> cópia de stream com re-encode só dos GOPs de fronteira (corte exato)
+CUT_MODES = ["auto", "reencode", "copy", "exact"]
+
+# Formatos da saída:
+#   mp4  -> xvid no re-encode, MP4 com faststart na cópia de stream (comportamento original)
+#   fmp4 -> MP4 fragmentado (H.264 no re-encode), que pode ser baixado enquanto o job grava
+OUTPUT_FORMATS = ["mp4", "fmp4"]
+
+# Prioridades da fila (maior primeiro; mesma prioridade, ordem de chegada):
+#   interactive -> envios pela interface, alguém aguardando o resultado
+#   bulk        -> lotes (ex.: gravações noturnas de DVR)
+PRIORITIES = {"bulk": 0, "interactive": 10}
+# Interromper um job bulk em execução (ele volta para a fila e recomeça do início)
+# quando um job interactive aguarda e todos os slots estão ocupados
+JOB_PREEMPTION = os.environ.get("JOB_PREEMPTION", "nao").lower() in ("sim", "true", "1")
+
+# Variantes INT8: estado e log das quantizações, e quantos jobs fornecem frames de calibração
+QUANTIZATION_DIR = Path(os.environ.get("QUANTIZATION_DIR", "quantization"))
+QUANTIZATION_DIR.mkdir(exist_ok=True)
+QUANTIZATION_CALIBRATION_JOBS = int(os.environ.get("QUANTIZATION_CALIBRATION_JOBS", "8"))
+
+# Tempo máximo (s) que o DELETE de um job em execução aguarda o cancelamento
+CANCEL_TIMEOUT_SECONDS = 15
+CANCELLED_MESSAGE = "Cancelado pelo usuário"
+
+# Cache de resultados por (hash do conteúdo, parâmetros), com remoção LRU
+RESULT_CACHE_DIR = Path(os.environ.get("RESULT_CACHE_DIR", "cache"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES) if RESULT_CACHE_MAX_BYTES > 0 else None
+
+# Frames enviados ao YOLO por chamada de predict (1 = frame a frame)
+INFERENCE_BATCH_SIZE = int(os.environ.get("INFERENCE_BATCH_SIZE", "8"))
+
+# Lado maior da cópia reduzida do frame que vai para o detector (0 = o tamanho de
+# treino do modelo); o frame em resolução original só é usado na gravação
+INFERENCE_IMGSZ = int(os.environ.get("INFERENCE_IMGSZ", "0"))
+# Processos em paralelo por job em vídeos longos (1 = desligado); o vídeo é dividido
+# em partes de pelo menos SHARD_MIN_SECONDS, cada uma com sua instância do modelo
+SHARDS_PER_JOB = int(os.environ.get("SHARDS_PER_JOB", "1"))
+
+# Jobs persistidos em SQLite: histórico, fila e estado compartilhado entre os workers do uvicorn
+JOB_DB_PATH = Path(os.environ.get("JOB_DB_PATH", "jobs.db"))
+job_store = JobStore(JOB_DB_PATH)
+# Intervalo mínimo entre gravações do progresso de um job em execução (s)
+JOB_SAVE_INTERVAL = float(os.environ.get("JOB_SAVE_INTERVAL", "2"))
+
+# Um único processo por host executa os jobs (pool de workers com os modelos carregados);
+# os demais workers do uvicorn só atendem a API e assumem se o executor parar
+EXECUTOR_LOCK_PATH = Path(os.environ.get("EXECUTOR_LOCK_PATH", "executor.lock"))
+EXECUTOR_LOCK_RETRY_SECONDS = 5
+# Workers do uvicorn (processos da API) ao rodar ``python main.py``
+UVICORN_WORKERS = int(os.environ.get("UVICORN_WORKERS", "1"))
+EXECUTOR_ID = f"{socket.gethostname()}:{os.getpid()}"
+executor_lock = ExclusiveLock(EXECUTOR_LOCK_PATH)
+
+# Campos gravados por quem executa o job e por quem recebe o upload (processos que
+# podem ser diferentes gravam colunas diferentes do mesmo job)
+PROCESSING_FIELDS = ("status", "stage", "progress", "parameters", "started_at", "completed_at",
+                     "error", "stats", "recut", "queued_at")
+UPLOAD_FIELDS = ("upload", "content_hash", "cache_key")
+
+# Jobs em execução neste processo (executor)
+running_jobs: Dict[str, "JobStatus"] = {}
+# Uploads recebidos por este processo cujo job já está processando (id -> bytes esperados)
+live_uploads: Dict[str, Optional[int]] = {}
+_live_saved_at: Dict[str, float] = {}
+
+# Sessões de upload em partes (retomáveis)
+upload_sessions = UploadSessionStore(JOBS_DIR)
+UPLOAD_WRITE_BLOCK = 8192 * 1024  # 8MB por escrita
+# Sessões sem nenhuma parte recebida por esse tempo (s) são descartadas com o arquivo parcial
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", "86400"))
+UPLOAD_SESSION_SWEEP_SECONDS = 60
 
 # Configuração para limpeza automática (pode ser desabilitada)
 AUTO_CLEANUP_AFTER_DOWNLOAD = True
 CLEANUP_DELAY_SECONDS = 5
+CLEANUP_POLL_SECONDS = 1
+
+@app.on_event("startup")
+async def start_executor():
+    """Cria a fila de jobs e, se este processo for o executor do host, inicia o processamento"""
+    global job_queue
+    job_queue = JobQueue(job_store, process_video, MAX_CONCURRENT_JOBS, EXECUTOR_ID, preemption=JOB_PREEMPTION)
+    if executor_lock.acquire():
+        become_executor()
+    else:
+        print(f"🌐 Worker {EXECUTOR_ID} atende só a API (outro processo é o executor)")
+        asyncio.create_task(watch_executor_lock())
+
+def become_executor():
+    """Inicia o pool de workers, recupera jobs órfãos e começa a consumir a fila"""
+    global worker_pool
+    print(f"⚙️ Worker {EXECUTOR_ID} é o executor de jobs deste host")
+    if MAX_CONCURRENT_JOBS == 0:
+        print("🛰️ Processamento local desabilitado, os jobs ficam para os workers remotos")
+    elif WORKER_POOL_SIZE > 0:
+        models = {name: info["weights"] for name, info in YOLO_MODELS.items()}
+        worker_pool = WorkerPool(models, WORKER_POOL_SIZE)
+        worker_pool.start()
+    else:
+        print("⚠️ Pool de workers desabilitado, cada job usará um subprocesso")
+    
+    # Jobs "processing" sem executor vivo: o servidor parou ou o executor anterior morreu
+    for job_id in job_store.requeue_orphans():
+        print(f"[Job {job_id}] ♻️ Recolocado na fila (executor anterior parou)")
+    
+    job_queue.start()
+    asyncio.create_task(run_cleanups())
+    asyncio.create_task(watch_remote_workers())
+
+async def watch_remote_workers():
+    """Devolve para a fila os jobs de workers remotos que pararam de mandar heartbeats"""
+    while executor_lock.held:
+        await asyncio.sleep(WORKER_HEARTBEAT_TIMEOUT / 4)
+        cutoff = datetime.now() - timedelta(seconds=WORKER_HEARTBEAT_TIMEOUT)
+        try:
+            stale = await run_in_threadpool(job_store.requeue_stale, cutoff.isoformat())
+        except Exception as e:
+            print(f"[Workers] Erro ao verificar heartbeats: {str(e)}")
+            continue
+        for job_id in stale:
+            print(f"[Job {job_id}] ♻️ Recolocado na fila (worker remoto sem heartbeat)")
+        if stale:
+            job_queue.put(stale[0])
+
+async def watch_executor_lock():
+    """Assume o papel de executor se o processo que o tinha parar"""
+    while not executor_lock.held:
+        await asyncio.sleep(EXECUTOR_LOCK_RETRY_SECONDS)
+        if executor_lock.acquire():
+            become_executor()
+
+@app.on_event("shutdown")
+async def stop_executor():
+    """Encerra a fila de jobs e o pool de workers"""
+    if executor_lock.held:
+        await job_queue.stop()
+        if worker_pool is not None:
+            worker_pool.stop()
+        executor_lock.release()
+    job_store.close()
 
 class JobStatus:
     def __init__(self, job_id: str, file_name: str, parameters: dict):
@@ -111,198 +294,893 @@ class JobStatus:
         self.file_name = file_name
         self.parameters = parameters
         self.created_at = datetime.now().isoformat()
+        self.queued_at = None
         self.started_at = None
         self.completed_at = None
         self.error = None
+        self.stats = {}
+        # Parâmetros de re-corte pendentes (job re-enfileirado só para remontar a saída)
+        self.recut = None
+        # Hash do conteúdo enviado e chave no cache de resultados
+        self.content_hash = None
+        self.cache_key = None
+        # Estatísticas do upload (bytes, duração e vazão)
+        self.upload = {}
+        # Processamento durante o upload: o engine lê o arquivo enquanto ele chega
+        self.live = False
+        self._saved_at = 0.0
 
-@app.post("/api/upload")
-async def upload_video(
-    background_tasks: BackgroundTasks,
-    video: UploadFile = File(...),
-    calibration: str = Form("nao"),
-    model: str = Form("diurno"), 
-    maxframes: int = Form(0),
-    classes: str = Form("")
-):
-    """Upload de vídeo e início do processamento"""
-    
-    print(f"🔄 Processando upload: {video.filename}")
-    print(f"📄 Content-Type: {video.content_type}")
-    print(f"📊 Tamanho reportado: {video.size if hasattr(video, 'size') else 'desconhecido'}")
-    
-    # Validações
-    # Aceitar arquivos de vídeo ou .dav (formato de câmeras de segurança)
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.dav', '.DAV']
-    is_video_content = video.content_type and video.content_type.startswith("video/")
-    is_dav_file = video.filename and any(video.filename.lower().endswith(ext.lower()) for ext in ['.dav'])
+    def to_record(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "file_name": self.file_name,
+            "model": self.parameters.get("model"),
+            "priority": PRIORITIES[self.parameters.get("priority", "interactive")],
+            "parameters": self.parameters,
+            "created_at": self.created_at,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+            "error": self.error,
+            "stats": self.stats,
+            "upload": self.upload,
+            "recut": self.recut,
+            "content_hash": self.content_hash,
+            "cache_key": self.cache_key,
+            "live": self.live,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "JobStatus":
+        job = cls(record["id"], record["file_name"], record["parameters"])
+        for name in ("status", "stage", "progress", "created_at", "queued_at", "started_at", "completed_at",
+                     "error", "recut", "content_hash", "cache_key", "live"):
+            setattr(job, name, record[name])
+        job.stats = record["stats"] or {}
+        job.upload = record["upload"] or {}
+        return job
+
+    def save(self, fields=PROCESSING_FIELDS, force: bool = True):
+        """Grava ``fields`` no banco (sem ``force``, no máximo a cada JOB_SAVE_INTERVAL segundos)"""
+        now = time.monotonic()
+        if not force and now - self._saved_at < JOB_SAVE_INTERVAL:
+            return
+        self._saved_at = now
+        record = self.to_record()
+        job_store.update(self.id, {name: record[name] for name in fields})
+
+    def update_stats(self, stats: dict):
+        """Atualiza as estatísticas do engine e o progresso baseado em frames"""
+        self.stats = stats
+        self.progress = progress_from_stats(self.progress, stats)
+        self.save(force=False)
+
+def progress_from_stats(progress: int, stats: dict) -> int:
+    """Progresso do job a partir do percentual de frames do engine"""
+    if stats.get("percent") is None:
+        return progress
+    # Reservar o início e o fim da barra para as etapas antes/depois do engine
+    return max(progress, min(95, 5 + int(stats["percent"] * 0.9)))
+
+def get_job(job_id: str) -> Optional[JobStatus]:
+    """Estado atual do job, lido do banco (compartilhado entre os workers do uvicorn)"""
+    record = job_store.get(job_id)
+    return JobStatus.from_record(record) if record is not None else None
+
+def register_job(job: JobStatus):
+    """Grava um job novo (completo) no banco"""
+    job_store.save(job.to_record())
+
+def validate_video_file(filename: Optional[str], content_type: Optional[str]):
+    """Aceitar arquivos de vídeo ou .dav (formato de câmeras de segurança)"""
+    is_video_content = content_type and content_type.startswith("video/")
+    is_dav_file = filename and any(filename.lower().endswith(ext.lower()) for ext in ['.dav'])
     
     if not (is_video_content or is_dav_file):
-        error_msg = f"Arquivo deve ser um vídeo ou arquivo .DAV. Recebido: {video.content_type}"
+        error_msg = f"Arquivo deve ser um vídeo ou arquivo .DAV. Recebido: {content_type}"
         print(f"❌ {error_msg}")
         raise HTTPException(status_code=400, detail=error_msg)
-    
+
+def build_parameters(calibration: str, model: str, maxframes: int, classes: str, stride: int,
+                     pad_before: Optional[int], pad_after: Optional[int], motion_threshold: float,
+                     cut_mode: str, output_format: str = "mp4", priority: str = "interactive",
+                     precision: str = "fp32", roi: Optional[str] = None, undistort_mode: str = "lowres") -> dict:
+    """Valida os parâmetros de processamento e monta o dicionário do job"""
     if model not in YOLO_MODELS:
         raise HTTPException(status_code=400, detail=f"Modelo '{model}' não suportado")
     
-    # Gerar ID único para o job
-    job_id = str(uuid.uuid4())
+    if stride < 1:
+        raise HTTPException(status_code=400, detail="stride deve ser maior ou igual a 1")
+    if (pad_before is not None and pad_before < 0) or (pad_after is not None and pad_after < 0):
+        raise HTTPException(status_code=400, detail="pad_before e pad_after não podem ser negativos")
+    if not 0 <= motion_threshold <= 1:
+        raise HTTPException(status_code=400, detail="motion_threshold deve estar entre 0 e 1")
+    if cut_mode not in CUT_MODES:
+        raise HTTPException(status_code=400, detail=f"cut_mode deve ser um de: {', '.join(CUT_MODES)}")
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output_format deve ser um de: {', '.join(OUTPUT_FORMATS)}")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority deve ser um de: {', '.join(PRIORITIES)}")
+    if precision not in PRECISIONS:
+        raise HTTPException(status_code=400, detail=f"precision deve ser um de: {', '.join(PRECISIONS)}")
+    if precision == "int8" and not int8_approved(model):
+        raise HTTPException(status_code=400, detail=f"Modelo '{model}' não tem variante INT8 aprovada (veja /api/models)")
+    if undistort_mode not in UNDISTORT_MODES:
+        raise HTTPException(status_code=400, detail=f"undistort_mode deve ser um de: {', '.join(UNDISTORT_MODES)}")
+    
+    return {
+        "calibration": calibration,
+        "model": model,
+        "maxframes": maxframes,
+        "classes": parse_classes(classes),
+        "stride": stride,
+        "pad_before": pad_before,
+        "pad_after": pad_after,
+        "motion_threshold": motion_threshold,
+        "cut_mode": cut_mode,
+        "output_format": output_format,
+        "priority": priority,
+        "precision": precision,
+        "roi": resolve_roi(model, roi),
+        "undistort_mode": undistort_mode
+    }
+
+def resolve_roi(model: str, roi: Optional[str]) -> Optional[dict]:
+    """ROI do job: polígono em JSON, nome de um arquivo em ROI_DIR ou o arquivo padrão do modelo
+
+    ``roi=nao`` desliga a ROI mesmo quando o modelo tem um arquivo padrão.
+    """
+    if not roi:
+        default_path = ROI_DIR / f"{model}.json"
+        if not default_path.exists():
+            return None
+        value = str(default_path)
+    elif roi.lower() in ("nao", "none"):
+        return None
+    elif roi.lstrip().startswith(("{", "[")):
+        value = roi
+    else:
+        path = ROI_DIR / f"{Path(roi).name}.json"
+        if not path.exists():
+            raise HTTPException(status_code=400, detail=f"ROI '{roi}' não encontrada em {ROI_DIR}")
+        value = str(path)
+    try:
+        return parse_roi(value)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"ROI inválida: {str(e)}")
+
+def form_value(fields: dict, name: str, default, cast):
+    """Converte um campo de formulário recebido como texto"""
+    value = fields.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Valor inválido para '{name}': {value}")
+
+def parameters_from_fields(fields: dict) -> dict:
+    """Monta os parâmetros do job a partir dos campos de um formulário em streaming"""
+    return build_parameters(
+        form_value(fields, "calibration", "nao", str),
+        form_value(fields, "model", "diurno", str),
+        form_value(fields, "maxframes", 0, int),
+        form_value(fields, "classes", "", str),
+        form_value(fields, "stride", 1, int),
+        form_value(fields, "pad_before", None, int),
+        form_value(fields, "pad_after", None, int),
+        form_value(fields, "motion_threshold", 0.0, float),
+        form_value(fields, "cut_mode", "auto", str),
+        form_value(fields, "output_format", "mp4", str),
+        form_value(fields, "priority", "interactive", str),
+        form_value(fields, "precision", "fp32", str),
+        form_value(fields, "roi", None, str),
+        form_value(fields, "undistort_mode", "lowres", str),
+    )
+
+def log_upload_progress(stats: dict):
+    """Log de progresso do upload a cada 100MB"""
+    step = 100 * 1024 * 1024
+    if stats["bytes"] // step != (stats["bytes"] - UPLOAD_WRITE_BLOCK) // step:
+        print(f"📊 Progresso: {stats['bytes'] / (1024 * 1024):.1f} MB ({stats['mb_per_s']} MB/s)")
+
+def is_live_upload(live: Optional[str]) -> bool:
+    return (live or "").lower() in ("sim", "true", "1")
+
+def start_live_job(job_id: str, file_name: str, parameters: dict, total_bytes: Optional[int]) -> JobStatus:
+    """Cria o job e o coloca na fila antes do upload terminar"""
+    job = JobStatus(job_id, file_name, parameters)
+    job.live = True
+    job.upload = {"bytes": 0, "total_bytes": total_bytes, "complete": False}
+    write_live_state(JOBS_DIR / job_id / "input.mp4", 0, total_bytes)
+    register_job(job)
+    live_uploads[job_id] = total_bytes
+    enqueue_job(job)
+    print(f"[Job {job_id}] ⚡ Processamento iniciado durante o upload")
+    return job
+
+def update_live_upload(job_id: str, contiguous_bytes: int, stats: dict, total_bytes: Optional[int]):
+    """Publica para o engine quantos bytes contíguos do arquivo já estão no disco"""
+    write_live_state(JOBS_DIR / job_id / "input.mp4", contiguous_bytes, total_bytes)
+    now = time.monotonic()
+    if now - _live_saved_at.get(job_id, 0.0) >= JOB_SAVE_INTERVAL:
+        _live_saved_at[job_id] = now
+        job_store.update(job_id, {"upload": dict(stats, total_bytes=total_bytes, complete=False)})
+
+def finish_live_upload(job_id: str, content_hash: Optional[str] = None, failed: bool = False,
+                       upload: Optional[dict] = None):
+    """Registra o fim (ou a falha) do upload de um job que já está processando
+
+    O job pode estar executando em outro processo: o estado vai para o banco e
+    para o arquivo ``.live``, que o engine acompanha.
+    """
+    _live_saved_at.pop(job_id, None)
+    record = job_store.get(job_id)
+    if record is None:
+        return
+    input_path = JOBS_DIR / job_id / "input.mp4"
+    fields = {"upload": dict(upload or record["upload"] or {}, complete=not failed, failed=failed)}
+    if failed:
+        state = read_live_state(input_path)
+        job_store.update(job_id, fields)
+        write_live_state(input_path, state["bytes"], state["total_bytes"], failed=True)
+        return
+    
+    # O hash só é conhecido agora: o resultado entra no cache quando o job terminar.
+    # O banco é atualizado antes do estado final, que é o que o executor espera
+    fields["content_hash"] = content_hash
+    if result_cache is not None:
+        fields["cache_key"] = result_cache_key(content_hash, record["parameters"])
+    job_store.update(job_id, fields)
+    size = input_path.stat().st_size
+    write_live_state(input_path, size, size, complete=True)
+
+async def ingest_upload(job_id: str, receive, total_bytes: Optional[int] = None) -> tuple:
+    """Recebe o corpo do request direto em ``jobs/<id>/input.mp4``
+
+    ``receive`` é a corrotina que interpreta o corpo (multipart ou bruto) e
+    grava no ``StreamedFile``. Se um job de processamento durante o upload for
+    criado com esse id, o progresso é publicado para o engine a cada bloco.
+    Em caso de erro, o diretório do job é removido (ou, se o job já está
+    processando, o upload é marcado como interrompido).
+    """
     job_dir = JOBS_DIR / job_id
     job_dir.mkdir(exist_ok=True)
+    video_path = job_dir / "input.mp4"
     
     print(f"📁 Criado diretório: {job_dir}")
+    print(f"💾 Salvando arquivo: {video_path}")
+    
+    def on_progress(stats: dict):
+        log_upload_progress(stats)
+        if job_id in live_uploads:
+            update_live_upload(job_id, stats["bytes"], stats, live_uploads[job_id])
+    
+    def discard():
+        if job_id in live_uploads:
+            live_uploads.pop(job_id)
+            finish_live_upload(job_id, failed=True)
+        else:
+            shutil.rmtree(job_dir, ignore_errors=True)
     
+    target = StreamedFile(video_path, new_content_hash(), app.state.max_file_size, on_progress)
     try:
-        # Salvar arquivo de vídeo com progresso
-        video_path = job_dir / "input.mp4"
-        total_size = 0
-        
-        print(f"💾 Salvando arquivo: {video_path}")
-        
-        with open(video_path, "wb") as buffer:
-            # Ler arquivo em chunks para arquivos grandes
-            chunk_size = 8192 * 1024  # 8MB chunks
-            while True:
-                chunk = await video.read(chunk_size)
-                if not chunk:
-                    break
-                buffer.write(chunk)
-                total_size += len(chunk)
-                
-                # Log progresso a cada 100MB
-                if total_size % (100 * 1024 * 1024) == 0:
-                    print(f"📊 Progresso: {total_size / (1024 * 1024):.1f} MB")
-        
-        print(f"✅ Arquivo salvo: {total_size / (1024 * 1024):.2f} MB")
-        
+        result = await receive(target)
+    except HTTPException:
+        discard()
+        raise
+    except UploadTooLarge as e:
+        discard()
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"❌ Erro ao salvar arquivo: {str(e)}")
         # Limpar diretório em caso de erro
-        if job_dir.exists():
-            shutil.rmtree(job_dir)
+        discard()
         raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
     
-    # Parsear classes
-    classes_list = []
-    if classes:
-        try:
-            classes_list = [int(x.strip()) for x in classes.split(",") if x.strip()]
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Classes devem ser números separados por vírgula")
+    stats = target.stats()
+    print(f"✅ Arquivo salvo: {target.size / (1024 * 1024):.2f} MB em {stats['seconds']}s ({stats['mb_per_s']} MB/s)")
     
-    # Criar status do job
-    parameters = {
-        "calibration": calibration,
-        "model": model,
-        "maxframes": maxframes,
-        "classes": classes_list
+    if job_id in live_uploads:
+        live_uploads.pop(job_id)
+        finish_live_upload(job_id, target.content_hash.hexdigest(), upload=dict(stats, total_bytes=target.size))
+    return target, result
+
+def content_length(request: Request) -> Optional[int]:
+    value = request.headers.get("content-length")
+    return int(value) if value and value.isdigit() else None
+
+def create_job(job_id: str, target: StreamedFile, parameters: dict) -> JobStatus:
+    job = JobStatus(job_id, target.filename, parameters)
+    job.content_hash = target.content_hash.hexdigest()
+    job.upload = target.stats()
+    register_job(job)
+    return job
+
+def live_job_response(job_id: str) -> dict:
+    job = get_job(job_id)
+    return {
+        "id": job_id,
+        "status": job.status if job is not None else "failed",
+        "live": True,
+        "message": "Upload realizado com sucesso (processado durante o upload)"
+    }
+
+@app.post("/api/upload")
+async def upload_video(request: Request):
+    """Upload de vídeo e início do processamento
+
+    O corpo multipart é lido em streaming e o campo ``video`` é gravado direto
+    no diretório do job. Campos: video, calibration, model, maxframes, classes,
+    stride, pad_before, pad_after, motion_threshold, cut_mode, output_format, priority, precision, roi,
+    undistort_mode, live.
+
+    Com ``live=sim`` enviado antes do campo ``video`` (junto com os demais
+    parâmetros), o job começa a processar enquanto o vídeo ainda está chegando.
+    """
+    job_id = str(uuid.uuid4())
+    print(f"🔄 Processando upload em streaming: job {job_id}")
+    total_bytes = content_length(request)
+    
+    async def on_file_start(target: StreamedFile, fields: dict):
+        if is_live_upload(fields.get("live")):
+            validate_video_file(target.filename, target.content_type)
+            start_live_job(job_id, target.filename, parameters_from_fields(fields), total_bytes)
+    
+    target, fields = await ingest_upload(
+        job_id, lambda target: receive_multipart(request, target, "video", on_file_start), total_bytes
+    )
+    
+    print(f"📄 Arquivo: {target.filename} ({target.content_type})")
+    
+    if job_store.get(job_id) is not None:
+        return live_job_response(job_id)
+    
+    # Validações (os campos podem chegar depois do arquivo no multipart)
+    try:
+        if target.filename is None:
+            raise HTTPException(status_code=400, detail="Campo 'video' não enviado")
+        validate_video_file(target.filename, target.content_type)
+        parameters = parameters_from_fields(fields)
+    except HTTPException:
+        shutil.rmtree(JOBS_DIR / job_id, ignore_errors=True)
+        raise
+    
+    return await submit_job(create_job(job_id, target, parameters))
+
+@app.post("/api/upload/raw")
+async def upload_video_raw(
+    request: Request,
+    filename: str,
+    calibration: str = "nao",
+    model: str = "diurno",
+    maxframes: int = 0,
+    classes: str = "",
+    stride: int = 1,
+    pad_before: Optional[int] = None,
+    pad_after: Optional[int] = None,
+    motion_threshold: float = 0.0,
+    cut_mode: str = "auto",
+    output_format: str = "mp4",
+    priority: str = "interactive",
+    precision: str = "fp32",
+    roi: Optional[str] = None,
+    undistort_mode: str = "lowres",
+    live: str = "nao"
+):
+    """Upload com o vídeo como corpo bruto e os parâmetros na query string
+
+    Com ``live=sim`` o job começa a processar enquanto o vídeo ainda está chegando.
+    """
+    validate_video_file(filename, request.headers.get("content-type"))
+    parameters = build_parameters(
+        calibration, model, maxframes, classes, stride, pad_before, pad_after, motion_threshold, cut_mode,
+        output_format, priority, precision, roi, undistort_mode
+    )
+    
+    job_id = str(uuid.uuid4())
+    print(f"🔄 Processando upload bruto em streaming: {filename} (job {job_id})")
+    total_bytes = content_length(request)
+    
+    async def receive(target):
+        if is_live_upload(live):
+            start_live_job(job_id, filename, parameters, total_bytes)
+        await receive_raw(request, target)
+    
+    target, _ = await ingest_upload(job_id, receive, total_bytes)
+    target.filename = filename
+    
+    if is_live_upload(live):
+        return live_job_response(job_id)
+    return await submit_job(create_job(job_id, target, parameters))
+
+@app.post("/api/uploads")
+async def create_upload_session(
+    file_name: str = Form(...),
+    size: int = Form(...),
+    content_type: Optional[str] = Form(None),
+    calibration: str = Form("nao"),
+    model: str = Form("diurno"),
+    maxframes: int = Form(0),
+    classes: str = Form(""),
+    stride: int = Form(1),
+    pad_before: Optional[int] = Form(None),
+    pad_after: Optional[int] = Form(None),
+    motion_threshold: float = Form(0.0),
+    cut_mode: str = Form("auto"),
+    output_format: str = Form("mp4"),
+    priority: str = Form("interactive"),
+    precision: str = Form("fp32"),
+    roi: Optional[str] = Form(None),
+    undistort_mode: str = Form("lowres"),
+    live: str = Form("nao")
+):
+    """Cria uma sessão de upload em partes (retomável)
+
+    Com ``live=sim`` o job é criado junto com a sessão (com o mesmo id) e
+    processa o trecho inicial contíguo do arquivo conforme as partes chegam.
+    """
+    validate_video_file(file_name, content_type)
+    if size < 0 or size > app.state.max_file_size:
+        raise HTTPException(status_code=413, detail=f"Arquivo muito grande. Limite: {app.state.max_file_size / (1024 * 1024 * 1024):.1f} GB")
+    parameters = build_parameters(
+        calibration, model, maxframes, classes, stride, pad_before, pad_after, motion_threshold, cut_mode,
+        output_format, priority, precision, roi, undistort_mode
+    )
+    
+    upload_id = str(uuid.uuid4())
+    session = await run_in_threadpool(upload_sessions.create, upload_id, file_name, size, parameters)
+    print(f"📦 Sessão de upload criada: {upload_id} ({size / (1024 * 1024):.2f} MB)")
+    
+    if is_live_upload(live):
+        start_live_job(upload_id, file_name, parameters, size)
+    
+    return {
+        "id": upload_id,
+        "size": session.size,
+        "chunk_size_hint": UPLOAD_WRITE_BLOCK,
+        "ranges": session.ranges,
+        "live": is_live_upload(live)
     }
+
+def get_upload_session(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+    return session
+
+def upload_session_status(session) -> dict:
+    return {
+        "id": session.id,
+        "size": session.size,
+        "received_bytes": session.received_bytes,
+        "ranges": session.ranges,
+        "missing": session.missing_ranges(),
+        "complete": session.complete
+    }
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Recebe uma parte do arquivo (corpo bruto) e grava na posição ``offset``"""
+    session = get_upload_session(upload_id)
+    chunk_size = content_length(request)
+    if chunk_size is not None and offset + chunk_size > session.size:
+        raise HTTPException(status_code=416, detail="Parte ultrapassa o tamanho declarado do arquivo")
     
-    job_status = JobStatus(job_id, video.filename, parameters)
-    jobs_status[job_id] = job_status
+    # O job de processamento durante o upload pode ter sido criado por outro worker
+    record = job_store.get(upload_id)
+    live = record is not None and record["live"]
+    position = offset
+    buffer = bytearray()
     
-    # Iniciar processamento em background
-    background_tasks.add_task(process_video, job_id)
+    async def flush():
+        nonlocal position
+        data = bytes(buffer)
+        buffer.clear()
+        await run_in_threadpool(session.write, position, data)
+        await run_in_threadpool(session.mark_received, position, position + len(data))
+        position += len(data)
+        
+        if live:
+            # O engine só lê o trecho contíguo a partir do início do arquivo
+            first = session.ranges[0] if session.ranges else [0, 0]
+            update_live_upload(upload_id, first[1] if first[0] == 0 else 0,
+                               {"bytes": session.received_bytes}, session.size)
+    
+    try:
+        async for chunk in request.stream():
+            buffer.extend(chunk)
+            if len(buffer) >= UPLOAD_WRITE_BLOCK:
+                await flush()
+        if buffer:
+            await flush()
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e))
+    
+    return upload_session_status(session)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """Intervalos já recebidos e faltantes de uma sessão de upload"""
+    return upload_session_status(get_upload_session(upload_id))
+
+def hash_file(path: Path) -> str:
+    """Hash do conteúdo de um arquivo (mesmo algoritmo do upload direto)"""
+    content_hash = new_content_hash()
+    with open(path, "rb") as input_file:
+        while True:
+            chunk = input_file.read(UPLOAD_WRITE_BLOCK)
+            if not chunk:
+                break
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    """Finaliza a sessão e cria o job (o arquivo já está no diretório do job)"""
+    session = get_upload_session(upload_id)
+    if not session.complete:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload incompleto", "missing": session.missing_ranges()}
+        )
+    
+    content_hash = await run_in_threadpool(hash_file, session.input_path)
+    upload_sessions.finish(upload_id)
+    print(f"✅ Upload em partes concluído: {upload_id} ({session.size / (1024 * 1024):.2f} MB)")
+    
+    record = job_store.get(upload_id)
+    if record is not None and record["live"]:
+        finish_live_upload(upload_id, content_hash, upload={"bytes": session.size, "total_bytes": session.size})
+        return live_job_response(upload_id)
+    
+    job = JobStatus(upload_id, session.file_name, session.parameters)
+    job.content_hash = content_hash
+    register_job(job)
+    
+    return await submit_job(job)
+
+def enqueue_job(job: JobStatus, stage: str = "Aguardando na fila de processamento"):
+    """Coloca o job na fila do banco (o executor de qualquer worker o reivindica)"""
+    job.status = "queued"
+    job.stage = stage
+    job.queued_at = datetime.now().isoformat()
+    job.save()
+    
+    # Acordar o consumidor local (FIFO, com concorrência limitada)
+    job_queue.put(job.id)
+
+def result_cache_key(content_hash: str, parameters: dict, used: Optional[dict] = None) -> str:
+    """Chave do cache de resultados: parâmetros do job e configurações do servidor que mudam a saída
+
+    ``used`` são as configurações com que um worker remoto processou o job
+    (``backend`` e ``int8``); elas valem no lugar das da API.
+    """
+    used = used or {}
+    # Só as configurações fora do padrão, para não invalidar as entradas anteriores
+    settings = {}
+    if INFERENCE_IMGSZ:
+        settings["imgsz"] = INFERENCE_IMGSZ
+    if parameters.get("precision", "fp32") == "int8":
+        # Cada nova quantização gera outra variante, com outras detecções
+        settings["int8"] = used["int8"] if "int8" in used else int8_variant_hash(YOLO_MODELS[parameters["model"]]["weights"])
+    elif used.get("backend", INFERENCE_BACKEND) != "torch":
+        settings["backend"] = used.get("backend", INFERENCE_BACKEND)
+    calibration_path = calibration_file_path(parameters)
+    if calibration_path is not None:
+        # Trocar o arquivo de calibração muda a saída sem mudar o parâmetro
+        settings["calibration"] = calibration_hash(calibration_path)
+    return ResultCache.make_key(content_hash, parameters, settings)
+
+async def submit_job(job: JobStatus) -> dict:
+    """Completa o job pelo cache de resultados ou o coloca na fila de processamento"""
+    if result_cache is not None and job.content_hash:
+        job.cache_key = await run_in_threadpool(result_cache_key, job.content_hash, job.parameters)
+        job.save(("cache_key",))
+        if await run_in_threadpool(result_cache.lookup, job.cache_key, JOBS_DIR / job.id):
+            print(f"[Job {job.id}] ♻️ Resultado encontrado no cache ({job.cache_key[:12]})")
+            now = datetime.now().isoformat()
+            job.status = "completed"
+            job.stage = "Processamento concluído (cache)"
+            job.progress = 100
+            job.started_at = now
+            job.completed_at = now
+            job.stats = {"cache_hit": True}
+            job.save()
+            return {
+                "id": job.id,
+                "status": "completed",
+                "message": "Upload realizado com sucesso (resultado em cache)"
+            }
+    
+    enqueue_job(job)
     
     return {
-        "id": job_id,
-        "status": "uploaded",
+        "id": job.id,
+        "status": "queued",
+        "queue_position": job_queue.position(job.id),
         "message": "Upload realizado com sucesso"
     }
 
+def parse_classes(classes: str) -> List[int]:
+    """Converte "0,1,2" em [0, 1, 2]"""
+    if not classes:
+        return []
+    try:
+        return [int(x.strip()) for x in classes.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Classes devem ser números separados por vírgula")
+
+def get_calibration_path(job) -> Optional[str]:
+    """Caminho do arquivo de calibração do job, se houver"""
+    return calibration_file_path(job.parameters)
+
+def calibration_file_path(parameters: dict) -> Optional[str]:
+    """Caminho do arquivo de calibração para os parâmetros de um job, se houver"""
+    if parameters["calibration"] != "sim":
+        return None
+    # Por enquanto, vamos assumir que existe um arquivo de calibração padrão
+    # Em produção, você pode permitir upload de arquivo de calibração
+    calibration_path = "/data/calibration/default.yaml"
+    if os.path.exists(calibration_path):
+        return calibration_path
+    return None
+
+def uses_stream_copy(job) -> bool:
+    """Se a saída do job será montada por cópia de stream em vez de re-encode"""
+    return job.parameters["cut_mode"] != "reencode" and get_calibration_path(job) is None
+
+async def run_script(job, input_path: Path, output_path: Path):
+    """Executa o script do modelo em um subprocesso (sem pool de workers)"""
+    job_id = job.id
+    model_info = YOLO_MODELS[job.parameters["model"]]
+    script_path = SCRIPTS_DIR / model_info["script"]
+    
+    # Verificar se o script existe
+    if not script_path.exists():
+        raise Exception(f"Script não encontrado: {script_path}")
+    
+    # Usar o mesmo Python executable que está executando este script
+    python_executable = sys.executable
+    
+    print(f"[Job {job_id}] Script path: {script_path}")
+    
+    cmd = [
+        python_executable, str(script_path),
+        "--video", str(input_path),
+        "--output", str(output_path),
+    ]
+
+    if str(job.parameters["maxframes"]) != "0":
+        cmd.extend(["--maxframes", str(job.parameters["maxframes"])])
+    
+    # Adicionar calibração se necessário
+    calibration_path = get_calibration_path(job)
+    if calibration_path:
+        cmd.extend(["--calibration", calibration_path])
+    
+    # Adicionar classes se especificadas
+    if job.parameters["classes"]:
+        classes_str = ",".join(map(str, job.parameters["classes"]))
+        cmd.extend(["--classes", classes_str])
+    
+    cmd.extend(["--batch", str(INFERENCE_BATCH_SIZE)])
+    if INFERENCE_IMGSZ:
+        cmd.extend(["--imgsz", str(INFERENCE_IMGSZ)])
+    if job.parameters.get("roi"):
+        cmd.extend(["--roi", json.dumps(job.parameters["roi"])])
+    if job.parameters.get("undistort_mode", "lowres") != "lowres":
+        cmd.extend(["--undistort-mode", job.parameters["undistort_mode"]])
+    if job.parameters.get("precision", "fp32") != "fp32":
+        cmd.extend(["--precision", job.parameters["precision"]])
+    
+    # Detecção com passo temporal e expansão dos segmentos
+    cmd.extend(["--stride", str(job.parameters["stride"])])
+    if job.parameters["pad_before"] is not None:
+        cmd.extend(["--pad-before", str(job.parameters["pad_before"])])
+    if job.parameters["pad_after"] is not None:
+        cmd.extend(["--pad-after", str(job.parameters["pad_after"])])
+    if job.parameters["motion_threshold"]:
+        cmd.extend(["--motion-threshold", str(job.parameters["motion_threshold"])])
+    
+    cmd.extend(["--index", str(JOBS_DIR / job.id / "index")])
+    
+    if job.live:
+        cmd.append("--live-input")
+    elif SHARDS_PER_JOB > 1:
+        cmd.extend(["--shards", str(SHARDS_PER_JOB)])
+    if job.parameters["output_format"] == "fmp4":
+        cmd.append("--fragmented")
+    
+    if uses_stream_copy(job):
+        cmd.append("--stream-copy")
+        if job.parameters["cut_mode"] == "exact":
+            cmd.append("--exact-cuts")
+    
+    print(f"[Job {job_id}] Executando comando: {' '.join(cmd)}")
+    
+    # Subprocesso assíncrono: o event loop continua livre durante a execução
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=os.getcwd(),
+        env=os.environ.copy(),
+        # Grupo de processos próprio: o cancelamento encerra também os filhos (ffmpeg, partes do vídeo)
+        start_new_session=hasattr(os, "killpg"),
+    )
+    
+    # Ler o stdout linha a linha para acompanhar o progresso enquanto o script roda
+    stdout_lines = []
+    async def read_stdout():
+        async for raw_line in process.stdout:
+            line = raw_line.decode(errors="replace")
+            if line.startswith("PROGRESS "):
+                try:
+                    job.update_stats(json.loads(line[len("PROGRESS "):]))
+                except ValueError:
+                    pass
+            else:
+                stdout_lines.append(line)
+    
+    try:
+        _, stderr_bytes = await asyncio.gather(read_stdout(), process.stderr.read())
+        await process.wait()
+    except asyncio.CancelledError:
+        # Job cancelado ou interrompido: encerrar o script junto
+        print(f"[Job {job_id}] 🛑 Encerrando o processo {process.pid}")
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+        await process.wait()
+        raise
+    stdout = "".join(stdout_lines)
+    stderr = stderr_bytes.decode(errors="replace")
+    
+    print(f"[Job {job_id}] Processo terminou com código: {process.returncode}")
+    print(f"[Job {job_id}] STDOUT: {stdout[:1000]}{'...' if len(stdout) > 1000 else ''}")
+    print(f"[Job {job_id}] STDERR: {stderr[:1000]}{'...' if len(stderr) > 1000 else ''}")
+    
+    if process.returncode != 0:
+        print(f"[Job {job_id}] Erro no processo. Código de retorno: {process.returncode}")
+        raise Exception(f"Erro no script Python: {stderr}")
+
+async def run_in_pool(job, input_path: Path, output_path: Path):
+    """Executa o job em um worker do pool, com o modelo já carregado"""
+    log_path = JOBS_DIR / job.id / "process.log"
+    print(f"[Job {job.id}] Enviando para o pool de workers (log: {log_path})")
+    
+    await worker_pool.submit(
+        job.id,
+        pool_model_name(job.parameters),
+        str(log_path),
+        video_path=str(input_path),
+        output_video_file_path=str(output_path),
+        on_progress=job.update_stats,
+        index_dir=str(JOBS_DIR / job.id / "index"),
+        live_input=job.live,
+        shards=SHARDS_PER_JOB,
+        weights_path=YOLO_MODELS[job.parameters["model"]]["weights"],
+        **engine_options(job),
+    )
+
+def engine_options(job) -> dict:
+    """Argumentos do ``engine.process`` que vêm dos parâmetros do job (sem caminhos de arquivo)"""
+    return {
+        "calibration_file_path": get_calibration_path(job),
+        "max_frames": int(job.parameters["maxframes"]),
+        "classes_filter_int_array": job.parameters["classes"],
+        "batch_size": INFERENCE_BATCH_SIZE,
+        "imgsz": INFERENCE_IMGSZ,
+        "stride": job.parameters["stride"],
+        "pad_before": job.parameters["pad_before"],
+        "pad_after": job.parameters["pad_after"],
+        "motion_threshold": job.parameters["motion_threshold"],
+        "stream_copy": uses_stream_copy(job),
+        "exact_cuts": job.parameters["cut_mode"] == "exact",
+        "fragmented": job.parameters["output_format"] == "fmp4",
+        "precision": job.parameters.get("precision", "fp32"),
+        "roi": job.parameters.get("roi"),
+        "undistort_mode": job.parameters.get("undistort_mode", "lowres"),
+    }
+
+def pool_model_name(parameters: dict) -> str:
+    """Modelo no pool de workers: ``<modelo>`` ou ``<modelo>:int8`` para a variante quantizada"""
+    precision = parameters.get("precision", "fp32")
+    return parameters["model"] if precision == "fp32" else f"{parameters['model']}:{precision}"
+
+async def run_recut(job, input_path: Path, output_path: Path):
+    """Remonta a saída a partir do índice de detecções, sem rodar o modelo"""
+    parameters = dict(job.parameters, **job.recut)
+    stride = parameters["stride"]
+    pad_before = parameters["pad_before"] if parameters["pad_before"] is not None else stride - 1
+    pad_after = parameters["pad_after"] if parameters["pad_after"] is not None else stride - 1
+    
+    # Gerar em um arquivo temporário para não corromper a saída anterior em caso de erro
+    tmp_output_path = output_path.with_name("output.recut.mp4")
+    frame_ranges = await run_in_threadpool(
+        recut_job,
+        str(input_path),
+        str(JOBS_DIR / job.id / "index"),
+        str(tmp_output_path),
+        classes=parameters["classes"],
+        min_confidence=parameters["min_confidence"],
+        pad_before=pad_before,
+        pad_after=pad_after,
+        max_frames=int(parameters["maxframes"]),
+        calibration_file_path=get_calibration_path(job),
+        stream_copy=parameters["cut_mode"] != "reencode",
+        exact_cuts=parameters["cut_mode"] == "exact",
+        fragmented=parameters["output_format"] == "fmp4",
+    )
+    os.replace(tmp_output_path, output_path)
+    
+    job.parameters = parameters
+    job.stats = dict(job.stats, frames_kept=sum(end - start for start, end in frame_ranges))
+    print(f"[Job {job.id}] Re-corte concluído: {len(frame_ranges)} segmento(s)")
+
 async def process_video(job_id: str):
-    """Processa o vídeo em background"""
-    job = jobs_status.get(job_id)
+    """Processa o vídeo em background (job já reivindicado da fila por este executor)"""
+    job = get_job(job_id)
     if not job:
         return
+    running_jobs[job_id] = job
     
     try:
         # Atualizar status
         job.status = "processing"
         job.stage = "Iniciando processamento com IA"
-        job.progress = 20
+        job.progress = 5
         job.started_at = datetime.now().isoformat()
+        job.save()
         
         job_dir = JOBS_DIR / job_id
         input_path = job_dir / "input.mp4"
         output_path = job_dir / "output.mp4"
         
-        # Construir comando para o script Python
-        model_info = YOLO_MODELS[job.parameters["model"]]
-        script_path = SCRIPTS_DIR / model_info["script"]
-        
-        # Verificar se o script existe
-        if not script_path.exists():
-            raise Exception(f"Script não encontrado: {script_path}")
-        
-        # Usar o mesmo Python executable que está executando este script
-        python_executable = sys.executable
-        
         print(f"[Job {job_id}] Working directory: {os.getcwd()}")
-        print(f"[Job {job_id}] Script path: {script_path}")
         print(f"[Job {job_id}] Input path: {input_path}")
         print(f"[Job {job_id}] Output path: {output_path}")
         
-        cmd = [
-            python_executable, str(script_path),
-            "--video", str(input_path),
-            "--output", str(output_path),
-        ]
-
-        if str(job.parameters["maxframes"]) != "0":
-            cmd.extend(["--maxframes", str(job.parameters["maxframes"])])
-    
-        
-        # Adicionar calibração se necessário
-        if job.parameters["calibration"] == "sim":
-            # Por enquanto, vamos assumir que existe um arquivo de calibração padrão
-            # Em produção, você pode permitir upload de arquivo de calibração
-            calibration_path = "/data/calibration/default.yaml"
-            if os.path.exists(calibration_path):
-                cmd.extend(["--calibration", calibration_path])
-        
-        # Adicionar classes se especificadas
-        if job.parameters["classes"]:
-            classes_str = ",".join(map(str, job.parameters["classes"]))
-            cmd.extend(["--classes", classes_str])
-        # Atualizar progresso
-        job.stage = "Executando detecção YOLO"
-        job.progress = 40
-        
-        print(f"[Job {job_id}] Executando comando: {' '.join(cmd)}")
+        if job.live and not job.upload.get("complete"):
+            job.stage = "Processando vídeo com YOLO durante o upload"
+        else:
+            job.stage = "Processando vídeo com YOLO"
         
-        # Atualizar progresso antes de executar
-        job.progress = 50
-        job.stage = "Processando vídeo com YOLO"
-        
-        # Executar o script de forma mais simples
         try:
             print(f"[Job {job_id}] Iniciando execução...")
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=None,  # Sem timeout
-                cwd=os.getcwd(),
-                env=os.environ.copy(),
-                check=False  # Não levanta exceção automaticamente
-            )
+            if job.recut is not None:
+                job.stage = "Re-cortando vídeo a partir do índice de detecções"
+                await run_recut(job, input_path, output_path)
+            elif worker_pool is not None:
+                await run_in_pool(job, input_path, output_path)
+            else:
+                await run_script(job, input_path, output_path)
             
-            print(f"[Job {job_id}] Processo terminou com código: {result.returncode}")
-            print(f"[Job {job_id}] STDOUT: {result.stdout[:1000]}{'...' if len(result.stdout) > 1000 else ''}")
-            print(f"[Job {job_id}] STDERR: {result.stderr[:1000]}{'...' if len(result.stderr) > 1000 else ''}")
+            # Job processado durante o upload: o resultado só vale com o arquivo completo
+            if job.live:
+                try:
+                    await run_in_threadpool(wait_until_complete, str(input_path))
+                except UploadFailed as e:
+                    raise Exception(str(e))
+                # Hash e chave do cache são gravados pelo worker que recebeu o upload
+                record = job_store.get(job_id)
+                if record is not None:
+                    job.content_hash = record["content_hash"]
+                    job.cache_key = record["cache_key"]
             
             # Atualizar progresso
-            job.progress = 90
+            job.progress = max(job.progress, 95)
             job.stage = "Verificando arquivo de saída"
-            
-            if result.returncode != 0:
-                print(f"[Job {job_id}] Erro no processo. Código de retorno: {result.returncode}")
-                raise Exception(f"Erro no script Python: {result.stderr}")
                 
-        except subprocess.TimeoutExpired as e:
-            print(f"[Job {job_id}] Timeout no processo: {str(e)}")
-            raise Exception(f"Timeout no processamento: {str(e)}")
         except Exception as e:
             print(f"[Job {job_id}] Erro durante execução: {str(e)}")
             raise e
@@ -318,12 +1196,41 @@ async def process_video(job_id: str):
         
         print(f"[Job {job_id}] Processamento concluído com sucesso!")
         
+        # Guardar no cache de resultados (re-cortes não correspondem à chave original)
+        if result_cache is not None and job.cache_key and job.recut is None:
+            try:
+                await run_in_threadpool(result_cache.store, job.cache_key, job_dir)
+            except Exception as e:
+                print(f"[Job {job_id}] ⚠️ Erro ao salvar no cache: {str(e)}")
+        
         # Sucesso!
         job.status = "completed"
         job.stage = "Processamento concluído"
         job.progress = 100
         job.completed_at = datetime.now().isoformat()
         
+    except asyncio.CancelledError:
+        # Interrompido pela fila: cancelamento, preempção ou parada do servidor
+        record = job_store.get(job_id)
+        interrupt = record["interrupt"] if record is not None else None
+        if interrupt == "cancel":
+            print(f"[Job {job_id}] 🛑 Cancelado")
+            job.status = "cancelled"
+            job.stage = CANCELLED_MESSAGE
+            job.error = CANCELLED_MESSAGE
+            job.progress = 0
+            job.completed_at = datetime.now().isoformat()
+        elif interrupt == "preempt":
+            # Volta para a fila na posição original (queued_at não muda)
+            print(f"[Job {job_id}] ⏸️ Interrompido por um job de prioridade maior")
+            job.status = "queued"
+            job.stage = "Aguardando na fila (interrompido por um job prioritário)"
+            job.progress = 0
+            job.started_at = None
+            job.stats = {}
+        else:
+            # Parada do servidor: o job continua "processing" e o próximo executor o recoloca na fila
+            raise
     except Exception as e:
         # Erro
         print(f"[Job {job_id}] Erro durante processamento: {str(e)}")
@@ -331,11 +1238,302 @@ async def process_video(job_id: str):
         job.stage = "Erro no processamento"
         job.error = str(e)
         job.progress = 0
+    finally:
+        if job.status != "queued":
+            job.recut = None
+        job.save()
+        if job.status != "processing":
+            job_store.update(job_id, {"interrupt": None})
+        running_jobs.pop(job_id, None)
+
+@app.post("/api/jobs/{job_id}/recut")
+async def recut_video(
+    job_id: str,
+    classes: Optional[str] = Form(None),
+    min_confidence: float = Form(0.0),
+    pad_before: Optional[int] = Form(None),
+    pad_after: Optional[int] = Form(None),
+    maxframes: Optional[int] = Form(None),
+    cut_mode: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None)
+):
+    """Remonta o output.mp4 de um job com outro filtro, usando o índice de detecções (sem inferência)"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    if job.status in ("queued", "processing"):
+        raise HTTPException(status_code=409, detail="Job ainda está na fila ou em processamento")
+    
+    job_dir = JOBS_DIR / job_id
+    if not (job_dir / "index" / "meta.json").exists() or not (job_dir / "input.mp4").exists():
+        raise HTTPException(status_code=409, detail="Job não possui índice de detecções ou vídeo de entrada")
+    
+    if cut_mode is not None and cut_mode not in CUT_MODES:
+        raise HTTPException(status_code=400, detail=f"cut_mode deve ser um de: {', '.join(CUT_MODES)}")
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output_format deve ser um de: {', '.join(OUTPUT_FORMATS)}")
+    if (pad_before is not None and pad_before < 0) or (pad_after is not None and pad_after < 0):
+        raise HTTPException(status_code=400, detail="pad_before e pad_after não podem ser negativos")
+    
+    # Parâmetros não enviados mantêm o valor atual do job
+    recut = {"min_confidence": min_confidence}
+    if classes is not None:
+        recut["classes"] = parse_classes(classes)
+    if pad_before is not None:
+        recut["pad_before"] = pad_before
+    if pad_after is not None:
+        recut["pad_after"] = pad_after
+    if maxframes is not None:
+        recut["maxframes"] = maxframes
+    if cut_mode is not None:
+        recut["cut_mode"] = cut_mode
+    if output_format is not None:
+        recut["output_format"] = output_format
+    
+    job.recut = recut
+    job.progress = 0
+    job.error = None
+    job.completed_at = None
+    enqueue_job(job, "Aguardando re-corte")
+    
+    return {
+        "id": job_id,
+        "status": "queued",
+        "queue_position": job_queue.position(job_id),
+        "message": "Re-corte enfileirado"
+    }
+
+def request_cancel(job_id: str) -> Optional[str]:
+    """Cancela um job da fila ou pede ao executor que encerre o job em execução
+
+    Retorna o novo status (``cancelled`` ou ``cancelling``), ou None se o job
+    não está na fila nem em processamento.
+    """
+    if job_store.cancel_queued(job_id, CANCELLED_MESSAGE):
+        print(f"[Job {job_id}] 🛑 Cancelado na fila")
+        return "cancelled"
+    if job_store.request_interrupt(job_id, "cancel"):
+        # Imediato se o job roda neste processo; senão o executor atende em até 1s
+        job_queue.cancel(job_id)
+        return "cancelling"
+    return None
+
+async def wait_until_stopped(job_id: str) -> bool:
+    """Aguarda o executor encerrar um job cancelado"""
+    deadline = time.monotonic() + CANCEL_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        record = job_store.get(job_id)
+        if record is None or record["status"] != "processing":
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancela um job na fila ou em processamento (o processo que executa o job é encerrado)"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    status = request_cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=409, detail=f"Job não está na fila nem em processamento (status: {job.status})")
+    
+    return {
+        "id": job_id,
+        "status": status,
+        "message": "Job cancelado" if status == "cancelled" else "Cancelamento solicitado"
+    }
+
+# ---------------------------------------------------------------------------
+# Workers remotos (worker.py): reivindicam jobs da fila, mandam heartbeats com
+# o progresso e devolvem a saída. Cada reivindicação tem um ``lease`` próprio
+# (gravado em ``claimed_by``); um worker cujo job voltou para a fila não
+# consegue mais gravar nada nele.
+# ---------------------------------------------------------------------------
+
+def check_worker_token(request: Request):
+    """Recusa a requisição se ``WORKER_TOKEN`` está definido e o header não confere"""
+    if WORKER_TOKEN and request.headers.get("x-worker-token") != WORKER_TOKEN:
+        raise HTTPException(status_code=401, detail="Token de worker inválido")
+
+def get_leased_job(job_id: str, lease: str) -> dict:
+    """Registro do job, se ele ainda está em processamento pelo lease informado"""
+    record = job_store.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if record["status"] != "processing" or record["claimed_by"] != lease:
+        raise HTTPException(status_code=409, detail="Job não pertence mais a este worker")
+    return record
+
+@app.get("/api/workers/models")
+async def list_worker_models(request: Request):
+    """Modelos disponíveis e o nome do arquivo de pesos de cada um (procurado no MODELS_DIR do worker)"""
+    check_worker_token(request)
+    return {name: Path(config["weights"]).name for name, config in YOLO_MODELS.items()}
+
+@app.post("/api/workers/claim")
+async def claim_remote_job(request: Request):
+    """Entrega o próximo job da fila a um worker remoto (204 se a fila está vazia)
+
+    Corpo JSON: ``worker_id`` e, opcionalmente, ``models`` (modelos que o worker carrega)
+    e ``int8_models`` (modelos com variante INT8 aprovada no worker). Jobs
+    ``precision=int8`` só vão para workers que informam a variante do modelo.
+    """
+    check_worker_token(request)
+    body = await request.json()
+    worker_id = str(body.get("worker_id") or "worker")
+    models = [model for model in body.get("models") or [] if model in YOLO_MODELS] or list(YOLO_MODELS)
+    int8_models = [model for model in body.get("int8_models") or [] if model in YOLO_MODELS]
+    
+    lease = f"{worker_id}/{uuid.uuid4().hex[:8]}"
+    job_id = await run_in_threadpool(job_store.claim_next, lease, True, models, int8_models)
+    if job_id is None:
+        return Response(status_code=204)
+    
+    job = get_job(job_id)
+    job.stage = f"Processando vídeo com YOLO (worker {worker_id})"
+    job.progress = 5
+    job.started_at = datetime.now().isoformat()
+    job_store.update(job_id, {"stage": job.stage, "progress": job.progress, "started_at": job.started_at})
+    print(f"[Job {job_id}] 🛰️ Reivindicado pelo worker remoto {lease}")
+    
+    calibration_path = get_calibration_path(job)
+    return {
+        "id": job_id,
+        "lease": lease,
+        "model": job.parameters["model"],
+        "file_name": job.file_name,
+        "options": engine_options(job),
+        # O worker baixa o arquivo (``/calibration``) e o guarda por esse hash
+        "calibration": await run_in_threadpool(calibration_hash, calibration_path) if calibration_path else None,
+    }
+
+@app.post("/api/workers/jobs/{job_id}/heartbeat")
+async def remote_job_heartbeat(job_id: str, request: Request):
+    """Renova a reivindicação do job e grava as estatísticas do engine
+
+    Retorna ``interrupt`` (``cancel`` quando o usuário cancelou o job).
+    """
+    check_worker_token(request)
+    body = await request.json()
+    lease = str(body.get("lease") or "")
+    fields = {}
+    stats = body.get("stats")
+    if stats:
+        record = get_leased_job(job_id, lease)
+        fields = {"stats": stats, "progress": progress_from_stats(record["progress"], stats)}
+    
+    record = await run_in_threadpool(job_store.heartbeat, job_id, lease, fields)
+    if record is None:
+        raise HTTPException(status_code=409, detail="Job não pertence mais a este worker")
+    return {"id": job_id, "interrupt": record["interrupt"]}
+
+@app.get("/api/workers/jobs/{job_id}/input")
+async def remote_job_input(job_id: str, lease: str, request: Request):
+    """Vídeo de entrada do job (suporta ``Range`` para retomar o download)"""
+    check_worker_token(request)
+    get_leased_job(job_id, lease)
+    input_path = JOBS_DIR / job_id / "input.mp4"
+    if not input_path.exists():
+        raise HTTPException(status_code=404, detail="Arquivo de entrada não encontrado")
+    return ranged_file_response(request, input_path, "application/octet-stream")
+
+@app.get("/api/workers/jobs/{job_id}/calibration")
+async def remote_job_calibration(job_id: str, lease: str, request: Request):
+    """Arquivo de calibração do job (o caminho na API não existe no worker)"""
+    check_worker_token(request)
+    record = get_leased_job(job_id, lease)
+    calibration_path = calibration_file_path(record["parameters"])
+    if calibration_path is None:
+        raise HTTPException(status_code=404, detail="Job sem arquivo de calibração")
+    return ranged_file_response(request, Path(calibration_path), "application/octet-stream")
+
+@app.put("/api/workers/jobs/{job_id}/files/{name:path}")
+async def remote_job_file(job_id: str, name: str, lease: str, request: Request):
+    """Recebe um arquivo de resultado do job (saída, segmentos ou índice de detecções)"""
+    check_worker_token(request)
+    if not WORKER_RESULT_FILES.match(name):
+        raise HTTPException(status_code=400, detail=f"Arquivo de resultado não permitido: {name}")
+    get_leased_job(job_id, lease)
+    
+    target = JOBS_DIR / job_id / name
+    part_path = target.with_name(target.name + ".part")
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    output_file = await run_in_threadpool(open, part_path, "wb")
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer.extend(chunk)
+            if len(buffer) >= UPLOAD_WRITE_BLOCK:
+                await run_in_threadpool(output_file.write, bytes(buffer))
+                size += len(buffer)
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(output_file.write, bytes(buffer))
+            size += len(buffer)
+    except BaseException:
+        output_file.close()
+        part_path.unlink(missing_ok=True)
+        raise
+    output_file.close()
+    os.replace(part_path, target)
+    
+    return {"id": job_id, "name": name, "size": size}
+
+@app.post("/api/workers/jobs/{job_id}/complete")
+async def complete_remote_job(job_id: str, request: Request):
+    """Grava o resultado de um job remoto
+
+    Corpo JSON: ``lease``, ``status`` (``completed``, ``failed`` ou ``cancelled``),
+    ``error``, ``stats`` e ``settings`` (backend e variante INT8 usados pelo
+    worker, que entram na chave do cache). A saída precisa ter sido enviada
+    antes (ou gravada no armazenamento compartilhado).
+    """
+    check_worker_token(request)
+    body = await request.json()
+    lease = str(body.get("lease") or "")
+    status = body.get("status")
+    record = get_leased_job(job_id, lease)
+    job_dir = JOBS_DIR / job_id
+    
+    fields = {"stats": body.get("stats") or record["stats"], "completed_at": datetime.now().isoformat()}
+    if status == "completed" and not (job_dir / "output.mp4").exists():
+        status = "failed"
+        body["error"] = "Arquivo de saída não foi gerado"
+    
+    if status == "completed":
+        # Guardar no cache de resultados, com a chave das configurações que o worker usou
+        # (sem elas, um worker antigo não sabe dizer com que backend processou)
+        settings = body.get("settings")
+        if result_cache is not None and record["cache_key"] and isinstance(settings, dict):
+            used = {name: str(settings[name]) for name in ("backend", "int8") if settings.get(name)}
+            fields["cache_key"] = await run_in_threadpool(
+                result_cache_key, record["content_hash"], record["parameters"], used)
+            try:
+                await run_in_threadpool(result_cache.store, fields["cache_key"], job_dir)
+            except Exception as e:
+                print(f"[Job {job_id}] ⚠️ Erro ao salvar no cache: {str(e)}")
+        fields.update({"status": "completed", "stage": "Processamento concluído", "progress": 100})
+    elif status == "cancelled" and record["interrupt"] == "cancel":
+        fields.update({"status": "cancelled", "stage": CANCELLED_MESSAGE, "error": CANCELLED_MESSAGE, "progress": 0})
+    elif status in ("failed", "cancelled"):
+        fields.update({"status": "failed", "stage": "Erro no processamento", "progress": 0,
+                       "error": str(body.get("error") or "Worker remoto interrompeu o job")})
+    else:
+        raise HTTPException(status_code=400, detail=f"Status inválido: {status}")
+    
+    if not await run_in_threadpool(job_store.finish_claim, job_id, lease, fields):
+        raise HTTPException(status_code=409, detail="Job não pertence mais a este worker")
+    print(f"[Job {job_id}] 🛰️ Worker remoto {lease} terminou o job: {fields['status']}")
+    return {"id": job_id, "status": fields["status"]}
 
 @app.get("/api/process")
 async def get_job_status(id: str):
     """Obter status de um job"""
-    job = jobs_status.get(id)
+    job = get_job(id)
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
@@ -349,60 +1547,102 @@ async def get_job_status(id: str):
         "created_at": job.created_at,
         "started_at": job.started_at,
         "completed_at": job.completed_at,
+        "queue_position": job_queue.position(job.id) if job.status == "queued" else None,
+        "priority": job.parameters.get("priority", "interactive"),
+        "precision": job.parameters.get("precision", "fp32"),
+        "stats": job.stats,
+        "upload": job.upload,
+        "live": job.live,
         "error": job.error
     }
 
 @app.get("/api/download")
-async def download_video(id: str):
-    """Download do vídeo processado"""
-    job = jobs_status.get(id)
+async def download_video(id: str, request: Request):
+    """Download do vídeo processado
+
+    Suporta ``Range`` (inclusive vários intervalos), ``If-Range`` e ``ETag``.
+    Em jobs com ``output_format=fmp4``, o trecho da saída já gravado pode ser
+    baixado enquanto o job ainda está processando.
+    """
+    job = get_job(id)
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
-    if job.status != "completed":
-        raise HTTPException(status_code=400, detail="Processamento ainda não foi concluído")
-    
     output_path = JOBS_DIR / id / "output.mp4"
+    # Saída parcial: só MP4 fragmentado, e só até o último fragmento completo
+    partial = job.status == "processing" and job.parameters.get("output_format") == "fmp4" and output_path.exists()
+    
+    if job.status != "completed" and not partial:
+        raise HTTPException(status_code=400, detail="Processamento ainda não foi concluído")
     
     print(f"[Download] Download solicitado para job {id}")
     print(f"[Download] Caminho do arquivo: {output_path}")
     print(f"[Download] Arquivo existe: {output_path.exists()}")
     
-    if output_path.exists():
-        file_size = output_path.stat().st_size
-        print(f"[Download] Tamanho do arquivo: {file_size} bytes")
-    
     if not output_path.exists():
         raise HTTPException(status_code=404, detail="Arquivo de saída não encontrado")
     
+    size = await run_in_threadpool(complete_prefix_size, output_path) if partial else None
+    print(f"[Download] Tamanho do arquivo: {size if partial else output_path.stat().st_size} bytes{' (parcial)' if partial else ''}")
+    
     filename = f"{job.file_name.split('.')[0]}_processed.mp4"
     print(f"[Download] Nome do arquivo para download: {filename}")
     
-    # Criar resposta do arquivo
-    response = FileResponse(
-        path=str(output_path),
-        media_type="video/mp4",
-        filename=filename,
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Access-Control-Expose-Headers": "Content-Disposition"
-        }
-    )
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Access-Control-Expose-Headers": "Content-Disposition, Content-Range, Accept-Ranges, ETag"
+    }
+    if partial:
+        # O conteúdo muda a cada fragmento gravado
+        headers["Cache-Control"] = "no-store"
+        headers["X-Partial-Output"] = "true"
+    
+    response = ranged_file_response(request, output_path, "video/mp4", headers, size)
     
-    # Agendar limpeza do job após o download (se habilitado)
-    if AUTO_CLEANUP_AFTER_DOWNLOAD:
-        import asyncio
-        asyncio.create_task(cleanup_job_after_download(id))
+    # Agendar limpeza do job só após o download completo de um job concluído
+    # (pedidos com Range são seeks do player, retomadas ou downloads em partes)
+    # (agendada no banco: o executor faz a limpeza, seja qual for o worker que atendeu o download)
+    if AUTO_CLEANUP_AFTER_DOWNLOAD and not partial and response.status_code == 200:
+        cleanup_at = datetime.now() + timedelta(seconds=CLEANUP_DELAY_SECONDS)
+        job_store.update(id, {"cleanup_at": cleanup_at.isoformat()})
         print(f"[Download] Limpeza automática agendada para job {id}")
     
     return response
 
-async def cleanup_job_after_download(job_id: str):
-    """Limpa o job após um pequeno delay para garantir que o download foi iniciado"""
+async def run_cleanups():
+    """Executa as limpezas agendadas após os downloads e descarta uploads abandonados (só no executor)"""
+    swept_at = 0.0
+    while executor_lock.held:
+        await asyncio.sleep(CLEANUP_POLL_SECONDS)
+        if UPLOAD_SESSION_TTL > 0 and time.monotonic() - swept_at >= UPLOAD_SESSION_SWEEP_SECONDS:
+            swept_at = time.monotonic()
+            try:
+                for upload_id in await run_in_threadpool(upload_sessions.expired, UPLOAD_SESSION_TTL):
+                    await run_in_threadpool(expire_upload_session, upload_id)
+            except Exception as e:
+                print(f"[Cleanup] Erro ao varrer sessões de upload: {str(e)}")
+        try:
+            due = await run_in_threadpool(job_store.due_cleanups, datetime.now().isoformat())
+        except Exception as e:
+            print(f"[Cleanup] Erro ao consultar limpezas agendadas: {str(e)}")
+            continue
+        for job_id in due:
+            await run_in_threadpool(cleanup_job, job_id)
+
+def expire_upload_session(upload_id: str):
+    """Descarta uma sessão de upload em partes que parou de receber partes"""
+    print(f"[Cleanup] Sessão de upload {upload_id} expirada (sem partes há {UPLOAD_SESSION_TTL:.0f}s)")
+    upload_sessions.finish(upload_id)
+    record = job_store.get(upload_id)
+    if record is not None and record["live"]:
+        # O job que processava durante o upload falha; o diretório segue o ciclo do job
+        finish_live_upload(upload_id, failed=True)
+        return
+    shutil.rmtree(JOBS_DIR / upload_id, ignore_errors=True)
+
+def cleanup_job(job_id: str):
+    """Remove os arquivos de um job já baixado, mantendo o registro no histórico"""
     try:
-        # Aguardar para garantir que o download foi iniciado
-        await asyncio.sleep(CLEANUP_DELAY_SECONDS)
-        
         print(f"[Cleanup] Iniciando limpeza do job {job_id}")
         
         # Remover arquivos
@@ -411,10 +1651,9 @@ async def cleanup_job_after_download(job_id: str):
             shutil.rmtree(job_dir)
             print(f"[Cleanup] Diretório removido: {job_dir}")
         
-        # Remover do status
-        if job_id in jobs_status:
-            del jobs_status[job_id]
-            print(f"[Cleanup] Job {job_id} removido da memória")
+        # O registro fica no histórico, marcado como limpo
+        if job_store.update(job_id, {"stage": "Arquivos removidos após o download"}):
+            print(f"[Cleanup] Job {job_id} marcado como limpo no histórico")
         
         print(f"[Cleanup] Job {job_id} limpo com sucesso")
         
@@ -424,7 +1663,7 @@ async def cleanup_job_after_download(job_id: str):
 @app.get("/api/file-info/{job_id}")
 async def get_file_info(job_id: str):
     """Obter informações sobre o arquivo processado"""
-    job = jobs_status.get(job_id)
+    job = get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
@@ -448,40 +1687,219 @@ async def get_file_info(job_id: str):
     return file_info
 
 @app.get("/api/jobs")
-async def list_jobs():
-    """Listar todos os jobs"""
+async def list_jobs(
+    status: Optional[str] = None,
+    model: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0
+):
+    """Listar jobs (mais recentes primeiro), com paginação e filtros"""
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit deve estar entre 1 e 500")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset não pode ser negativo")
+    
+    records, total = await run_in_threadpool(
+        job_store.list, status, model, created_after, created_before, limit, offset
+    )
+    status_counts = await run_in_threadpool(job_store.count_by_status)
+    
+    jobs = []
+    for record in records:
+        jobs.append({
+            "id": record["id"],
+            "status": record["status"],
+            "stage": record["stage"],
+            "progress": record["progress"],
+            "file_name": record["file_name"],
+            "model": record["model"],
+            "priority": (record["parameters"] or {}).get("priority", "interactive"),
+            "created_at": record["created_at"],
+            "completed_at": record["completed_at"]
+        })
+    
     return {
-        "jobs": [
-            {
-                "id": job.id,
-                "status": job.status,
-                "stage": job.stage,
-                "progress": job.progress,
-                "file_name": job.file_name,
-                "created_at": job.created_at
-            }
-            for job in jobs_status.values()
-        ],
-        "total_jobs": len(jobs_status),
+        "jobs": jobs,
+        "total_jobs": total,
+        "limit": limit,
+        "offset": offset,
+        "status_counts": status_counts,
+        "queued_jobs": status_counts.get("queued", 0),
+        "running_jobs": status_counts.get("processing", 0),
+        "max_concurrent_jobs": MAX_CONCURRENT_JOBS,
         "auto_cleanup_enabled": AUTO_CLEANUP_AFTER_DOWNLOAD
     }
 
 @app.delete("/api/jobs/{job_id}")
 async def delete_job(job_id: str):
-    """Deletar um job e seus arquivos"""
-    if job_id not in jobs_status:
+    """Deletar um job e seus arquivos (um job em execução é cancelado antes)"""
+    if get_job(job_id) is None:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
+    # Encerrar o processamento antes de remover os arquivos que ele está usando
+    if request_cancel(job_id) == "cancelling" and not await wait_until_stopped(job_id):
+        raise HTTPException(status_code=409, detail="Job ainda está sendo cancelado, tente novamente")
+    
     # Remover arquivos
     job_dir = JOBS_DIR / job_id
     if job_dir.exists():
         shutil.rmtree(job_dir)
     
-    # Remover do status
-    del jobs_status[job_id]
+    # Remover do histórico
+    job_store.delete(job_id)
     
     return {"message": "Job deletado com sucesso"}
 
+# ---------------------------------------------------------------------------
+# Modelos e variantes INT8 (quantization.py). A quantização roda num processo
+# próprio; o estado fica em QUANTIZATION_DIR/<modelo>.json, visível para todos
+# os workers da API.
+# ---------------------------------------------------------------------------
+
+def int8_approved(model: str) -> bool:
+    """Se o modelo tem uma variante INT8 aprovada na verificação de concordância"""
+    weights = YOLO_MODELS[model]["weights"]
+    if not os.path.exists(weights):
+        return False
+    manifest = int8_manifest(weights)
+    return manifest is not None and bool(manifest.get("passed"))
+
+def read_quantization_status(model: str) -> Optional[dict]:
+    """Estado da última quantização do modelo (``running`` vira ``failed`` se o processo sumiu)"""
+    try:
+        with open(QUANTIZATION_DIR / f"{model}.json") as status_file:
+            status = json.load(status_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if status["status"] == "running" and status.get("pid"):
+        try:
+            os.kill(status["pid"], 0)
+        except OSError:
+            status.update({"status": "failed", "error": "Processo de quantização interrompido"})
+    return status
+
+def write_quantization_status(model: str, status: dict):
+    path = QUANTIZATION_DIR / f"{model}.json"
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as status_file:
+        json.dump(status, status_file)
+    os.replace(tmp_path, path)
+
+def model_info(name: str) -> dict:
+    """Pesos, variante INT8 (com a concordância) e quantização em andamento de um modelo"""
+    weights = YOLO_MODELS[name]["weights"]
+    available = os.path.exists(weights)
+    manifest = int8_manifest(weights) if available else None
+    int8 = None
+    if manifest is not None:
+        int8 = {key: manifest.get(key) for key in
+                ("mode", "passed", "agreement", "min_agreement", "calibration_frames", "reference", "created_at")}
+    return {
+        "name": name,
+        "weights": Path(weights).name,
+        "available": available,
+        "precisions": ["fp32", "int8"] if int8 and int8["passed"] else ["fp32"],
+        "int8": int8,
+        "quantization": read_quantization_status(name),
+    }
+
+def quantization_videos(model: str, reference_job: Optional[str]) -> tuple:
+    """Vídeo de referência e vídeos de calibração, tirados de jobs reais do modelo"""
+    records, _ = job_store.list(model=model, limit=100)
+    videos = [
+        JOBS_DIR / record["id"] / "input.mp4" for record in records
+        if not record["live"] or (record["upload"] or {}).get("complete")
+    ]
+    videos = [video for video in videos if video.exists()]
+    
+    if reference_job:
+        reference = JOBS_DIR / reference_job / "input.mp4"
+        if not reference.exists():
+            raise HTTPException(status_code=404, detail="Vídeo do job de referência não encontrado")
+    elif videos:
+        reference = videos[0]
+    else:
+        raise HTTPException(status_code=409, detail=f"Nenhum vídeo de job do modelo '{model}' disponível para a verificação")
+    
+    # Calibrar com outros vídeos; com um único vídeo disponível, ele é usado nos dois papéis
+    calibration = [video for video in videos if video != reference][:QUANTIZATION_CALIBRATION_JOBS] or [reference]
+    return reference, calibration
+
+async def run_quantization(model: str, command: List[str], status: dict):
+    """Executa o quantization.py e grava o resultado no estado da quantização"""
+    log_path = QUANTIZATION_DIR / f"{model}.log"
+    with open(log_path, "w") as log_file:
+        process = await asyncio.create_subprocess_exec(*command, stdout=log_file, stderr=asyncio.subprocess.STDOUT)
+        status["pid"] = process.pid
+        write_quantization_status(model, status)
+        print(f"[Quantização {model}] Iniciada (pid {process.pid}, log: {log_path})")
+        return_code = await process.wait()
+    
+    status["finished_at"] = datetime.now().isoformat()
+    if return_code == 0:
+        status["status"] = "completed"
+    else:
+        with open(log_path) as log_file:
+            tail = log_file.read()[-2000:]
+        status.update({"status": "failed", "error": f"quantization.py terminou com código {return_code}: {tail}"})
+    write_quantization_status(model, status)
+    print(f"[Quantização {model}] {status['status']}")
+
+@app.get("/api/models")
+async def list_models():
+    """Modelos, precisões disponíveis e o resultado da verificação das variantes INT8"""
+    models = await run_in_threadpool(lambda: [model_info(name) for name in YOLO_MODELS])
+    return {"models": models, "inference_backend": INFERENCE_BACKEND}
+
+@app.post("/api/models/{model}/quantize")
+async def quantize_model(
+    model: str,
+    mode: str = Form("dynamic"),
+    reference_job: Optional[str] = Form(None),
+    min_agreement: Optional[float] = Form(None)
+):
+    """Gera a variante INT8 do modelo e compara suas decisões com o FP32
+
+    A calibração (modo ``static``) usa frames de vídeos de jobs do modelo; a
+    comparação usa o vídeo de ``reference_job`` (padrão: o job mais recente).
+    A variante só pode ser escolhida por job (``precision=int8``) se for aprovada.
+    """
+    if model not in YOLO_MODELS:
+        raise HTTPException(status_code=404, detail=f"Modelo '{model}' não encontrado")
+    if mode not in QUANTIZATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode deve ser um de: {', '.join(QUANTIZATION_MODES)}")
+    weights = YOLO_MODELS[model]["weights"]
+    if not os.path.exists(weights):
+        raise HTTPException(status_code=404, detail=f"Pesos do modelo não encontrados: {weights}")
+    current = read_quantization_status(model)
+    if current is not None and current["status"] == "running":
+        raise HTTPException(status_code=409, detail="Quantização deste modelo já está em andamento")
+    
+    reference, calibration = await run_in_threadpool(quantization_videos, model, reference_job)
+    command = [
+        sys.executable, str(Path(__file__).with_name("quantization.py")),
+        "--weights", weights, "--mode", mode, "--reference", str(reference),
+        "--calibration-videos", *[str(video) for video in calibration],
+    ]
+    if min_agreement is not None:
+        command.extend(["--min-agreement", str(min_agreement)])
+    
+    status = {
+        "status": "running",
+        "mode": mode,
+        "reference": reference.parent.name,
+        "calibration_jobs": [video.parent.name for video in calibration],
+        "started_at": datetime.now().isoformat(),
+        "pid": None,
+    }
+    write_quantization_status(model, status)
+    asyncio.create_task(run_quantization(model, command, status))
+    
+    return {"model": model, "status": "running", "mode": mode, "reference_job": reference.parent.name,
+            "calibration_jobs": len(calibration)}
+
 @app.get("/")
 async def root():
     return {
@@ -494,12 +1912,19 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint para Docker"""
+    # O tamanho do cache percorre o diretório no disco
+    cache_stats = await run_in_threadpool(result_cache.stats) if result_cache is not None else None
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "version": "1.0.0",
         "auto_cleanup": AUTO_CLEANUP_AFTER_DOWNLOAD,
-        "cleanup_delay": CLEANUP_DELAY_SECONDS
+        "cleanup_delay": CLEANUP_DELAY_SECONDS,
+        "result_cache": cache_stats,
+        "inference_backend": INFERENCE_BACKEND,
+        "executor": executor_lock.held,
+        "executor_id": EXECUTOR_ID,
+        "running_here": len(running_jobs)
     }
 
 if __name__ == "__main__":
@@ -511,10 +1936,12 @@ if __name__ == "__main__":
     print("🌐 Servidor: http://0.0.0.0:8000")
     print("📖 Documentação: http://0.0.0.0:8000/docs")
     
+    # Com mais de um worker o uvicorn precisa importar a aplicação pelo caminho
     uvicorn.run(
-        app, 
+        "main:app" if UVICORN_WORKERS > 1 else app, 
         host="0.0.0.0", 
         port=8000,
+        workers=UVICORN_WORKERS,
         timeout_keep_alive=600,  # 10 minutes
         limit_max_requests=1000,
         access_log=True
@@ -0,0 +1,209 @@
+"""Variantes INT8 dos modelos (ONNX Runtime) com verificação de concordância.
+
+A partir da exportação ONNX FP32 de ``inference_backend``, gera uma variante
+quantizada em INT8, dinâmica (só os pesos; sem calibração) ou estática (pesos
+e ativações, calibradas com frames de vídeos de jobs reais). Antes de ser
+usada, a variante roda junto com o modelo FP32 num vídeo de referência, e a
+concordância das decisões de manter/descartar cada frame (qualquer classe e
+cada classe detectada) fica registrada no manifesto. Só uma variante com
+concordância mínima ``QUANTIZATION_MIN_AGREEMENT`` pode ser escolhida por job
+(``precision=int8``).
+
+Roda num processo próprio, iniciado pela API (``POST /api/models/{model}/quantize``)
+ou pela linha de comando:
+``python quantization.py --weights /data/models/diurnov5.1.pt --mode static --calibration-videos a.mp4 b.mp4 --reference ref.mp4``
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from file_lock import locked
+from inference_backend import EXPORT_IMGSZ, MANIFEST, compiled_dir, export_model, weights_hash
+
+QUANTIZATION_MODES = ("dynamic", "static")
+# Fração mínima de frames com a mesma decisão do FP32 para a variante ser aprovada
+MIN_AGREEMENT = float(os.environ.get("QUANTIZATION_MIN_AGREEMENT", "0.98"))
+CALIBRATION_FRAMES = int(os.environ.get("QUANTIZATION_CALIBRATION_FRAMES", "200"))
+REFERENCE_FRAMES = int(os.environ.get("QUANTIZATION_REFERENCE_FRAMES", "500"))
+
+
+def sample_frames(video_paths, count):
+    """ Up to ``count`` frames spread evenly over ``video_paths``. """
+    frames = []
+    per_video = max(1, count // max(1, len(video_paths)))
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(str(video_path))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        step = max(1, total // per_video) if total else 1
+        for position in range(0, total or per_video, step)[:per_video]:
+            if total:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            success, frame = cap.read()
+            if not success:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames[:count]
+
+
+def letterbox(frame, imgsz=EXPORT_IMGSZ):
+    """ Same input as the exported model gets from ultralytics: square letterbox, RGB, 0-1, NCHW. """
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized_w, resized_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    top = (imgsz - resized_h) // 2
+    left = (imgsz - resized_w) // 2
+    image = cv2.copyMakeBorder(resized, top, imgsz - resized_h - top, left, imgsz - resized_w - left,
+                               cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    image = image[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+
+
+def _calibration_reader(model_path, frames):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            return None if frame is None else {input_name: letterbox(frame)}
+
+    return FrameReader()
+
+
+def quantize(fp32_path, int8_path, mode, calibration_frames=None):
+    """ Writes the INT8 version of the ONNX model ``fp32_path`` to ``int8_path``. """
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if mode == "dynamic":
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+    else:
+        if not calibration_frames:
+            raise ValueError("Static quantization needs calibration frames")
+        quantize_static(fp32_path, int8_path, _calibration_reader(fp32_path, calibration_frames),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8, per_channel=True)
+
+    # ultralytics reads the class names, stride and imgsz from the model metadata
+    source = onnx.load(fp32_path)
+    target = onnx.load(int8_path)
+    del target.metadata_props[:]
+    target.metadata_props.extend(source.metadata_props)
+    onnx.save(target, int8_path)
+
+
+def decisions(model, frames, batch_size=8):
+    """ Set of detected classes per frame. """
+    detected = []
+    for start in range(0, len(frames), batch_size):
+        results = model.predict(source=frames[start:start + batch_size], save=False, verbose=False)
+        for result in results:
+            boxes = result.boxes
+            detected.append(set(int(c) for c in boxes.cls.tolist()) if boxes is not None else set())
+    return detected
+
+
+def compare(reference, candidate):
+    """ Per-frame keep/drop agreement for "any class" and for each class seen in either run. """
+    total = len(reference)
+    any_class = sum(bool(a) == bool(b) for a, b in zip(reference, candidate)) / total
+    classes = sorted(set().union(*reference, *candidate))
+    per_class = {
+        str(cls): round(sum((cls in a) == (cls in b) for a, b in zip(reference, candidate)) / total, 4)
+        for cls in classes
+    }
+    return {
+        "frames": total,
+        "any_class": round(any_class, 4),
+        "per_class": per_class,
+        "minimum": round(min([any_class] + list(per_class.values())), 4),
+    }
+
+
+def build_int8(weights_path, mode, calibration_videos, reference_video, min_agreement=MIN_AGREEMENT):
+    """ Quantizes ``weights_path``, checks it against FP32 on ``reference_video`` and caches the result.
+
+    The variant is kept even when it fails the check, so the agreement can be
+    inspected; only approved variants can be loaded.
+    """
+    import engine
+
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}' (expected one of {', '.join(QUANTIZATION_MODES)})")
+    reference_frames = sample_frames([reference_video], REFERENCE_FRAMES)
+    if not reference_frames:
+        raise ValueError(f"No frames read from the reference clip {reference_video}")
+    calibration_frames = sample_frames(calibration_videos, CALIBRATION_FRAMES) if mode == "static" else None
+
+    fp32_path = export_model(weights_path, "onnx")
+    target = compiled_dir(weights_path, "onnx", "int8")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with locked(target.parent / f"{target.name}.lock"):
+        work_dir = Path(tempfile.mkdtemp(prefix=".quantize-", dir=target.parent))
+        try:
+            int8_path = work_dir / f"{Path(weights_path).stem}-int8.onnx"
+            print(f"Quantizing {weights_path} to INT8 ({mode}, {len(calibration_frames or [])} calibration frames)")
+            quantize(fp32_path, str(int8_path), mode, calibration_frames)
+
+            print(f"Comparing INT8 and FP32 decisions on {len(reference_frames)} frames of {reference_video}")
+            agreement = compare(decisions(engine.load_model(weights_path), reference_frames),
+                                decisions(engine.YOLO(str(int8_path), task="detect"), reference_frames))
+            manifest = {
+                "weights": os.path.basename(weights_path),
+                "weights_hash": weights_hash(weights_path),
+                "backend": "onnx",
+                "variant": "int8",
+                "mode": mode,
+                "imgsz": EXPORT_IMGSZ,
+                "artifact": int8_path.name,
+                "calibration_frames": len(calibration_frames or []),
+                "reference": os.path.basename(str(reference_video)),
+                "agreement": agreement,
+                "min_agreement": min_agreement,
+                "passed": agreement["minimum"] >= min_agreement,
+                "created_at": datetime.now().isoformat(),
+            }
+            with open(work_dir / MANIFEST, "w") as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            if target.exists():
+                shutil.rmtree(target)
+            os.rename(work_dir, target)
+        finally:
+            if work_dir.exists():
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"INT8 agreement {agreement['minimum']:.2%} (minimum {min_agreement:.2%}): "
+          f"{'approved' if manifest['passed'] else 'rejected'}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and check the INT8 variant of a YOLO model")
+    parser.add_argument("--weights", required=True, help="path to the .pt weights")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, default="dynamic")
+    parser.add_argument("--calibration-videos", nargs="*", default=[], help="videos sampled for static calibration")
+    parser.add_argument("--reference", required=True, help="clip used to compare INT8 and FP32 decisions")
+    parser.add_argument("--min-agreement", default=MIN_AGREEMENT, type=float)
+    args = parser.parse_args()
+
+    manifest = build_int8(args.weights, args.mode, args.calibration_videos, args.reference, args.min_agreement)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Re-corte de um job a partir do índice de detecções, sem carregar o modelo.
+
+Recalcula os frames mantidos com outro filtro de classes, confiança mínima,
+padding ou ``maxframes`` e monta a saída de novo: por cópia de stream quando
+não há calibração, ou decodificando o vídeo e re-encodando só os frames
+mantidos (que é o custo de um encode, sem a inferência).
+"""
+import cv2
+import numpy as np
+
+import stream_cut
+from calibration import cached_undistort_maps
+from detection_index import frame_decisions, load_index
+from fragmented_mp4 import FragmentedMp4Writer
+from segments import kept_ranges_from_decisions
+
+
+def reencode_ranges(video_path, frame_ranges, output_path, fps, calibration_file_path=None, fragmented=False):
+    """Decodifica o vídeo e grava só os frames dos intervalos [início, fim)"""
+    cap = cv2.VideoCapture(video_path)
+    writer = None
+    map1 = map2 = None
+    undistorted = None
+    last_frame = frame_ranges[-1][1] if frame_ranges else 0
+    range_iter = iter(frame_ranges)
+    current = next(range_iter, None)
+    frame_index = 0
+
+    try:
+        while frame_index < last_frame and current is not None:
+            keep = current[0] <= frame_index < current[1]
+            # Frames fora dos intervalos só avançam o decoder (sem conversão para BGR)
+            if keep:
+                success, frame = cap.read()
+            else:
+                success, frame = cap.grab(), None
+            if not success:
+                break
+
+            if keep:
+                if calibration_file_path:
+                    if map1 is None:
+                        h, w = frame.shape[:2]
+                        map1, map2 = cached_undistort_maps(calibration_file_path, w, h)
+                        undistorted = np.empty(map2.shape + (3,), np.uint8)
+                    frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=undistorted)
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    if fragmented:
+                        writer = FragmentedMp4Writer(output_path, fps, (w, h))
+                    else:
+                        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"xvid"), fps, (w, h), True)
+                writer.write(frame)
+
+            frame_index += 1
+            if frame_index >= current[1]:
+                current = next(range_iter, None)
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    if writer is None:
+        open(output_path, "wb").close()
+
+
+def kept_frame_ranges(index_dir, classes=None, min_confidence=0.0, pad_before=0, pad_after=0, max_frames=0):
+    """Recalcula os intervalos [início, fim) mantidos a partir do índice
+
+    Retorna ``(fps, intervalos)``.
+    """
+    index = load_index(index_dir)
+    decisions = frame_decisions(index, classes, min_confidence)
+    return index["meta"]["fps"], kept_ranges_from_decisions(decisions, pad_before, pad_after, max_frames)
+
+
+def recut_job(video_path, index_dir, output_path, classes=None, min_confidence=0.0,
+              pad_before=0, pad_after=0, max_frames=0, calibration_file_path=None,
+              stream_copy=True, exact_cuts=False, fragmented=False):
+    """Remonta ``output_path`` a partir do índice com novos parâmetros
+
+    Retorna os intervalos de frames mantidos.
+    """
+    fps, frame_ranges = kept_frame_ranges(index_dir, classes, min_confidence, pad_before, pad_after, max_frames)
+
+    if stream_copy and not calibration_file_path:
+        stream_cut.cut_frame_ranges(video_path, frame_ranges, fps, output_path, exact=exact_cuts, fragmented=fragmented)
+    else:
+        reencode_ranges(video_path, frame_ranges, output_path, fps, calibration_file_path, fragmented)
+    return frame_ranges
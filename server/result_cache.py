@@ -0,0 +1,145 @@
+"""Cache de resultados em disco, indexado pelo conteúdo do vídeo e pelos parâmetros.
+
+A chave combina o hash do arquivo enviado (calculado durante o upload) com
+todos os parâmetros que mudam a saída. Cada entrada é um diretório com o
+``output.mp4`` e o índice de detecções do job que a gerou. A saída é ligada por
+hard link (cópia quando o sistema de arquivos não permite), então um hit
+completa o job na hora; os metadados pequenos (``segments.json`` e o índice)
+são copiados, porque o re-corte de um job os reescreve. Quando o cache passa de ``max_bytes``, as
+entradas usadas há mais tempo são removidas (LRU pelo mtime do diretório).
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+
+# Parâmetros do job que mudam o resultado (e por isso entram na chave)
+KEY_PARAMETERS = [
+    "model", "calibration", "classes", "maxframes",
+    "stride", "pad_before", "pad_after", "motion_threshold", "cut_mode",
+    "output_format",
+]
+
+# Arquivos ligados por hard link; só são substituídos por inteiro (``os.replace``),
+# nunca reescritos no lugar, então o job e a entrada do cache podem dividi-los
+LINKED_FILES = {"output.mp4"}
+
+
+def new_content_hash():
+    """Hash incremental usado para o conteúdo dos uploads"""
+    return hashlib.blake2b(digest_size=32)
+
+
+def _link_tree(source: Path, destination: Path, link: bool = True):
+    """Replica ``source`` em ``destination`` com hard links (ou cópias, sem ``link``)"""
+    if source.is_dir():
+        destination.mkdir(parents=True, exist_ok=True)
+        for child in source.iterdir():
+            _link_tree(child, destination / child.name, link)
+        return
+    if not link:
+        shutil.copy2(source, destination)
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _tree_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class ResultCache:
+    """Cache LRU de saídas de jobs, limitado em bytes"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash: str, parameters: dict, settings: Optional[dict] = None) -> str:
+        """Chave do cache para um conteúdo e um conjunto de parâmetros
+
+        ``settings`` são configurações do servidor que também mudam a saída
+        (ex.: o ``imgsz`` da detecção); sem nenhuma, a chave é a mesma de antes.
+        """
+        relevant = {name: parameters.get(name) for name in KEY_PARAMETERS}
+        # Só entram na chave fora do padrão, para não invalidar as entradas anteriores
+        if parameters.get("precision", "fp32") != "fp32":
+            relevant["precision"] = parameters["precision"]
+        if parameters.get("roi"):
+            relevant["roi"] = parameters["roi"]
+        if parameters.get("undistort_mode", "lowres") != "lowres":
+            relevant["undistort_mode"] = parameters["undistort_mode"]
+        if settings:
+            relevant["settings"] = settings
+        payload = json.dumps({"content": content_hash, "parameters": relevant}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, key: str, job_dir: Path) -> bool:
+        """Em caso de hit, liga a saída em cache dentro de ``job_dir`` e retorna True"""
+        entry = self.cache_dir / key
+        with self._lock:
+            if not (entry / "output.mp4").exists():
+                return False
+            for child in entry.iterdir():
+                target = job_dir / child.name
+                if target.is_dir():
+                    shutil.rmtree(target)
+                elif target.exists():
+                    target.unlink()
+                _link_tree(child, target, child.name in LINKED_FILES)
+            # Marcar como usado recentemente
+            os.utime(entry)
+        return True
+
+    def store(self, key: str, job_dir: Path):
+        """Guarda a saída (e o índice de detecções) de um job concluído"""
+        entry = self.cache_dir / key
+        tmp_entry = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        try:
+            tmp_entry.mkdir(parents=True)
+            for name in ("output.mp4", "segments.json", "index"):
+                source = job_dir / name
+                if source.exists():
+                    _link_tree(source, tmp_entry / name, name in LINKED_FILES)
+            with self._lock:
+                if entry.exists():
+                    shutil.rmtree(entry)
+                os.rename(tmp_entry, entry)
+        finally:
+            if tmp_entry.exists():
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove as entradas menos usadas até o cache caber em ``max_bytes``"""
+        with self._lock:
+            entries = []
+            for entry in self.cache_dir.iterdir():
+                if entry.is_dir() and not entry.name.startswith(".tmp-"):
+                    entries.append((entry.stat().st_mtime, _tree_size(entry), entry))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda item: item[0]):
+                if total <= self.max_bytes:
+                    break
+                print(f"[Cache] Removendo entrada {entry.name} ({size / (1024 * 1024):.1f} MB)")
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = [e for e in self.cache_dir.iterdir() if e.is_dir() and not e.name.startswith(".tmp-")]
+            return {
+                "entries": len(entries),
+                "size_bytes": sum(_tree_size(e) for e in entries),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,83 @@
+"""Região de interesse (ROI): polígono da área da imagem onde a detecção vale.
+
+Câmeras anguladas gastam a maior parte dos pixels com céu, prédios e calçada.
+Com uma ROI, o detector só recebe o retângulo envolvente do polígono (recortado
+da cópia reduzida do frame) e as caixas cujo centro fica fora do polígono são
+descartadas, então elas não mantêm frames nem entram no índice de detecções.
+
+Formato (arquivo ``<ROI_DIR>/<nome>.json`` ou o próprio JSON enviado no job)::
+
+    {"polygon": [[0.1, 0.45], [0.9, 0.45], [1.0, 1.0], [0.0, 1.0]], "normalized": true}
+
+Com ``normalized`` (padrão), as coordenadas são frações da largura e da altura
+do frame de saída (já sem distorção, com calibração); sem ele, são pixels.
+"""
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+
+def parse_roi(value):
+    """ Validated ROI from a dict, a JSON string or the path of a JSON file. """
+    if isinstance(value, str):
+        if os.path.exists(value):
+            with open(value) as roi_file:
+                value = json.load(roi_file)
+        else:
+            value = json.loads(value)
+    if isinstance(value, list):
+        value = {"polygon": value}
+    polygon = value.get("polygon") if isinstance(value, dict) else None
+    if not isinstance(polygon, list) or len(polygon) < 3:
+        raise ValueError("ROI polygon needs at least 3 points")
+    try:
+        points = [[float(x), float(y)] for x, y in polygon]
+    except (TypeError, ValueError):
+        raise ValueError("ROI polygon points must be [x, y] pairs")
+    normalized = bool(value.get("normalized", True))
+    if normalized and any(not 0 <= c <= 1 for point in points for c in point):
+        raise ValueError("Normalized ROI coordinates must be between 0 and 1")
+    return {"polygon": points, "normalized": normalized}
+
+
+class RoiMask:
+    """ ROI in the coordinates of the detector's copy of the frame.
+
+    ``width`` x ``height`` is the output frame and ``scale`` the size of the
+    detector's copy relative to it. ``crop`` is the polygon's bounding box
+    (x0, y0, x1, y1) in the detector's copy.
+    """
+
+    def __init__(self, roi, width, height, scale=1.0):
+        points = np.asarray(roi["polygon"], dtype=np.float32)
+        if roi.get("normalized", True):
+            points = points * np.float32([width, height])
+        self.polygon = points * np.float32(scale)
+
+        detect_w = max(1, int(width * scale))
+        detect_h = max(1, int(height * scale))
+        x0 = min(max(0, math.floor(self.polygon[:, 0].min())), detect_w - 1)
+        y0 = min(max(0, math.floor(self.polygon[:, 1].min())), detect_h - 1)
+        x1 = max(min(detect_w, math.ceil(self.polygon[:, 0].max())), x0 + 1)
+        y1 = max(min(detect_h, math.ceil(self.polygon[:, 1].max())), y0 + 1)
+        self.crop = (x0, y0, x1, y1)
+
+    @property
+    def size(self):
+        x0, y0, x1, y1 = self.crop
+        return x1 - x0, y1 - y0
+
+    def inside(self, boxes_xyxy):
+        """ Which boxes (xyxy, in crop coordinates) have their center inside the polygon. """
+        x0, y0 = self.crop[:2]
+        return self.contains(np.asarray(boxes_xyxy, dtype=np.float32) + np.float32([x0, y0, x0, y0]))
+
+    def contains(self, boxes_xyxy):
+        """ Which boxes (xyxy, in the detector's copy of the frame) have their center inside the polygon. """
+        contour = self.polygon.reshape(-1, 1, 2)
+        centers = [((x_a + x_b) / 2, (y_a + y_b) / 2) for x_a, y_a, x_b, y_b in boxes_xyxy]
+        return np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0 for x, y in centers],
+                        dtype=bool)
@@ -0,0 +1,100 @@
+"""Compara os backends de inferência (fps e decisões de manter/descartar frames).
+
+Roda os mesmos frames de um vídeo por cada backend e mostra o fps da
+inferência e a concordância das decisões por frame com o PyTorch. Termina
+com código 1 se algum backend discordar em mais de ``--tolerance`` dos frames.
+
+Uso: ``python scripts/benchmark_backends.py --weights /data/models/diurnov5.1.pt --video clip.mp4``
+"""
+import argparse
+import os
+import sys
+import time
+
+# The filter engine lives in the server package, one directory above the scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+import engine
+from inference_backend import BACKENDS
+
+
+def read_frames(video_path, count, step):
+    """ Up to ``count`` frames, one every ``step`` frames of the video. """
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        success, frame = cap.read()
+        if not success:
+            break
+        if index % step == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def run_backend(weights_path, backend, frames, batch_size, classes):
+    """ (decisions, inference fps) of ``backend`` over ``frames``. """
+    model = engine.load_model(weights_path, backend)
+    # Aquecimento: a primeira chamada inclui alocações e compilação do runtime
+    model.predict(source=frames[:batch_size], save=False, verbose=False)
+    decisions = []
+    started = time.monotonic()
+    for start in range(0, len(frames), batch_size):
+        results = model.predict(source=frames[start:start + batch_size], save=False, verbose=False)
+        decisions.extend(engine.has_class_detection(result, classes) for result in results)
+    elapsed = time.monotonic() - started
+    return decisions, len(frames) / elapsed if elapsed > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference backends on a video clip")
+    parser.add_argument("--weights", required=True, help="path to the .pt weights")
+    parser.add_argument("--video", required=True, help="reference clip")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma separated backends to compare")
+    parser.add_argument("--frames", default=300, type=int, help="frames to run through each backend")
+    parser.add_argument("--step", default=1, type=int, help="use one frame every N frames of the clip")
+    parser.add_argument("--batch", default=8, type=int, help="frames per predict call")
+    parser.add_argument("--classes", default="", help="class filter used for the keep/drop decision")
+    parser.add_argument("--tolerance", default=0.01, type=float, help="maximum fraction of frames whose decision may differ from torch")
+    args = parser.parse_args()
+
+    classes = [int(x) for x in args.classes.split(",") if x]
+    frames = read_frames(args.video, args.frames, max(1, args.step))
+    if not frames:
+        raise SystemExit(f"No frames read from {args.video}")
+    print(f"{len(frames)} frames, batch {args.batch}")
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    if "torch" in backends:
+        backends.remove("torch")
+    backends.insert(0, "torch")
+
+    reference = None
+    failed = False
+    print(f"{'backend':<10} {'fps':>8} {'kept':>6} {'agreement':>10}")
+    for backend in backends:
+        try:
+            decisions, fps = run_backend(args.weights, backend, frames, max(1, args.batch), classes)
+        except Exception as e:
+            if reference is None:
+                # Sem o PyTorch não há referência para as decisões
+                raise
+            print(f"{backend:<10} error: {e}")
+            failed = True
+            continue
+        if reference is None:
+            reference = decisions
+        agreement = sum(a == b for a, b in zip(decisions, reference)) / len(frames)
+        if 1 - agreement > args.tolerance:
+            failed = True
+        print(f"{backend:<10} {fps:>8.2f} {sum(decisions):>6} {agreement:>10.2%}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
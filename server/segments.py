@@ -0,0 +1,72 @@
+"""Decisão de quais frames entram na saída a partir das amostras do detector.
+
+Usado pelo engine durante a inferência e pelo re-corte a partir do índice de
+detecções, que precisam produzir exatamente os mesmos segmentos.
+"""
+from collections import deque
+
+
+class SegmentKeeper:
+    """ Decides which frames are written when the detector only sees some of them.
+
+    Every positive sample keeps a window of ``pad_before`` frames before it and
+    ``pad_after`` frames after it. Frames are written in decode order; frames
+    that may still fall inside the window of a future positive sample wait in a
+    short look-back buffer.
+    """
+
+    def __init__(self, write, pad_before=0, pad_after=0, max_frames=0):
+        self.write = write
+        self.pad_before = max(0, pad_before)
+        self.pad_after = max(0, pad_after)
+        self.max_frames = max_frames
+        self.kept = 0
+        self.keep_until = -1
+        self.lookback = deque()
+
+    def _write(self, frame):
+        self.kept += 1
+        self.write(frame)
+        return self.max_frames > 0 and self.kept > self.max_frames
+
+    def push(self, index, frame, positive):
+        """ Feeds the next frame; ``positive`` is None for frames the detector skipped.
+        Returns True when max_frames has been exceeded. """
+        if positive:
+            while self.lookback:
+                lookback_index, lookback_frame = self.lookback.popleft()
+                if lookback_index >= index - self.pad_before and self._write(lookback_frame):
+                    return True
+            self.keep_until = max(self.keep_until, index + self.pad_after)
+
+        if index <= self.keep_until:
+            return self._write(frame)
+
+        self.lookback.append((index, frame))
+        while self.lookback and self.lookback[0][0] <= index - self.pad_before:
+            self.lookback.popleft()
+        return False
+
+
+class RangeRecorder:
+    """ Collects kept frame indices as contiguous [start, end) ranges. """
+
+    def __init__(self):
+        self.ranges = []
+
+    def __call__(self, index):
+        if self.ranges and self.ranges[-1][1] == index:
+            self.ranges[-1][1] = index + 1
+        else:
+            self.ranges.append([index, index + 1])
+
+
+def kept_ranges_from_decisions(decisions, pad_before=0, pad_after=0, max_frames=0):
+    """ Replays per-frame decisions (True/False, or None for frames the detector skipped)
+    through a SegmentKeeper and returns the kept [start, end) frame ranges. """
+    recorder = RangeRecorder()
+    keeper = SegmentKeeper(recorder, pad_before, pad_after, max_frames)
+    for index, positive in enumerate(decisions):
+        if keeper.push(index, index, positive):
+            break
+    return recorder.ranges
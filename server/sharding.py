@@ -0,0 +1,354 @@
+"""Processamento de um vídeo longo em paralelo, dividido em partes por tempo.
+
+Num único processo, uma gravação de 12 horas usa um decoder e uma instância do
+modelo, não importa quantos núcleos a máquina tenha. Aqui o vídeo é dividido
+em partes nos keyframes (``ffmpeg -f segment -c copy``, sem re-encode) e cada
+parte é processada por um processo próprio, com sua instância do modelo, que
+só gera o índice de detecções da parte. Os índices são concatenados em ordem
+e os intervalos mantidos são calculados uma única vez a partir do índice
+completo, pelo mesmo caminho do re-corte: o padding atravessa as fronteiras
+entre as partes e ``maxframes`` continua valendo para o vídeo inteiro.
+
+A saída por cópia de stream é montada direto do vídeo original. Com re-encode
+(calibração ou ``cut_mode=reencode``), cada parte re-encoda em paralelo os seus
+frames mantidos e as saídas das partes são concatenadas por cópia de stream.
+
+Também é o ponto de entrada de cada processo de parte
+(``python sharding.py --weights ... --video ...`` para o índice,
+``python sharding.py --ranges ... --video ... --output ...`` para o re-encode).
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess as sp
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import stream_cut
+from detection_index import load_index, merge_indexes
+from live_input import probe_video_stream
+from recut import kept_frame_ranges, recut_job, reencode_ranges
+
+# Duração mínima de cada parte (s): dividir um vídeo curto não compensa o custo
+# de carregar um modelo por processo
+SHARD_MIN_SECONDS = float(os.environ.get("SHARD_MIN_SECONDS", "600"))
+
+
+def plan_cut_times(duration, shards, min_seconds=SHARD_MIN_SECONDS):
+    """ Times that split ``duration`` seconds into up to ``shards`` equal parts of at least ``min_seconds``. """
+    count = min(shards, int(duration // min_seconds)) if min_seconds > 0 else shards
+    if count < 2:
+        return []
+    return [duration * i / count for i in range(1, count)]
+
+
+def split_video(video_path, cut_times, work_dir):
+    """ Splits the first video stream at the first keyframe after each cut time; returns the parts in order. """
+    command = [
+        "ffmpeg", "-y", "-v", "error", "-i", video_path, "-map", "0:v:0", "-c", "copy",
+        "-f", "segment", "-segment_times", ",".join(f"{t:.3f}" for t in cut_times),
+        "-reset_timestamps", "1", os.path.join(work_dir, "shard%03d.ts"),
+    ]
+    result = sp.run(command, stdout=sp.PIPE, stderr=sp.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou ({result.returncode}): {result.stderr.decode(errors='replace')[-2000:]}")
+    return sorted(glob.glob(os.path.join(work_dir, "shard*.ts")))
+
+
+class ShardProgress:
+    """ Combines the progress reported by each part into the stats of the whole video. """
+
+    def __init__(self, total_frames, callback, interval=1.0):
+        self.total_frames = total_frames
+        self.callback = callback
+        self.interval = interval
+        self.started = time.monotonic()
+        self.shards = {}
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    def update(self, index, stats):
+        with self._lock:
+            self.shards[index] = stats
+        self.report()
+
+    def stats(self):
+        with self._lock:
+            shards = list(self.shards.values())
+        elapsed = time.monotonic() - self.started
+        processed = sum(s["frames_processed"] for s in shards)
+        fps = processed / elapsed if elapsed > 0 else 0.0
+        gated = sum(s["frames_gated"] for s in shards)
+        return {
+            "frames_processed": processed,
+            "total_frames": self.total_frames,
+            "frames_kept": None,
+            "frames_gated": gated,
+            "motion_skip_ratio": round(sum(s["motion_skip_ratio"] * s["frames_processed"] for s in shards) / processed, 4) if processed else 0.0,
+            "percent": round(100.0 * processed / self.total_frames, 2) if self.total_frames else None,
+            "fps": round(fps, 2),
+            "decode_fps": round(sum(s["decode_fps"] or 0 for s in shards), 2) or None,
+            "inference_fps": round(sum(s["inference_fps"] or 0 for s in shards), 2) or None,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(max(self.total_frames - processed, 0) / fps, 1) if self.total_frames and fps > 0 else None,
+            "shards": len(shards),
+        }
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        if self.callback is not None:
+            self.callback(self.stats())
+
+
+def _follow(index, process, progress, tail):
+    """ Reads a part's output: progress lines are combined, the rest goes to the log. """
+    for raw_line in process.stdout:
+        line = raw_line.decode(errors="replace").rstrip()
+        if line.startswith("PROGRESS "):
+            try:
+                progress.update(index, json.loads(line[len("PROGRESS "):]))
+            except ValueError:
+                pass
+        else:
+            tail.append(line)
+            print(f"[shard {index}] {line}", flush=True)
+
+
+def run_shards(commands, progress):
+    """ Runs one process per part and waits for all of them; any failure stops the others. """
+    threads = max(1, (os.cpu_count() or 1) // len(commands))
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+    processes = []
+    followers = []
+    tails = []
+    try:
+        for index, command in enumerate(commands):
+            process = sp.Popen(command + ["--threads", str(threads)], stdout=sp.PIPE, stderr=sp.STDOUT, env=env)
+            tail = deque(maxlen=20)
+            follower = threading.Thread(target=_follow, args=(index, process, progress, tail), daemon=True)
+            follower.start()
+            processes.append(process)
+            followers.append(follower)
+            tails.append(tail)
+
+        pending = set(range(len(processes)))
+        while pending:
+            for index in list(pending):
+                code = processes[index].poll()
+                if code is None:
+                    continue
+                pending.discard(index)
+                if code != 0:
+                    followers[index].join(timeout=5)
+                    raise RuntimeError(f"Parte {index} do vídeo falhou ({code}): " + "\n".join(tails[index]))
+            time.sleep(0.2)
+    finally:
+        # Parar as outras partes em caso de erro ou de cancelamento do job
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        for follower in followers:
+            follower.join(timeout=5)
+
+
+def shard_ranges(frame_ranges, frame_counts):
+    """ Splits ranges of the whole video into ranges local to each part (one list per part). """
+    local = []
+    offset = 0
+    for frames in frame_counts:
+        local.append([[max(start, offset) - offset, min(end, offset + frames) - offset]
+                      for start, end in frame_ranges if start < offset + frames and end > offset])
+        offset += frames
+    return local
+
+
+def reencode_shards(shard_paths, frame_counts, frame_ranges, fps, output_path, calibration_file_path,
+                    fragmented, work_dir, progress):
+    """ Re-encodes the kept frames of each part in its own process and joins the parts by stream copy.
+
+    ``frame_counts`` are the frames each part's detector decoded, the numbering
+    the merged index (and so ``frame_ranges``) uses.
+    """
+    commands = []
+    outputs = []
+    for index, (shard_path, local_ranges) in enumerate(zip(shard_paths, shard_ranges(frame_ranges, frame_counts))):
+        if not local_ranges:
+            continue
+        ranges_path = os.path.join(work_dir, f"ranges{index:03d}.json")
+        with open(ranges_path, "w") as ranges_file:
+            json.dump(local_ranges, ranges_file)
+        outputs.append(os.path.join(work_dir, f"output{index:03d}.mp4"))
+        command = [
+            sys.executable, os.path.abspath(__file__), "--video", shard_path, "--ranges", ranges_path,
+            "--output", outputs[-1], "--fps", str(fps),
+        ]
+        if calibration_file_path:
+            command += ["--calibration", calibration_file_path]
+        if fragmented:
+            command += ["--fragmented"]
+        commands.append(command)
+
+    if not commands:
+        # Nada foi mantido: saída vazia, como no processamento em um único processo
+        open(output_path, "wb").close()
+        return
+    print(f"Re-encoding the kept frames of {len(commands)} shard(s) in parallel")
+    run_shards(commands, progress)
+    stream_cut.concat_parts(outputs, output_path, work_dir, fragmented)
+
+
+def process_sharded(weights_path, video_path, output_video_file_path, calibration_file_path, fps, max_frames,
+                    classes_filter_int_array, progress_callback, batch_size, stride, pad_before, pad_after,
+                    motion_threshold, stream_copy, exact_cuts, index_dir, fragmented, shards, backend=None, precision="fp32", imgsz=0, roi=None,
+                    undistort_mode="lowres"):
+    """ Processes ``video_path`` in up to ``shards`` parallel parts.
+
+    Returns False, without doing anything, when the video is too short to be split
+    or cannot be split by stream copy; the caller then processes it in one pass.
+    """
+    cut_times = plan_cut_times(stream_cut.probe_duration(video_path), shards)
+    if not cut_times:
+        return False
+    if not fps:
+        info = probe_video_stream(video_path)
+        fps = (info[2] if info is not None else 0) or 30
+
+    work_dir = tempfile.mkdtemp(prefix="shards_", dir=os.path.dirname(os.path.abspath(output_video_file_path)))
+    try:
+        try:
+            shard_paths = split_video(video_path, cut_times, work_dir)
+        except RuntimeError as e:
+            print(f"Could not split the video, processing it in one pass: {e}")
+            return False
+        if len(shard_paths) < 2:
+            # Keyframes too far apart for the requested cut times
+            return False
+
+        # Packet counts are only known before decoding: they align the stride and size the progress bar
+        frame_counts = [stream_cut.count_packets(path) for path in shard_paths]
+        print(f"Processing {len(shard_paths)} shard(s) in parallel: {frame_counts} frames")
+
+        stride = max(1, int(stride))
+        index_dirs = []
+        commands = []
+        offset = 0
+        for index, (shard_path, frames) in enumerate(zip(shard_paths, frame_counts)):
+            index_dirs.append(os.path.join(work_dir, f"index{index:03d}"))
+            command = [
+                sys.executable, os.path.abspath(__file__), "--weights", weights_path, "--video", shard_path,
+                "--index", index_dirs[-1], "--fps", str(fps), "--frame-offset", str(offset),
+                "--batch", str(batch_size), "--stride", str(stride), "--motion-threshold", str(motion_threshold),
+            ]
+            if calibration_file_path:
+                command += ["--calibration", calibration_file_path]
+            if backend:
+                command += ["--backend", backend]
+            if precision != "fp32":
+                command += ["--precision", precision]
+            if imgsz:
+                command += ["--imgsz", str(imgsz)]
+            if roi:
+                command += ["--roi", json.dumps(roi)]
+            if undistort_mode != "lowres":
+                command += ["--undistort-mode", undistort_mode]
+            commands.append(command)
+            offset += frames
+
+        progress = ShardProgress(sum(frame_counts), progress_callback)
+        progress.report(force=True)
+        run_shards(commands, progress)
+
+        # Índice do vídeo inteiro -> frames mantidos -> saída, como no re-corte
+        merged_dir = index_dir or os.path.join(work_dir, "index")
+        merge_indexes(index_dirs, merged_dir, fps)
+        pad_before = pad_before if pad_before is not None else stride - 1
+        pad_after = pad_after if pad_after is not None else stride - 1
+        if stream_copy and not calibration_file_path:
+            frame_ranges = recut_job(
+                video_path, merged_dir, output_video_file_path,
+                classes=classes_filter_int_array,
+                pad_before=pad_before,
+                pad_after=pad_after,
+                max_frames=max_frames,
+                stream_copy=True,
+                exact_cuts=exact_cuts,
+                fragmented=fragmented,
+            )
+        else:
+            _, frame_ranges = kept_frame_ranges(merged_dir, classes_filter_int_array, 0.0, pad_before, pad_after,
+                                                max_frames)
+            # The merged index numbers frames by what each part decoded, which can differ from its packets
+            decoded_counts = [load_index(path)["meta"]["frames"] for path in index_dirs]
+            reencode_shards(shard_paths, decoded_counts, frame_ranges, fps, output_video_file_path,
+                            calibration_file_path, fragmented, work_dir, progress)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stats = progress.stats()
+    stats["frames_kept"] = sum(end - start for start, end in frame_ranges)
+    if progress_callback is not None:
+        progress_callback(stats)
+    print("Video processing completed successfully")
+    return True
+
+
+def main():
+    """ Entry point of one part: runs the detector and writes the part's detection index,
+    or (with ``--ranges``) re-encodes the part's kept frames. """
+    parser = argparse.ArgumentParser(description="Build the detection index of one shard of a video")
+    parser.add_argument("--weights")
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--index")
+    parser.add_argument("--ranges", help="re-encode mode: JSON file with the part's kept frame ranges", default=None)
+    parser.add_argument("--output", help="re-encode mode: output of the part's kept frames", default=None)
+    parser.add_argument("--fragmented", help="re-encode mode: write fragmented MP4 (H.264)", action="store_true")
+    parser.add_argument("--fps", default=30, type=float)
+    parser.add_argument("--frame-offset", help="index of the shard's first frame in the whole video", default=0, type=int)
+    parser.add_argument("--calibration", default=None)
+    parser.add_argument("--batch", default=1, type=int)
+    parser.add_argument("--stride", default=1, type=int)
+    parser.add_argument("--motion-threshold", default=0, type=float)
+    parser.add_argument("--threads", help="torch/OpenCV threads for this process", default=1, type=int)
+    parser.add_argument("--backend", help="inference backend (default: INFERENCE_BACKEND)", default=None)
+    parser.add_argument("--precision", help="fp32 or int8", default="fp32")
+    parser.add_argument("--imgsz", help="long side of the frames sent to the detector (0 = the model's own size)", default=0, type=int)
+    parser.add_argument("--roi", help="region of interest polygon (JSON)", default=None)
+    parser.add_argument("--undistort-mode", help="lowres or raw (detect on the distorted frame)", default="lowres")
+    args = parser.parse_args()
+
+    import cv2
+
+    cv2.setNumThreads(args.threads)
+    if args.ranges:
+        if not args.output:
+            parser.error("--ranges needs --output")
+        with open(args.ranges) as ranges_file:
+            frame_ranges = json.load(ranges_file)
+        reencode_ranges(args.video, frame_ranges, args.output, args.fps, args.calibration, args.fragmented)
+        return
+    if not args.weights or not args.index:
+        parser.error("--weights and --index are required to build a part's index")
+
+    import torch
+
+    import engine
+
+    torch.set_num_threads(args.threads)
+    model = engine.load_model(args.weights, args.backend, args.precision)
+    engine.undistort_video(model, args.video, args.calibration, None, args.fps, 0, [], engine.print_progress,
+                           args.batch, args.stride, 0, 0, args.motion_threshold,
+                           index_dir=args.index, detect_only=True, frame_offset=args.frame_offset, imgsz=args.imgsz,
+                           roi=json.loads(args.roi) if args.roi else None, undistort_mode=args.undistort_mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Montagem do vídeo de saída por cópia de stream (sem re-encode).
+
+Recebe os intervalos de tempo mantidos pelo engine e monta a saída com
+``ffmpeg -c copy``: cada intervalo começa no keyframe anterior ao seu início
+e as partes são concatenadas com o demuxer ``concat``. No modo exato, só o
+trecho entre o início pedido e o primeiro keyframe dentro do intervalo (o
+GOP de fronteira) é re-encodado; o resto continua sendo cópia.
+"""
+import json
+import os
+import shutil
+import subprocess as sp
+import tempfile
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+from fragmented_mp4 import FRAGMENT_MOVFLAGS
+
+# Encoders usados para re-encodar o GOP de fronteira no modo exato
+ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+}
+
+# Perfis (nome do ffprobe -> nome do encoder) que o GOP re-encodado consegue repetir
+PROFILES = {
+    "h264": {
+        "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main",
+        "High": "high", "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+    },
+    "hevc": {"Main": "main", "Main 10": "main10"},
+}
+
+# Campos do stream que precisam ser iguais no GOP re-encodado e na cópia para a concatenação funcionar
+MATCHED_FIELDS = ("codec_name", "profile", "level", "width", "height", "pix_fmt", "sample_aspect_ratio")
+
+
+def _ffprobe(args: List[str], video_path: str) -> str:
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0"] + args + [video_path]
+    return sp.check_output(command).decode("utf-8")
+
+
+def probe_start_time(video_path: str) -> float:
+    """``start_time`` do arquivo, que o ffmpeg soma aos valores de ``-ss``"""
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=start_time",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_path]
+    try:
+        return float(sp.check_output(command).decode("utf-8").strip())
+    except (sp.CalledProcessError, ValueError):
+        return 0.0
+
+
+def probe_duration(video_path: str) -> float:
+    """Duração do arquivo (s), 0 se o ffprobe não souber"""
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_path]
+    try:
+        return float(sp.check_output(command).decode("utf-8").strip())
+    except (sp.CalledProcessError, ValueError):
+        return 0.0
+
+
+def count_packets(video_path: str) -> int:
+    """Pacotes (frames) do primeiro stream de vídeo, contados sem decodificar"""
+    output = _ffprobe(["-count_packets", "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0"], video_path)
+    return int(output.strip().splitlines()[0])
+
+
+def probe_packets(video_path: str) -> Tuple[List[float], List[float]]:
+    """Timestamps (s, relativos ao início do arquivo) de todos os frames e dos keyframes
+
+    Lidos dos pacotes do primeiro stream de vídeo, sem decodificar nenhum
+    frame. Os frames ficam em ordem de apresentação, a mesma em que o
+    decodificador os entrega ao engine.
+    """
+    output = _ffprobe(["-show_entries", "packet=pts_time,flags", "-of", "csv=p=0"], video_path)
+    offset = probe_start_time(video_path)
+    frame_times = []
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if pts_time in ("", "N/A"):
+            continue
+        time = max(0.0, float(pts_time) - offset)
+        frame_times.append(time)
+        if "K" in flags:
+            keyframes.append(time)
+    return sorted(frame_times), sorted(keyframes)
+
+
+def probe_keyframes(video_path: str) -> List[float]:
+    """Timestamps (s, relativos ao início do arquivo) dos keyframes do primeiro stream de vídeo"""
+    return probe_packets(video_path)[1]
+
+
+def probe_stream(video_path: str) -> dict:
+    """Codec, perfil, nível, resolução, pix_fmt, SAR e time base do primeiro stream de vídeo"""
+    output = _ffprobe(["-show_entries", f"stream={','.join(MATCHED_FIELDS)},time_base", "-of", "json"], video_path)
+    streams = json.loads(output).get("streams") or [{}]
+    return streams[0]
+
+
+def _sample_aspect_ratio(stream: dict) -> str:
+    sar = stream.get("sample_aspect_ratio")
+    return "1:1" if sar in (None, "", "N/A", "0:1") else sar
+
+
+def encoder_arguments(stream: dict) -> Optional[List[str]]:
+    """Argumentos do ffmpeg que re-encodam no mesmo formato de ``stream``
+
+    None se o encoder não consegue repetir o perfil ou o nível do stream.
+    """
+    codec = stream.get("codec_name")
+    profile = PROFILES.get(codec, {}).get(stream.get("profile"))
+    level = stream.get("level")
+    if profile is None or not isinstance(level, int) or level <= 0:
+        return None
+    arguments = ["-c:v", ENCODERS[codec], "-profile:v", profile, "-pix_fmt", stream.get("pix_fmt") or "yuv420p"]
+    if codec == "h264":
+        # O ffprobe informa o nível H.264 x10 (41 = 4.1)
+        arguments += ["-level:v", f"{level / 10:g}"]
+    else:
+        # e o HEVC x30 (123 = 4.1)
+        arguments += ["-x265-params", f"level-idc={level / 30:g}"]
+    return arguments + ["-vf", f"setsar={_sample_aspect_ratio(stream).replace(':', '/')}"]
+
+
+def _fallback_arguments(stream: dict) -> List[str]:
+    return ["-c:v", ENCODERS.get(stream.get("codec_name"), "libx264"), "-pix_fmt", stream.get("pix_fmt") or "yuv420p"]
+
+
+def _stream_mismatch(part_path: str, stream: dict) -> Optional[str]:
+    """Primeiro campo em que o GOP re-encodado difere do original, se houver"""
+    part = probe_stream(part_path)
+    for field in MATCHED_FIELDS:
+        expected, found = stream.get(field), part.get(field)
+        if field == "sample_aspect_ratio":
+            expected, found = _sample_aspect_ratio(stream), _sample_aspect_ratio(part)
+        if expected != found:
+            return f"{field}: {found} != {expected}"
+    return None
+
+
+def frame_ranges_to_times(ranges: Sequence[Sequence[int]], fps: float,
+                          frame_times: Optional[Sequence[float]] = None) -> List[Tuple[float, float]]:
+    """Converte intervalos de frames [início, fim) em intervalos de tempo (s)
+
+    Com ``frame_times`` (timestamps de cada frame, de ``probe_packets``), os
+    limites são os timestamps reais dos frames, o que vale também para vídeos
+    com frame rate variável. Sem eles, ou para frames depois do último
+    timestamp conhecido, o frame rate é tratado como constante a partir do 0.
+    """
+    def time_of(frame: int) -> float:
+        if frame_times is None or not frame_times:
+            return frame / fps
+        if frame < len(frame_times):
+            return frame_times[frame]
+        # Fim do último intervalo (ou frames que o ffprobe não listou): um frame depois do último conhecido
+        return frame_times[-1] + (frame - len(frame_times) + 1) / fps
+
+    return [(time_of(start), time_of(end)) for start, end in ranges]
+
+
+def plan_parts(ranges: Sequence[Tuple[float, float]], keyframes: List[float],
+                   exact: bool = False) -> List[Tuple[str, float, float]]:
+    """Partes da saída: ``("copy" | "encode", início, fim)`` em ordem
+
+    Sem ``exact``, cada intervalo começa no keyframe anterior ao seu início e
+    os intervalos que passam a se sobrepor são unidos. Com ``exact``, o trecho
+    até o primeiro keyframe dentro do intervalo é re-encodado.
+    """
+    ranges = merge_ranges(ranges)
+    if not exact:
+        snapped = []
+        for start, end in ranges:
+            index = bisect_right(keyframes, start + 1e-6) - 1
+            snapped.append((keyframes[index] if index >= 0 else 0.0, end))
+        return [("copy", start, end) for start, end in merge_ranges(snapped)]
+    parts: List[Tuple[str, float, float]] = []
+    for start, end in ranges:
+        index = bisect_left(keyframes, start - 1e-6)
+        first_keyframe = keyframes[index] if index < len(keyframes) else end
+        if first_keyframe - start > 1e-6:
+            parts.append(("encode", start, min(first_keyframe, end)))
+        if first_keyframe < end:
+            parts.append(("copy", first_keyframe, end))
+    return parts
+
+
+def merge_ranges(ranges: Sequence[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Une intervalos sobrepostos ou encostados"""
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _run(command: List[str]):
+    result = sp.run(command, stdout=sp.PIPE, stderr=sp.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou ({result.returncode}): {result.stderr.decode(errors='replace')[-2000:]}")
+
+
+def _copy_part(video_path: str, start: float, end: float, part_path: str):
+    # ``start`` é um keyframe; o 1 ms a mais evita que o arredondamento faça o
+    # seek voltar para o keyframe anterior
+    _run([
+        "ffmpeg", "-y", "-v", "error", "-fflags", "+genpts",
+        "-ss", f"{start + 0.001:.6f}", "-i", video_path, "-t", f"{end - start:.6f}",
+        "-map", "0:v:0", "-c", "copy", "-avoid_negative_ts", "make_zero",
+        "-f", "mpegts", part_path,
+    ])
+
+
+def _encode_part(video_path: str, start: float, end: float, part_path: str, arguments: List[str]):
+    _run([
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{start:.6f}", "-i", video_path, "-t", f"{end - start:.6f}",
+        "-map", "0:v:0", *arguments,
+        "-f", "mpegts", part_path,
+    ])
+
+
+class _MismatchedEncode(Exception):
+    """O GOP re-encodado não sai no mesmo formato do original"""
+
+
+def cut_segments(video_path: str, ranges: Sequence[Tuple[float, float]], output_path: str,
+                 exact: bool = False, keyframes: Optional[List[float]] = None, fragmented: bool = False):
+    """Monta ``output_path`` com os intervalos de tempo de ``video_path``
+
+    Sem ``exact``, cada intervalo é copiado a partir do keyframe anterior ao
+    início (pode incluir alguns frames a mais no começo). Com ``exact``, o
+    trecho até o primeiro keyframe dentro do intervalo é re-encodado para
+    começar no frame pedido, com o perfil, nível, resolução, pix_fmt e SAR do
+    original; se o encoder não consegue repeti-los, todos os intervalos são
+    re-encodados. Com ``fragmented``, a saída é um MP4 fragmentado.
+    """
+    if keyframes is None:
+        keyframes = probe_keyframes(video_path)
+    plan = plan_parts(ranges, keyframes, exact)
+    stream = probe_stream(video_path) if exact else {}
+    # O MP4 de saída usa a mesma escala de tempo do original
+    timescale = int(stream["time_base"].partition("/")[2] or 0) if stream.get("time_base") else None
+
+    work_dir = tempfile.mkdtemp(prefix="cut_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        parts = []
+
+        def part_path():
+            path = os.path.join(work_dir, f"part{len(parts):05d}.ts")
+            parts.append(path)
+            return path
+
+        try:
+            arguments = encoder_arguments(stream) if exact else None
+            if exact and arguments is None and any(kind == "encode" for kind, _, _ in plan):
+                raise _MismatchedEncode(f"perfil {stream.get('profile')} de {stream.get('codec_name')} sem encoder")
+            checked = False
+            for kind, start, end in plan:
+                if kind == "copy":
+                    _copy_part(video_path, start, end, part_path())
+                    continue
+                path = part_path()
+                _encode_part(video_path, start, end, path, arguments)
+                if not checked:
+                    # Mesmos argumentos em todas as partes: basta conferir a primeira
+                    mismatch = _stream_mismatch(path, stream)
+                    if mismatch:
+                        raise _MismatchedEncode(mismatch)
+                    checked = True
+        except _MismatchedEncode as e:
+            print(f"Boundary GOP can't match the source ({e}), re-encoding every segment")
+            for path in parts:
+                os.remove(path)
+            parts.clear()
+            arguments = arguments or _fallback_arguments(stream)
+            for start, end in merge_ranges(ranges):
+                _encode_part(video_path, start, end, part_path(), arguments)
+
+        if not parts:
+            # Nada foi mantido: gerar uma saída vazia para manter o contrato do output.mp4
+            open(output_path, "wb").close()
+            return
+
+        concat_parts(parts, output_path, work_dir, fragmented, timescale)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def concat_parts(part_paths: Sequence[str], output_path: str, work_dir: str, fragmented: bool = False,
+                 timescale: Optional[int] = None):
+    """Junta ``part_paths`` em ordem em ``output_path`` (demuxer ``concat``, cópia de stream)"""
+    list_path = os.path.join(work_dir, "parts.txt")
+    with open(list_path, "w") as list_file:
+        for path in part_paths:
+            list_file.write(f"file '{path}'\n")
+
+    _run([
+        "ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy", *(["-video_track_timescale", str(timescale)] if timescale else []),
+        "-movflags", FRAGMENT_MOVFLAGS if fragmented else "+faststart", output_path,
+    ])
+
+
+def cut_frame_ranges(video_path: str, frame_ranges: Sequence[Sequence[int]], fps: float, output_path: str,
+                     exact: bool = False, fragmented: bool = False):
+    """Salva ``segments.json`` ao lado da saída e monta a saída a partir de intervalos de frames"""
+    frame_times, keyframes = probe_packets(video_path)
+    time_ranges = frame_ranges_to_times(frame_ranges, fps, frame_times)
+    segments_path = os.path.join(os.path.dirname(os.path.abspath(output_path)), "segments.json")
+    # Substituído por inteiro: o arquivo anterior pode estar ligado a outra cópia (cache de resultados)
+    tmp_segments_path = segments_path + ".tmp"
+    with open(tmp_segments_path, "w") as segments_file:
+        json.dump({"fps": fps, "frames": [list(r) for r in frame_ranges], "seconds": time_ranges}, segments_file)
+    os.replace(tmp_segments_path, segments_path)
+    print(f"Cutting {len(frame_ranges)} segment(s) by stream copy (exact={exact})")
+    cut_segments(video_path, time_ranges, output_path, exact=exact, keyframes=keyframes, fragmented=fragmented)
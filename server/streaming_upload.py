@@ -0,0 +1,171 @@
+"""Ingestão em streaming: o corpo do request vai direto para o diretório do job.
+
+O ``UploadFile`` do FastAPI faz o ``python-multipart`` gravar o corpo inteiro
+em um arquivo temporário antes do handler rodar, e o handler depois copia
+esse arquivo para ``jobs/<id>/input.mp4``: são duas passadas completas no
+disco. Aqui o multipart é interpretado conforme os bytes chegam do socket, e
+o conteúdo do campo de arquivo é gravado no destino (em blocos, no
+threadpool) e passado pelo hash no mesmo passo.
+"""
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+
+WRITE_BLOCK = 8192 * 1024  # 8MB por escrita
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StreamedFile:
+    """Destino de um upload em streaming: grava, calcula o hash e mede a vazão"""
+
+    def __init__(self, destination: Path, content_hash, max_size: int,
+                 on_progress: Optional[Callable[[dict], None]] = None):
+        self.destination = destination
+        self.content_hash = content_hash
+        self.max_size = max_size
+        self.on_progress = on_progress
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+        self.started = time.monotonic()
+        self.write_seconds = 0.0
+        self._buffer = bytearray()
+        self._file = None
+
+    def _write_block(self, data: bytes):
+        # Roda no threadpool; o hashlib libera o GIL para blocos grandes
+        t0 = time.monotonic()
+        self._file.write(data)
+        self.content_hash.update(data)
+        self.write_seconds += time.monotonic() - t0
+
+    async def open(self):
+        self._file = await run_in_threadpool(open, self.destination, "wb")
+
+    async def feed(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLarge(f"Arquivo maior que o limite de {self.max_size / (1024 * 1024 * 1024):.1f} GB")
+        self._buffer.extend(data)
+        if len(self._buffer) >= WRITE_BLOCK:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            await run_in_threadpool(self._write_block, data)
+            if self.on_progress is not None:
+                self.on_progress(self.stats())
+
+    async def close(self):
+        await self.flush()
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "bytes": self.size,
+            "seconds": round(elapsed, 2),
+            "mb_per_s": round(self.size / (1024 * 1024) / elapsed, 2) if elapsed > 0 else None,
+            "disk_mb_per_s": round(self.size / (1024 * 1024) / self.write_seconds, 2) if self.write_seconds > 0 else None,
+        }
+
+
+async def receive_raw(request, target: StreamedFile):
+    """Corpo bruto (sem multipart): todo o corpo é o arquivo"""
+    await target.open()
+    try:
+        async for chunk in request.stream():
+            await target.feed(chunk)
+    finally:
+        await target.close()
+
+
+async def receive_multipart(request, target: StreamedFile, file_field: str = "video",
+                            on_file_start: Optional[Callable[[StreamedFile, Dict[str, str]], Awaitable[None]]] = None) -> Dict[str, str]:
+    """Interpreta o multipart conforme chega, gravando ``file_field`` em ``target``
+
+    ``on_file_start`` é chamado com ``target`` e os campos recebidos até ali
+    quando o campo de arquivo começa. Retorna os demais campos do formulário como strings.
+    """
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise ValueError("Requisição multipart sem boundary")
+
+    # Os callbacks do parser são síncronos: eles só registram eventos, que são
+    # processados (com escrita assíncrona) depois de cada bloco recebido
+    events = []
+    header_field = bytearray()
+    header_value = bytearray()
+    headers: Dict[bytes, bytes] = {}
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("headers", dict(headers)))
+        headers.clear()
+
+    callbacks = {
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end", None)),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    }
+    parser = MultipartParser(boundary, callbacks)
+
+    fields: Dict[str, str] = {}
+    field_name = None
+    field_value = bytearray()
+    is_file = False
+
+    await target.open()
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, payload in events:
+                if kind == "headers":
+                    _, disposition = parse_options_header(payload.get(b"content-disposition", b""))
+                    field_name = disposition.get(b"name", b"").decode()
+                    is_file = field_name == file_field
+                    field_value.clear()
+                    if is_file:
+                        target.filename = disposition.get(b"filename", b"").decode() or None
+                        target.content_type = payload.get(b"content-type", b"").decode() or None
+                        if on_file_start is not None:
+                            await on_file_start(target, dict(fields))
+                elif kind == "data":
+                    if is_file:
+                        await target.feed(payload)
+                    else:
+                        field_value.extend(payload)
+                elif kind == "end":
+                    if not is_file and field_name:
+                        fields[field_name] = field_value.decode()
+                    field_name = None
+                    is_file = False
+            events.clear()
+        parser.finalize()
+    finally:
+        await target.close()
+
+    return fields
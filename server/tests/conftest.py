@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server modules are imported as top-level modules, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
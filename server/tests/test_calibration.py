@@ -0,0 +1,61 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import calibration  # noqa: E402
+from calibration import cached_undistort_maps, undistort_maps, undistorted_size  # noqa: E402
+
+
+def write_calibration(path, k1=-0.3):
+    camera_matrix = np.array([[800, 0, 320], [0, 800, 240], [0, 0, 1]], dtype=np.float64)
+    storage = cv2.FileStorage(str(path), cv2.FILE_STORAGE_WRITE)
+    storage.write("K", camera_matrix)
+    storage.write("D", np.array([[k1, 0.1, 0, 0, 0]], dtype=np.float64))
+    storage.release()
+    return camera_matrix
+
+
+@pytest.fixture
+def calibration_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration, "UNDISTORT_MAPS_DIR", None)
+    path = tmp_path / "camera.yaml"
+    write_calibration(path)
+    return path
+
+
+def test_maps_are_computed_once_and_memory_mapped(calibration_file, monkeypatch):
+    map1, map2 = cached_undistort_maps(calibration_file, 640, 480, 0.5)
+    assert isinstance(map1, np.memmap)
+    assert map1.shape == undistorted_size(640, 480, 0.5)[::-1] + (2,)
+    assert map1.dtype == np.int16
+    assert len(list((calibration_file.parent / "maps").glob("*.npy"))) == 2
+
+    camera_matrix, dist_matrix = calibration.load_coefficients(str(calibration_file))
+    expected = undistort_maps(camera_matrix, dist_matrix, 640, 480, 0.5, cv2.CV_16SC2)
+    assert np.array_equal(map1, expected[0]) and np.array_equal(map2, expected[1])
+
+    def recompute(*args, **kwargs):
+        raise AssertionError("the cached maps should be reused")
+
+    monkeypatch.setattr(calibration, "undistort_maps", recompute)
+    again = cached_undistort_maps(calibration_file, 640, 480, 0.5)
+    assert np.array_equal(again[0], map1)
+
+
+def test_each_size_scale_and_calibration_gets_its_own_maps(calibration_file):
+    cached_undistort_maps(calibration_file, 640, 480)
+    cached_undistort_maps(calibration_file, 640, 480, 0.5)
+    cached_undistort_maps(calibration_file, 320, 240)
+    write_calibration(calibration_file, k1=-0.1)
+    cached_undistort_maps(calibration_file, 640, 480)
+    assert len(list((calibration_file.parent / "maps").glob("*.map1.npy"))) == 4
+
+
+def test_unwritable_cache_falls_back_to_memory(calibration_file, tmp_path, monkeypatch):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    monkeypatch.setattr(calibration, "UNDISTORT_MAPS_DIR", str(blocker / "maps"))
+    map1, _ = cached_undistort_maps(calibration_file, 640, 480, 0.5)
+    assert not isinstance(map1, np.memmap)
+    assert map1.shape == undistorted_size(640, 480, 0.5)[::-1] + (2,)
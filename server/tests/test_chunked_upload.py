@@ -0,0 +1,59 @@
+import os
+import time
+
+from chunked_upload import SESSION_FILE, UploadSessionStore, merge_range
+
+
+def test_merge_range_into_empty_list():
+    assert merge_range([], 0, 10) == [[0, 10]]
+
+
+def test_merge_range_joins_touching_and_overlapping_ranges():
+    assert merge_range([[0, 10], [20, 30]], 10, 20) == [[0, 30]]
+    assert merge_range([[0, 10]], 5, 15) == [[0, 15]]
+
+
+def test_merge_range_keeps_gaps_sorted():
+    assert merge_range([[20, 30]], 0, 10) == [[0, 10], [20, 30]]
+    assert merge_range([[0, 10], [40, 50]], 20, 30) == [[0, 10], [20, 30], [40, 50]]
+
+
+def test_merge_range_of_a_chunk_already_received():
+    assert merge_range([[0, 100]], 10, 20) == [[0, 100]]
+
+
+def test_chunks_in_any_order_complete_the_session(tmp_path):
+    store = UploadSessionStore(tmp_path)
+    session = store.create("upload", "video.mp4", 30, {})
+    for offset in (20, 0, 10):
+        session.write(offset, bytes([offset]) * 10)
+        session.mark_received(offset, offset + 10)
+    # Another API process sees the same session through upload.json
+    reloaded = UploadSessionStore(tmp_path).get("upload")
+    assert reloaded.complete
+    assert reloaded.missing_ranges() == []
+    assert session.input_path.read_bytes() == bytes([0]) * 10 + bytes([10]) * 10 + bytes([20]) * 10
+
+
+def test_missing_ranges_of_a_partial_upload(tmp_path):
+    session = UploadSessionStore(tmp_path).create("upload", "video.mp4", 30, {})
+    session.write(10, b"x" * 5)
+    session.mark_received(10, 15)
+    assert session.received_bytes == 5
+    assert not session.complete
+    assert session.missing_ranges() == [[0, 10], [15, 30]]
+
+
+def test_sessions_without_new_chunks_expire(tmp_path):
+    store = UploadSessionStore(tmp_path)
+    idle = store.create("idle", "video.mp4", 30, {})
+    active = store.create("active", "video.mp4", 30, {})
+    hour_ago = time.time() - 3600
+    os.utime(idle.job_dir / SESSION_FILE, (hour_ago, hour_ago))
+    os.utime(active.job_dir / SESSION_FILE, (hour_ago, hour_ago))
+    # A new chunk rewrites upload.json and renews the session
+    active.mark_received(0, 10)
+
+    assert store.expired(600) == ["idle"]
+    store.finish("idle")
+    assert store.expired(600) == []
@@ -0,0 +1,38 @@
+import os
+import stat
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from fragmented_mp4 import FragmentedMp4Writer  # noqa: E402
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """ Puts a shell script named ffmpeg first on PATH. """
+    def install(script):
+        path = tmp_path / "bin" / "ffmpeg"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("#!/bin/sh\n" + script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{path.parent}{os.pathsep}{os.environ['PATH']}")
+    return install
+
+
+def test_a_chatty_ffmpeg_does_not_block_the_writes(tmp_path, fake_ffmpeg):
+    # Far more stderr than a pipe buffer holds, written before reading any frame
+    fake_ffmpeg('head -c 1000000 /dev/zero | tr "\\0" "w" | fold -w 80 >&2\ncat > /dev/null\n')
+    writer = FragmentedMp4Writer(tmp_path / "output.mp4", 30, (64, 48))
+    frame = np.zeros((48, 64, 3), np.uint8)
+    for _ in range(100):
+        writer.write(frame)
+    writer.release()
+
+
+def test_failures_report_the_end_of_stderr(tmp_path, fake_ffmpeg):
+    fake_ffmpeg('cat > /dev/null\necho "first line" >&2\necho "encoder exploded" >&2\nexit 3\n')
+    writer = FragmentedMp4Writer(tmp_path / "output.mp4", 30, (64, 48))
+    writer.write(np.zeros((48, 64, 3), np.uint8))
+    with pytest.raises(RuntimeError, match="encoder exploded"):
+        writer.release()
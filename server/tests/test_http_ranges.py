@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("starlette")
+
+from http_ranges import RangeNotSatisfiable, parse_range  # noqa: E402
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("bytes=0-0,-1", [(0, 0), (999, 999)]),
+    (" BYTES = 10-19 ", [(10, 19)]),
+])
+def test_single_and_suffix_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    assert parse_range("bytes=50-99,0-49,200-299,250-400", 1000) == [(0, 99), (200, 400)]
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-10",
+    "bytes=",
+    "bytes=abc",
+    "bytes=10-x",
+    "bytes=20-10",
+])
+def test_malformed_headers_serve_the_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header,size", [
+    ("bytes=1000-", 1000),
+    ("bytes=2000-3000", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+])
+def test_ranges_outside_the_file_are_not_satisfiable(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+def test_unsatisfiable_ranges_are_dropped_when_another_one_fits():
+    assert parse_range("bytes=5000-6000,0-9", 1000) == [(0, 9)]
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    job_store = JobStore(tmp_path / "jobs.db")
+    yield job_store
+    job_store.close()
+
+
+def queue(store, job_id, queued_at, priority=0, model="diurno", **fields):
+    store.save(dict({
+        "id": job_id,
+        "status": "queued",
+        "progress": 0,
+        "model": model,
+        "parameters": {"model": model},
+        "created_at": queued_at,
+        "queued_at": queued_at,
+        "priority": priority,
+    }, **fields))
+
+
+def test_claims_by_priority_then_queue_order(store):
+    queue(store, "old", "2026-01-01T10:00:00")
+    queue(store, "new", "2026-01-01T10:05:00")
+    queue(store, "urgent", "2026-01-01T10:10:00", priority=10)
+
+    assert [store.claim_next("executor") for _ in range(4)] == ["urgent", "old", "new", None]
+    job = store.get("old")
+    assert job["status"] == "processing"
+    assert job["claimed_by"] == "executor"
+    assert job["heartbeat_at"] is None
+
+
+def test_queue_position_follows_claim_order(store):
+    queue(store, "old", "2026-01-01T10:00:00")
+    queue(store, "urgent", "2026-01-01T10:10:00", priority=10)
+    assert store.queue_position("urgent") == 1
+    assert store.queue_position("old") == 2
+    store.claim_next("executor")
+    assert store.queue_position("old") == 1
+    assert store.queue_position("urgent") is None
+
+
+def test_remote_workers_only_get_complete_uploads_of_their_models(store):
+    queue(store, "live", "2026-01-01T10:00:00", live=True)
+    queue(store, "recut", "2026-01-01T10:01:00", recut={"classes": [0]})
+    queue(store, "night", "2026-01-01T10:02:00", model="noturno")
+    queue(store, "day", "2026-01-01T10:03:00")
+
+    assert store.claim_next("worker-a/1", remote=True, models=["diurno"]) == "day"
+    assert store.claim_next("worker-a/1", remote=True, models=["diurno"]) is None
+    assert store.claim_next("worker-b/1", remote=True) == "night"
+    assert store.get("day")["heartbeat_at"] is not None
+    # The local executor still takes the rest
+    assert store.claim_next("executor") == "live"
+
+
+def test_int8_jobs_only_go_to_workers_with_the_variant(store):
+    queue(store, "int8", "2026-01-01T10:00:00", parameters={"model": "diurno", "precision": "int8"})
+    queue(store, "fp32", "2026-01-01T10:01:00")
+
+    assert store.claim_next("worker-a/1", remote=True, models=["diurno"], int8_models=[]) == "fp32"
+    assert store.claim_next("worker-a/2", remote=True, models=["diurno"], int8_models=[]) is None
+    assert store.claim_next("worker-b/1", remote=True, models=["diurno"], int8_models=["diurno"]) == "int8"
+
+
+def test_heartbeat_and_finish_require_the_lease(store):
+    queue(store, "job", "2026-01-01T10:00:00")
+    store.claim_next("worker/1", remote=True)
+
+    assert store.heartbeat("job", "worker/2", {"progress": 50}) is None
+    job = store.heartbeat("job", "worker/1", {"progress": 50})
+    assert job["progress"] == 50
+
+    assert not store.finish_claim("job", "worker/2", {"status": "completed"})
+    assert store.finish_claim("job", "worker/1", {"status": "completed", "progress": 100})
+    job = store.get("job")
+    assert job["status"] == "completed"
+    assert job["claimed_by"] is None
+    # The lease ends with the job
+    assert store.heartbeat("job", "worker/1", {"progress": 100}) is None
+
+
+def test_requeue_orphans_only_touches_local_claims(store):
+    queue(store, "local", "2026-01-01T10:00:00")
+    queue(store, "remote", "2026-01-01T10:01:00")
+    store.claim_next("executor")
+    store.claim_next("worker/1", remote=True)
+
+    assert store.requeue_orphans() == ["local"]
+    local = store.get("local")
+    assert local["status"] == "queued"
+    assert local["claimed_by"] is None
+    assert store.get("remote")["status"] == "processing"
+
+
+def test_requeue_stale_returns_silent_remote_jobs_to_the_queue(store):
+    queue(store, "job", "2026-01-01T10:00:00")
+    store.claim_next("worker/1", remote=True)
+
+    assert store.requeue_stale((datetime.now() - timedelta(minutes=1)).isoformat()) == []
+    assert store.requeue_stale((datetime.now() + timedelta(minutes=1)).isoformat()) == ["job"]
+    assert store.get("job")["status"] == "queued"
+    # The old lease is gone: the worker can no longer write to the job
+    assert store.heartbeat("job", "worker/1", {"progress": 10}) is None
+    assert store.claim_next("worker/2", remote=True) == "job"
+
+
+def test_requeue_honours_pending_cancellations(store):
+    queue(store, "cancelled", "2026-01-01T10:00:00")
+    queue(store, "running", "2026-01-01T10:01:00")
+    store.claim_next("executor")
+    store.claim_next("executor")
+    assert store.request_interrupt("cancelled", "cancel")
+
+    assert store.requeue_orphans() == ["running"]
+    assert store.get("cancelled")["status"] == "cancelled"
+    assert store.get("running")["status"] == "queued"
+
+
+def test_cancel_queued_only_before_the_claim(store):
+    queue(store, "waiting", "2026-01-01T10:00:00")
+    queue(store, "claimed", "2026-01-01T09:00:00")
+    store.claim_next("executor")
+
+    assert not store.cancel_queued("claimed", "Cancelado")
+    assert store.cancel_queued("waiting", "Cancelado")
+    assert store.claim_next("executor") is None
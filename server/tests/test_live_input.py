@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import live_input  # noqa: E402
+from live_input import (UploadFailed, probe_video_stream, read_live_state, wait_until_complete,  # noqa: E402
+                        write_live_state)
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "input.mp4"
+    path.write_bytes(b"\0" * 100)
+    return path
+
+
+def test_state_round_trip(video):
+    write_live_state(video, 40, 100)
+    assert read_live_state(video) == {"bytes": 40, "total_bytes": 100, "complete": False, "failed": False}
+
+
+def test_a_file_without_state_is_complete(video):
+    assert read_live_state(video) == {"bytes": 100, "total_bytes": 100, "complete": True, "failed": False}
+
+
+def test_waits_until_the_upload_completes(video):
+    write_live_state(video, 40, 100)
+    finisher = threading.Timer(0.1, write_live_state, (video, 100, 100), {"complete": True})
+    finisher.start()
+    wait_until_complete(video, poll_interval=0.01)
+    finisher.join()
+    assert read_live_state(video)["complete"]
+
+
+def test_failed_uploads_stop_the_reader(video):
+    write_live_state(video, 40, 100, failed=True)
+    with pytest.raises(UploadFailed):
+        wait_until_complete(video, poll_interval=0.01)
+
+
+def test_uploads_without_new_bytes_time_out(video, monkeypatch):
+    monkeypatch.setattr(live_input, "STALL_TIMEOUT", 60)
+    write_live_state(video, 40, 100)
+    two_minutes_ago = time.time() - 120
+    os.utime(str(video) + live_input.LIVE_SUFFIX, (two_minutes_ago, two_minutes_ago))
+    with pytest.raises(UploadFailed, match="sem novos dados"):
+        wait_until_complete(video, poll_interval=0.01)
+
+
+@pytest.mark.parametrize("stream,expected", [
+    ({"width": 1920, "height": 1080, "avg_frame_rate": "30000/1001"}, (1920, 1080, 30000 / 1001)),
+    ({"width": 704, "height": 576, "avg_frame_rate": "0/0", "r_frame_rate": "25/1"}, (704, 576, 25.0)),
+    ({}, None),
+])
+def test_probe_reads_size_and_frame_rate(video, monkeypatch, stream, expected):
+    output = json.dumps({"streams": [stream]}).encode()
+    monkeypatch.setattr(live_input.sp, "check_output", lambda *args, **kwargs: output)
+    assert probe_video_stream(video) == expected
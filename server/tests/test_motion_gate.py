@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+# engine imports the detector stack at module level
+pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from engine import MotionGate  # noqa: E402
+
+
+def scene(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (360, 640, 3), dtype=np.uint8)
+
+
+def test_first_frame_always_runs_the_detector():
+    assert MotionGate(0.02).changed(scene())
+
+
+def test_static_scene_and_sensor_noise_are_gated():
+    gate = MotionGate(0.02)
+    frame = scene()
+    gate.changed(frame)
+    noisy = np.clip(frame.astype(np.int16) + np.random.default_rng(1).integers(-3, 4, frame.shape), 0, 255)
+    assert not gate.changed(frame)
+    assert not gate.changed(noisy.astype(np.uint8))
+
+
+def test_a_moving_object_runs_the_detector():
+    gate = MotionGate(0.02)
+    frame = scene()
+    gate.changed(frame)
+    moved = frame.copy()
+    moved[100:220, 200:360] = 255
+    assert gate.changed(moved)
+    # The reference follows the last frame the detector saw
+    assert not gate.changed(moved)
+
+
+def test_slow_drift_is_compared_with_the_last_detected_frame():
+    gate = MotionGate(0.05)
+    frame = scene()
+    gate.changed(frame)
+    decisions = []
+    for step in (1, 2):
+        drifted = frame.copy()
+        drifted[:, : step * 20] = 0
+        decisions.append(gate.changed(drifted))
+    # Each step alone is small, but the changes add up against the unchanged reference
+    assert decisions == [False, True]
@@ -0,0 +1,56 @@
+import json
+import os
+
+from result_cache import ResultCache
+
+PARAMETERS = {
+    "model": "diurno", "calibration": "nao", "classes": [0], "maxframes": 0, "stride": 1,
+    "pad_before": None, "pad_after": None, "motion_threshold": 0, "cut_mode": "auto", "output_format": "mp4",
+}
+
+
+def finished_job(job_dir, output=b"video"):
+    (job_dir / "index").mkdir(parents=True)
+    (job_dir / "output.mp4").write_bytes(output)
+    (job_dir / "segments.json").write_text(json.dumps({"frames": [[0, 10]]}))
+    (job_dir / "index" / "meta.json").write_text(json.dumps({"frames": 10}))
+    return job_dir
+
+
+def test_keys_change_with_the_parameters_that_change_the_output():
+    key = ResultCache.make_key("hash", PARAMETERS)
+    assert ResultCache.make_key("hash", dict(PARAMETERS, priority="bulk")) == key
+    assert ResultCache.make_key("hash", dict(PARAMETERS, precision="fp32")) == key
+    assert ResultCache.make_key("other", PARAMETERS) != key
+    assert ResultCache.make_key("hash", dict(PARAMETERS, stride=2)) != key
+    assert ResultCache.make_key("hash", dict(PARAMETERS, output_format="fmp4")) != key
+    assert ResultCache.make_key("hash", dict(PARAMETERS, precision="int8")) != key
+    assert ResultCache.make_key("hash", PARAMETERS, {"calibration": "abc"}) != key
+
+
+def test_a_hit_links_the_output_and_copies_the_metadata(tmp_path):
+    cache = ResultCache(tmp_path / "cache", 1 << 20)
+    cache.store("key", finished_job(tmp_path / "done"))
+    assert not cache.lookup("missing", tmp_path / "miss")
+
+    job_dir = tmp_path / "new"
+    job_dir.mkdir()
+    assert cache.lookup("key", job_dir)
+    assert (job_dir / "output.mp4").read_bytes() == b"video"
+    cached = tmp_path / "cache" / "key"
+    assert os.path.samefile(job_dir / "output.mp4", cached / "output.mp4")
+    # A re-cut rewrites segments.json and the index in place: the entry must not change
+    assert not os.path.samefile(job_dir / "segments.json", cached / "segments.json")
+    (job_dir / "index" / "meta.json").write_text("{}")
+    assert json.loads((cached / "index" / "meta.json").read_text()) == {"frames": 10}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path / "cache", 1 << 20)
+    cache.store("old", finished_job(tmp_path / "a", b"x" * 400_000))
+    cache.store("new", finished_job(tmp_path / "b", b"x" * 400_000))
+    os.utime(tmp_path / "cache" / "old", (1, 1))
+    cache.store("newest", finished_job(tmp_path / "c", b"x" * 400_000))
+
+    assert sorted(entry.name for entry in (tmp_path / "cache").iterdir()) == ["new", "newest"]
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from roi import RoiMask, parse_roi  # noqa: E402
+
+TRAPEZOID = [[0.25, 0.5], [0.75, 0.5], [1.0, 1.0], [0.0, 1.0]]
+
+
+def test_parse_from_a_list_a_json_string_or_a_file(tmp_path):
+    expected = {"polygon": TRAPEZOID, "normalized": True}
+    assert parse_roi(TRAPEZOID) == expected
+    assert parse_roi(json.dumps({"polygon": TRAPEZOID})) == expected
+    path = tmp_path / "camera.json"
+    path.write_text(json.dumps({"polygon": [[10, 20], [30, 20], [30, 40]], "normalized": False}))
+    assert parse_roi(str(path)) == {"polygon": [[10.0, 20.0], [30.0, 20.0], [30.0, 40.0]], "normalized": False}
+
+
+@pytest.mark.parametrize("value", [
+    [[0, 0], [1, 1]],
+    [[0, 0], [1, "a"], [1, 1]],
+    [[0, 0], [1.5, 0], [1, 1]],
+    {"points": TRAPEZOID},
+])
+def test_invalid_polygons(value):
+    with pytest.raises(ValueError):
+        parse_roi(value)
+
+
+def test_crop_is_the_bounding_box_in_the_detector_copy():
+    mask = RoiMask(parse_roi(TRAPEZOID), 1920, 1080, scale=0.5)
+    assert mask.crop == (0, 270, 960, 540)
+    assert mask.size == (960, 270)
+
+
+def test_boxes_are_kept_by_their_center():
+    mask = RoiMask(parse_roi(TRAPEZOID), 1000, 1000)
+    # Centers: inside the trapezoid, above it, and in the corner it cuts off
+    boxes = np.float32([[400, 700, 600, 900], [400, 100, 600, 300], [0, 500, 100, 600]])
+    assert mask.contains(boxes).tolist() == [True, False, False]
+
+
+def test_crop_coordinates_are_shifted_back_to_the_frame():
+    mask = RoiMask(parse_roi(TRAPEZOID), 1000, 1000)
+    x0, y0 = mask.crop[:2]
+    boxes = np.float32([[400 - x0, 700 - y0, 600 - x0, 900 - y0]])
+    assert mask.inside(boxes).tolist() == [True]
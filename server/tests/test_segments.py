@@ -0,0 +1,149 @@
+import random
+
+import pytest
+
+from segments import RangeRecorder, SegmentKeeper, kept_ranges_from_decisions
+
+
+def sampled_decisions(frames, stride, positive_rate, gate_rate, seed):
+    """ Per-frame decisions the way the engine produces them, with the frame each one came from.
+
+    Samples are every ``stride``-th frame; a gated sample reuses the decision of
+    the last sample the detector saw; frames between samples have no decision.
+    """
+    rng = random.Random(seed)
+    decisions = []
+    refs = []
+    last_decision = False
+    last_ref = -1
+    for index in range(frames):
+        if index % stride:
+            decisions.append(None)
+            refs.append(-1)
+            continue
+        if last_ref < 0 or rng.random() >= gate_rate:
+            last_decision = rng.random() < positive_rate
+            last_ref = index
+        decisions.append(last_decision)
+        refs.append(last_ref)
+    return decisions, refs
+
+
+def engine_ranges(decisions, pad_before, pad_after, max_frames):
+    """ Kept ranges from the engine's path: frames pushed in decode order to a keeper that writes them. """
+    written = []
+    keeper = SegmentKeeper(written.append, pad_before, pad_after, max_frames)
+    for index, positive in enumerate(decisions):
+        if keeper.push(index, f"frame{index}", positive):
+            break
+    recorder = RangeRecorder()
+    for frame in written:
+        recorder(int(frame[len("frame"):]))
+    return recorder.ranges
+
+
+CASES = [
+    # stride, pad_before, pad_after, max_frames
+    (1, 0, 0, 0),
+    (1, 3, 5, 0),
+    (3, None, None, 0),
+    (5, 2, 7, 0),
+    (4, None, None, 40),
+    (2, 10, 0, 25),
+]
+
+
+def test_every_positive_frame_is_kept():
+    assert kept_ranges_from_decisions([False, True, True, False, True]) == [[1, 3], [4, 5]]
+
+
+def test_padding_around_a_positive_sample():
+    decisions = [False] * 10
+    decisions[5] = True
+    assert kept_ranges_from_decisions(decisions, pad_before=2, pad_after=3) == [[3, 9]]
+
+
+def test_padding_is_clipped_at_the_start_and_merges_windows():
+    decisions = [True, False, False, False, True, False]
+    assert kept_ranges_from_decisions(decisions, pad_before=2, pad_after=1) == [[0, 6]]
+
+
+def test_skipped_frames_follow_the_neighbouring_samples():
+    # stride 3: pads of stride-1 cover the frames up to the neighbouring samples
+    decisions = [False, None, None, True, None, None, False, None, None]
+    assert kept_ranges_from_decisions(decisions, pad_before=2, pad_after=2) == [[1, 6]]
+
+
+def test_max_frames_stops_after_the_limit_is_exceeded():
+    ranges = kept_ranges_from_decisions([True] * 10, max_frames=4)
+    assert ranges == [[0, 5]]
+
+
+def test_lookback_buffer_stays_bounded():
+    keeper = SegmentKeeper(lambda frame: None, pad_before=3)
+    for index in range(1000):
+        keeper.push(index, index, False)
+    assert len(keeper.lookback) <= 3
+
+
+@pytest.mark.parametrize("stride,pad_before,pad_after,max_frames", CASES)
+@pytest.mark.parametrize("seed", range(5))
+def test_engine_and_recut_keep_the_same_ranges(stride, pad_before, pad_after, max_frames, seed):
+    pad_before = stride - 1 if pad_before is None else pad_before
+    pad_after = stride - 1 if pad_after is None else pad_after
+    decisions, _ = sampled_decisions(600, stride, positive_rate=0.1, gate_rate=0.3, seed=seed)
+
+    expected = engine_ranges(decisions, pad_before, pad_after, max_frames)
+    assert kept_ranges_from_decisions(decisions, pad_before, pad_after, max_frames) == expected
+
+
+class _Array:
+    """ Stands in for a torch tensor: ``.cpu().numpy()`` """
+
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _Boxes:
+    def __init__(self, np, classes):
+        self.cls = _Array(np.asarray(classes, dtype=np.float32))
+        self.conf = _Array(np.full(len(classes), 0.9, dtype=np.float32))
+        self.xyxy = _Array(np.tile(np.float32([10, 20, 30, 40]), (len(classes), 1)))
+
+    def __len__(self):
+        return len(self.cls.values)
+
+
+class _Result:
+    def __init__(self, np, classes):
+        self.boxes = _Boxes(np, classes)
+
+
+@pytest.mark.parametrize("stride,pad_before,pad_after,max_frames", CASES)
+def test_recut_from_the_detection_index_matches_the_engine(tmp_path, stride, pad_before, pad_after, max_frames):
+    np = pytest.importorskip("numpy")
+    from detection_index import DetectionIndexWriter, frame_decisions, load_index
+
+    pad_before = stride - 1 if pad_before is None else pad_before
+    pad_after = stride - 1 if pad_after is None else pad_after
+    decisions, refs = sampled_decisions(600, stride, positive_rate=0.1, gate_rate=0.3, seed=stride)
+
+    # The index the engine writes: one row per frame, detections of the frames the detector saw
+    writer = DetectionIndexWriter(str(tmp_path), 30)
+    for index, (positive, ref) in enumerate(zip(decisions, refs)):
+        if ref == index:
+            # Class 1 is never in the filter, so it must not make a frame positive
+            writer.add_detections(index, _Result(np, [0, 1] if positive else [1]))
+        writer.add_frame(ref)
+    writer.close()
+
+    replayed = frame_decisions(load_index(str(tmp_path)), classes=[0])
+    assert replayed == decisions
+    assert (kept_ranges_from_decisions(replayed, pad_before, pad_after, max_frames)
+            == engine_ranges(decisions, pad_before, pad_after, max_frames))
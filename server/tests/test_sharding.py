@@ -0,0 +1,78 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from detection_index import DetectionIndexWriter, load_index, merge_indexes  # noqa: E402
+from sharding import plan_cut_times, shard_ranges  # noqa: E402
+
+
+class _Array:
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _Boxes:
+    def __init__(self, classes):
+        self.cls = _Array(np.asarray(classes, dtype=np.float32))
+        self.conf = _Array(np.full(len(classes), 0.9, dtype=np.float32))
+        self.xyxy = _Array(np.tile(np.float32([10, 20, 30, 40]), (len(classes), 1)))
+
+    def __len__(self):
+        return len(self.cls.values)
+
+
+class _Result:
+    def __init__(self, classes):
+        self.boxes = _Boxes(classes)
+
+
+def write_shard(index_dir, refs, detections):
+    writer = DetectionIndexWriter(str(index_dir), 30)
+    for frame, ref in enumerate(refs):
+        if frame in detections:
+            writer.add_detections(frame, _Result(detections[frame]))
+        writer.add_frame(ref)
+    writer.close()
+
+
+def test_merged_index_numbers_frames_by_what_each_shard_decoded(tmp_path):
+    # The first shard decoded 4 frames (stride 2, the last one skipped)
+    write_shard(tmp_path / "a", [0, 0, 2, -1], {0: [0], 2: [1, 2]})
+    write_shard(tmp_path / "b", [0, -1, 2], {2: [3]})
+
+    meta = merge_indexes([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "merged"), 30)
+    assert meta == {"fps": 30, "frames": 7, "detections": 4}
+
+    merged = load_index(str(tmp_path / "merged"))
+    assert list(merged["frame_ref"]) == [0, 0, 2, -1, 4, -1, 6]
+    assert list(merged["det_frame"]) == [0, 2, 2, 6]
+    assert list(merged["det_cls"]) == [0, 1, 2, 3]
+
+
+def test_ranges_of_the_whole_video_are_split_at_the_shard_boundaries():
+    assert shard_ranges([[2, 5], [6, 9], [12, 14]], [4, 3, 10]) == [
+        [[2, 4]],
+        [[0, 1], [2, 3]],
+        [[0, 2], [5, 7]],
+    ]
+
+
+def test_shards_without_kept_frames_get_no_ranges():
+    assert shard_ranges([[0, 2]], [3, 3]) == [[[0, 2]], []]
+
+
+def test_long_videos_are_cut_into_equal_parts():
+    assert plan_cut_times(3600, 4, min_seconds=600) == [900, 1800, 2700]
+
+
+def test_parts_are_never_shorter_than_the_minimum():
+    assert plan_cut_times(1500, 4, min_seconds=600) == [750]
+    assert plan_cut_times(1000, 4, min_seconds=600) == []
+    assert plan_cut_times(3600, 1, min_seconds=600) == []
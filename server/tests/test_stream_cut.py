@@ -0,0 +1,52 @@
+import pytest
+
+from stream_cut import encoder_arguments, frame_ranges_to_times, plan_parts
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0]
+
+
+def test_frame_ranges_at_a_constant_frame_rate():
+    assert frame_ranges_to_times([(0, 25), (50, 75)], 25.0) == [(0.0, 1.0), (2.0, 3.0)]
+
+
+def test_frame_ranges_use_the_real_frame_timestamps():
+    # Variable frame rate: the third frame arrives late
+    frame_times = [0.0, 0.04, 0.2, 0.24, 0.28]
+    assert frame_ranges_to_times([(1, 3)], 25.0, frame_times) == [(0.04, 0.24)]
+
+
+def test_the_last_range_ends_one_frame_after_the_last_timestamp():
+    frame_times = [0.0, 0.04, 0.08]
+    assert frame_ranges_to_times([(2, 3)], 25.0, frame_times) == [(0.08, pytest.approx(0.12))]
+
+
+def test_copy_starts_at_the_previous_keyframe_and_merges_overlaps():
+    plan = plan_parts([(2.5, 3.0), (3.5, 5.0), (6.0, 7.0)], KEYFRAMES)
+    assert plan == [("copy", 2.0, 5.0), ("copy", 6.0, 7.0)]
+
+
+def test_exact_cut_encodes_only_up_to_the_first_keyframe():
+    plan = plan_parts([(2.5, 5.0), (6.0, 7.0)], KEYFRAMES, exact=True)
+    assert plan == [("encode", 2.5, 4.0), ("copy", 4.0, 5.0), ("copy", 6.0, 7.0)]
+
+
+def test_exact_cut_without_a_keyframe_inside_is_all_encoded():
+    assert plan_parts([(4.5, 5.5)], KEYFRAMES, exact=True) == [("encode", 4.5, 5.5)]
+
+
+def test_encoder_repeats_profile_level_and_sar():
+    arguments = encoder_arguments({
+        "codec_name": "h264", "profile": "High", "level": 41, "pix_fmt": "yuv420p",
+        "width": 1920, "height": 1080, "sample_aspect_ratio": "4:3",
+    })
+    assert arguments == ["-c:v", "libx264", "-profile:v", "high", "-pix_fmt", "yuv420p",
+                         "-level:v", "4.1", "-vf", "setsar=4/3"]
+
+
+@pytest.mark.parametrize("stream", [
+    {"codec_name": "h264", "profile": "Extended", "level": 30},
+    {"codec_name": "mpeg4", "profile": "Simple Profile", "level": 1},
+    {"codec_name": "h264", "profile": "High", "level": -99},
+])
+def test_streams_the_encoder_cannot_repeat(stream):
+    assert encoder_arguments(stream) is None
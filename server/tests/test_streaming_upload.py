@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("multipart")
+
+from streaming_upload import StreamedFile, UploadTooLarge, receive_multipart, receive_raw  # noqa: E402
+
+BOUNDARY = "XyZ"
+
+
+class _Request:
+    """ Just what the receivers use: the headers and the body in chunks. """
+
+    def __init__(self, body, chunk_size, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def multipart_body(video):
+    parts = [
+        b'Content-Disposition: form-data; name="model"\r\n\r\ndiurno',
+        b'Content-Disposition: form-data; name="video"; filename="cam1.mp4"\r\n'
+        b"Content-Type: video/mp4\r\n\r\n" + video,
+        b'Content-Disposition: form-data; name="stride"\r\n\r\n4',
+    ]
+    separator = f"--{BOUNDARY}\r\n".encode()
+    return b"".join(separator + part + b"\r\n" for part in parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_multipart_file_goes_straight_to_the_destination(tmp_path, chunk_size):
+    video = bytes(range(256)) * 40
+    target = StreamedFile(tmp_path / "input.mp4", hashlib.blake2b(digest_size=32), 1 << 20)
+    started = []
+
+    async def on_file_start(streamed, fields):
+        started.append((streamed.filename, fields))
+
+    fields = asyncio.run(receive_multipart(_Request(multipart_body(video), chunk_size), target,
+                                           on_file_start=on_file_start))
+
+    assert fields == {"model": "diurno", "stride": "4"}
+    # Fields sent before the file are known when it starts
+    assert started == [("cam1.mp4", {"model": "diurno"})]
+    assert target.content_type == "video/mp4"
+    assert (tmp_path / "input.mp4").read_bytes() == video
+    assert target.content_hash.hexdigest() == hashlib.blake2b(video, digest_size=32).hexdigest()
+    assert target.stats()["bytes"] == len(video)
+
+
+def test_raw_body_is_the_file(tmp_path):
+    target = StreamedFile(tmp_path / "input.mp4", hashlib.blake2b(digest_size=32), 1 << 20)
+    asyncio.run(receive_raw(_Request(b"x" * 1000, 64, "video/mp4"), target))
+    assert (tmp_path / "input.mp4").read_bytes() == b"x" * 1000
+
+
+def test_uploads_past_the_limit_are_refused(tmp_path):
+    target = StreamedFile(tmp_path / "input.mp4", hashlib.blake2b(digest_size=32), 100)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(receive_raw(_Request(b"x" * 1000, 64, "video/mp4"), target))
@@ -0,0 +1,107 @@
+import importlib
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """ main with its jobs/, cache and database in a temporary directory (the paths are relative). """
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    try:
+        main = importlib.import_module("main")
+        # Without ``with``, the startup event (executor and worker pool) does not run
+        yield main, TestClient(main.app)
+    finally:
+        os.chdir(previous)
+
+
+@pytest.fixture
+def queued_job(api):
+    main, _ = api
+    job = main.JobStatus(f"job-{datetime.now().strftime('%H%M%S%f')}", "cam.mp4",
+                         main.build_parameters("nao", "diurno", 0, "0", 1, None, None, 0.0, "auto"))
+    job.status = "queued"
+    job.queued_at = datetime.now().isoformat()
+    job.content_hash = "content"
+    job.cache_key = main.result_cache_key(job.content_hash, job.parameters)
+    main.register_job(job)
+    (main.JOBS_DIR / job.id).mkdir()
+    (main.JOBS_DIR / job.id / "input.mp4").write_bytes(b"0123456789")
+    return job.id
+
+
+def claim(client):
+    response = client.post("/api/workers/claim", json={"worker_id": "w1", "models": ["diurno"]})
+    return response.json() if response.status_code == 200 else None
+
+
+def drain(client):
+    while claim(client) is not None:
+        pass
+
+
+def test_claim_hands_out_a_lease_once(api, queued_job):
+    main, client = api
+    job = claim(client)
+    assert job["id"] == queued_job
+    assert job["lease"].startswith("w1/")
+    assert job["options"]["calibration_file_path"] is None
+    assert job["calibration"] is None
+    assert main.job_store.get(queued_job)["claimed_by"] == job["lease"]
+    drain(client)
+    assert claim(client) is None
+
+
+def test_heartbeats_and_downloads_need_the_lease(api, queued_job):
+    main, client = api
+    job = claim(client)
+    path = f"/api/workers/jobs/{job['id']}"
+
+    assert client.post(f"{path}/heartbeat", json={"lease": "w1/other"}).status_code == 409
+    reply = client.post(f"{path}/heartbeat", json={"lease": job["lease"], "stats": {"percent": 50}})
+    assert reply.json() == {"id": job["id"], "interrupt": None}
+    assert main.job_store.get(job["id"])["progress"] == 50
+
+    assert client.get(f"{path}/input", params={"lease": "w1/other"}).status_code == 409
+    response = client.get(f"{path}/input", params={"lease": job["lease"]}, headers={"Range": "bytes=4-"})
+    assert response.status_code == 206
+    assert response.content == b"456789"
+    assert client.get(f"{path}/calibration", params={"lease": job["lease"]}).status_code == 404
+
+
+def test_completion_stores_the_output_under_the_worker_settings(api, queued_job):
+    main, client = api
+    job = claim(client)
+    path = f"/api/workers/jobs/{job['id']}"
+    lease = {"lease": job["lease"]}
+
+    assert client.put(f"{path}/files/run.sh", params=lease, content=b"x").status_code == 400
+    assert client.put(f"{path}/files/output.mp4", params=lease, content=b"video").status_code == 200
+    reply = client.post(f"{path}/complete", json=dict(lease, status="completed", settings={"backend": "onnx"}))
+    assert reply.json() == {"id": job["id"], "status": "completed"}
+
+    record = main.job_store.get(job["id"])
+    assert record["status"] == "completed"
+    assert record["claimed_by"] is None
+    expected_key = main.result_cache_key("content", record["parameters"], {"backend": "onnx"})
+    assert record["cache_key"] == expected_key
+    assert (main.RESULT_CACHE_DIR / expected_key / "output.mp4").read_bytes() == b"video"
+    # The lease ended with the job
+    assert client.post(f"{path}/heartbeat", json=lease).status_code == 409
+
+
+def test_completion_without_output_fails_the_job(api, queued_job):
+    main, client = api
+    job = claim(client)
+    reply = client.post(f"/api/workers/jobs/{job['id']}/complete", json={"lease": job["lease"], "status": "completed"})
+    assert reply.json()["status"] == "failed"
+    assert main.job_store.get(job["id"])["error"] == "Arquivo de saída não foi gerado"
@@ -0,0 +1,309 @@
+"""Worker remoto: processa jobs da fila da API em outra máquina.
+
+O worker pede jobs à API (``POST /api/workers/claim``), então nenhum nó de
+processamento precisa ser cadastrado no servidor: basta iniciar mais workers.
+Cada job roda num processo do ``WorkerPool`` com os modelos já carregados.
+Enquanto o job roda, o worker manda um heartbeat com o progresso a cada
+``WORKER_HEARTBEAT_INTERVAL`` segundos; se os heartbeats param (máquina
+desligada, rede fora), a API devolve o job para a fila depois de
+``WORKER_HEARTBEAT_TIMEOUT`` segundos e outro worker o reprocessa.
+
+A entrada e a saída ficam no diretório do job na API. Com ``--jobs-dir``
+(armazenamento compartilhado montado no worker) o engine lê e grava direto
+nesse diretório; sem ele, a entrada é baixada por HTTP (retomando com
+``Range`` se a conexão cair) e a saída e o índice de detecções são enviados
+de volta antes de concluir o job.
+
+Uso: ``python worker.py --api http://api:8000 --concurrency 2``
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional
+
+from inference_backend import INFERENCE_BACKEND, int8_manifest, int8_variant_hash
+from worker_pool import WorkerPool
+
+MODELS_DIR = Path(os.environ.get("MODELS_DIR", "/data/models"))
+HEARTBEAT_INTERVAL = float(os.environ.get("WORKER_HEARTBEAT_INTERVAL", "5"))
+DOWNLOAD_BLOCK = 1024 * 1024  # 1MB por leitura
+DOWNLOAD_ATTEMPTS = 5
+REQUEST_TIMEOUT = 60
+
+
+class LeaseLost(Exception):
+    """O job voltou para a fila ou foi reivindicado por outro worker"""
+
+
+class ApiClient:
+    """Chamadas às rotas ``/api/workers`` (bloqueantes, executadas fora do event loop)"""
+
+    def __init__(self, api_url: str, token: Optional[str] = None):
+        self.api_url = api_url.rstrip("/")
+        self.token = token
+
+    def request(self, method: str, path: str, body: Optional[dict] = None, data=None,
+                headers: Optional[dict] = None, timeout: float = REQUEST_TIMEOUT):
+        headers = dict(headers or {})
+        if self.token:
+            headers["X-Worker-Token"] = self.token
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(self.api_url + path, data=data, headers=headers, method=method)
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                raise LeaseLost(e.read().decode(errors="replace"))
+            raise
+
+    def call(self, method: str, path: str, body: Optional[dict] = None) -> Optional[dict]:
+        """Requisição JSON; None para ``204 No Content``"""
+        with self.request(method, path, body) as response:
+            if response.status == 204:
+                return None
+            return json.load(response)
+
+    def download(self, path: str, target: Path):
+        """Baixa ``path`` para ``target``, continuando de onde um download anterior parou"""
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            offset = target.stat().st_size if target.exists() else 0
+            try:
+                response = self.request("GET", path, headers={"Range": f"bytes={offset}-"} if offset else {})
+            except urllib.error.HTTPError as e:
+                if e.code == 416:
+                    # O arquivo já estava completo
+                    return
+                raise
+            try:
+                with response, open(target, "ab" if response.status == 206 else "wb") as output_file:
+                    shutil.copyfileobj(response, output_file, DOWNLOAD_BLOCK)
+                return
+            except OSError as e:
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    raise
+                print(f"⚠️ Download interrompido em {target.stat().st_size} bytes ({str(e)}), retomando")
+
+    def upload(self, path: str, source: Path):
+        """Envia o arquivo ``source`` como corpo de um PUT"""
+        headers = {"Content-Type": "application/octet-stream", "Content-Length": str(source.stat().st_size)}
+        with open(source, "rb") as input_file:
+            self.request("PUT", path, data=input_file, headers=headers, timeout=REQUEST_TIMEOUT * 10).close()
+
+
+class RemoteWorker:
+    """Loop de reivindicação de jobs e execução de até ``concurrency`` jobs ao mesmo tempo"""
+
+    def __init__(self, client: ApiClient, worker_id: str, models: Dict[str, str], concurrency: int,
+                 jobs_dir: Optional[Path], work_dir: Path, poll_interval: float, batch_size: int, shards: int):
+        self.client = client
+        self.worker_id = worker_id
+        self.models = models
+        self.concurrency = concurrency
+        self.jobs_dir = jobs_dir
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.shards = shards
+        self.pool = WorkerPool(models, concurrency)
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _job_path(self, job: dict) -> str:
+        return f"/api/workers/jobs/{job['id']}"
+
+    def _lease_query(self, job: dict) -> str:
+        return "?lease=" + urllib.parse.quote(job["lease"], safe="")
+
+    def _int8_models(self) -> list:
+        """Modelos com variante INT8 aprovada neste worker (lida a cada pedido: pode ser criada depois)"""
+        int8_models = []
+        for name, weights in self.models.items():
+            manifest = int8_manifest(weights)
+            if manifest is not None and manifest.get("passed"):
+                int8_models.append(name)
+        return int8_models
+
+    def _job_dir(self, job: dict) -> Path:
+        return (self.jobs_dir or self.work_dir) / job["id"]
+
+    async def run(self):
+        self.pool.start()
+        slots = asyncio.Semaphore(self.concurrency)
+        print(f"🛰️ Worker {self.worker_id} aguardando jobs de {self.client.api_url} (modelos: {', '.join(self.models)})")
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    job = await self._call(self.client.call, "POST", "/api/workers/claim",
+                                           {"worker_id": self.worker_id, "models": list(self.models),
+                                            "int8_models": self._int8_models()})
+                except Exception as e:
+                    print(f"⚠️ Erro ao pedir job à API: {str(e)}")
+                    job = None
+                if job is None:
+                    slots.release()
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                task = asyncio.create_task(self.run_job(job))
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            self.pool.stop()
+
+    async def run_job(self, job: dict):
+        """Executa um job mandando heartbeats e informa o resultado à API"""
+        job_id = job["id"]
+        print(f"[Job {job_id}] ▶️ Iniciando (modelo {job['model']}, lease {job['lease']})")
+        stats: dict = {}
+        runner = asyncio.create_task(self.execute(job, stats))
+        status, error = "completed", None
+        try:
+            while not runner.done():
+                await asyncio.wait({runner}, timeout=HEARTBEAT_INTERVAL)
+                if runner.done():
+                    break
+                try:
+                    reply = await self._call(self.client.call, "POST", f"{self._job_path(job)}/heartbeat",
+                                             {"lease": job["lease"], "stats": stats.get("latest")})
+                except LeaseLost:
+                    print(f"[Job {job_id}] ⚠️ Job reatribuído pela API, interrompendo")
+                    runner.cancel()
+                    await asyncio.gather(runner, return_exceptions=True)
+                    return
+                except Exception as e:
+                    # Sem heartbeats por WORKER_HEARTBEAT_TIMEOUT a API recoloca o job na fila
+                    print(f"[Job {job_id}] ⚠️ Erro no heartbeat: {str(e)}")
+                    continue
+                if reply["interrupt"] == "cancel":
+                    print(f"[Job {job_id}] 🛑 Cancelado pelo usuário")
+                    status = "cancelled"
+                    runner.cancel()
+                    await asyncio.gather(runner, return_exceptions=True)
+
+            if status == "completed":
+                try:
+                    runner.result()
+                except Exception as e:
+                    print(f"[Job {job_id}] ❌ Erro durante processamento: {str(e)}")
+                    status, error = "failed", str(e)
+
+            try:
+                await self._call(self.client.call, "POST", f"{self._job_path(job)}/complete",
+                                 {"lease": job["lease"], "status": status, "error": error, "stats": stats.get("latest"),
+                                  "settings": stats.get("settings")})
+                print(f"[Job {job_id}] ✅ Resultado enviado ({status})")
+            except LeaseLost:
+                print(f"[Job {job_id}] ⚠️ Job reatribuído pela API antes da conclusão")
+            except Exception as e:
+                print(f"[Job {job_id}] ⚠️ Erro ao concluir job na API: {str(e)}")
+        finally:
+            if self.jobs_dir is None:
+                shutil.rmtree(self._job_dir(job), ignore_errors=True)
+
+    async def calibration_file(self, job: dict) -> Path:
+        """Baixa o arquivo de calibração do job, guardado pelo hash do conteúdo
+
+        Os mapas de correção ficam ao lado (``calibration/maps``), então jobs com
+        a mesma calibração não baixam o arquivo nem recalculam os mapas.
+        """
+        calibration_dir = self.work_dir / "calibration"
+        calibration_dir.mkdir(parents=True, exist_ok=True)
+        target = calibration_dir / f"{job['calibration']}.yaml"
+        if not target.exists():
+            part_path = calibration_dir / f"{job['calibration']}.{job['id']}.part"
+            await self._call(self.client.download, f"{self._job_path(job)}/calibration{self._lease_query(job)}", part_path)
+            os.replace(part_path, target)
+        return target
+
+    async def execute(self, job: dict, stats: dict):
+        """Baixa a entrada (se preciso), roda o engine no pool e envia os resultados"""
+        job_dir = self._job_dir(job)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        input_path = job_dir / "input.mp4"
+        output_path = job_dir / "output.mp4"
+
+        if self.jobs_dir is None:
+            await self._call(self.client.download, f"{self._job_path(job)}/input{self._lease_query(job)}", input_path)
+        elif not input_path.exists():
+            raise Exception(f"Arquivo de entrada não encontrado no armazenamento compartilhado: {input_path}")
+
+        # batch_size e shards só mudam a velocidade; backend e variante INT8 mudam as
+        # detecções e vão para a API, que os usa na chave do cache
+        options = dict(job["options"], batch_size=self.batch_size)
+        precision = options.get("precision", "fp32")
+        stats["settings"] = {"backend": INFERENCE_BACKEND}
+        if precision == "int8":
+            stats["settings"]["int8"] = int8_variant_hash(self.models[job["model"]])
+        if job.get("calibration"):
+            options["calibration_file_path"] = str(await self.calibration_file(job))
+        await self.pool.submit(
+            job["id"],
+            job["model"] if precision == "fp32" else f"{job['model']}:{precision}",
+            str(job_dir / "process.log"),
+            on_progress=lambda latest: stats.update(latest=latest),
+            video_path=str(input_path),
+            output_video_file_path=str(output_path),
+            index_dir=str(job_dir / "index"),
+            shards=self.shards,
+            weights_path=self.models[job["model"]],
+            **options,
+        )
+
+        if self.jobs_dir is None:
+            # Índice e segmentos antes da saída: a API só confere a saída ao concluir
+            results = sorted((job_dir / "index").glob("*")) + [job_dir / "segments.json", output_path]
+            for path in results:
+                if path.is_file():
+                    name = path.relative_to(job_dir).as_posix()
+                    await self._call(self.client.upload, f"{self._job_path(job)}/files/{name}{self._lease_query(job)}", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker remoto do Cut Media: processa jobs da fila da API")
+    parser.add_argument("--api", help="URL da API", default=os.environ.get("WORKER_API_URL", "http://localhost:8000"))
+    parser.add_argument("--token", help="token das rotas /api/workers", default=os.environ.get("WORKER_TOKEN"))
+    parser.add_argument("--worker-id", help="nome do worker nos logs e no job", default=f"{socket.gethostname()}:{os.getpid()}")
+    parser.add_argument("--models", help="modelos aceitos, separados por vírgula (padrão: todos com pesos no MODELS_DIR)", default="")
+    parser.add_argument("--models-dir", help="diretório com os pesos dos modelos", default=str(MODELS_DIR), type=Path)
+    parser.add_argument("--concurrency", help="jobs ao mesmo tempo (um processo com os modelos por job)", default=1, type=int)
+    parser.add_argument("--jobs-dir", help="diretório de jobs da API montado neste worker (armazenamento compartilhado)", default=None, type=Path)
+    parser.add_argument("--work-dir", help="diretório temporário dos jobs baixados por HTTP", default="worker_jobs", type=Path)
+    parser.add_argument("--poll-interval", help="segundos entre pedidos de job com a fila vazia", default=2.0, type=float)
+    parser.add_argument("--batch", help="frames por chamada do YOLO", default=int(os.environ.get("INFERENCE_BATCH_SIZE", "8")), type=int)
+    parser.add_argument("--shards", help="partes em paralelo para vídeos longos", default=int(os.environ.get("SHARDS_PER_JOB", "1")), type=int)
+    args = parser.parse_args()
+
+    client = ApiClient(args.api, args.token)
+    wanted = {name.strip() for name in args.models.split(",") if name.strip()}
+    models = {}
+    for name, weights_name in client.call("GET", "/api/workers/models").items():
+        weights = args.models_dir / weights_name
+        if wanted and name not in wanted:
+            continue
+        if not weights.exists():
+            print(f"⚠️ Pesos não encontrados para '{name}': {weights}")
+            continue
+        models[name] = str(weights)
+    if not models:
+        raise SystemExit("Nenhum modelo disponível neste worker")
+
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    worker = RemoteWorker(client, args.worker_id, models, max(1, args.concurrency), args.jobs_dir, args.work_dir,
+                          args.poll_interval, args.batch, args.shards)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        print("👋 Worker encerrado (jobs em andamento voltam para a fila após o timeout de heartbeat)")
+
+
+if __name__ == "__main__":
+    main()
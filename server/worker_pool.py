@@ -0,0 +1,228 @@
+"""Pool de processos de longa duração com os modelos YOLO já carregados.
+
+Cada worker importa ``torch``/``ultralytics`` e carrega os pesos de todos os
+modelos uma única vez, na inicialização. Os jobs chegam por uma fila local
+por worker, então o custo de importação e de carregamento dos pesos não é
+pago a cada vídeo.
+
+Cancelar a task que aguarda um job (``submit``) encerra o processo worker
+que o executa e cria outro no lugar, então o slot fica livre na hora (o novo
+worker carrega os modelos antes de pegar o próximo job da sua fila).
+"""
+import asyncio
+import contextlib
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import threading
+import traceback
+from typing import Callable, Dict, Optional
+
+
+def _exit_on_sigterm(signum, frame):
+    # SystemExit roda os blocos finally do engine, que encerram os processos filhos
+    sys.exit(128 + signum)
+
+
+def _worker_main(index: int, models: Dict[str, str], tasks, results):
+    """Loop principal de um processo worker"""
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    import engine
+    from inference_backend import int8_variant_hash
+
+    loaded = {}
+    # Variante INT8 carregada por modelo; uma nova quantização troca o hash
+    int8_variants = {}
+    for name, weights in models.items():
+        if not os.path.exists(weights):
+            print(f"[Worker {index}] ⚠️ Pesos não encontrados para '{name}': {weights}")
+            continue
+        try:
+            loaded[name] = engine.load_model(weights)
+            print(f"[Worker {index}] ✅ Modelo '{name}' carregado")
+        except Exception as e:
+            print(f"[Worker {index}] ❌ Erro ao carregar modelo '{name}': {str(e)}")
+
+    results.put(("ready", None, index))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        job_id, model_name, kwargs, log_path = task
+        results.put(("started", job_id, index))
+
+        try:
+            with open(log_path, "a", buffering=1) as log, \
+                    contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                model = loaded.get(model_name)
+                # "<modelo>:int8" é a variante quantizada, carregada no primeiro job que a usa
+                # e de novo sempre que ela for refeita
+                name, _, precision = model_name.partition(":")
+                if precision == "int8":
+                    variant = int8_variant_hash(models[name])
+                    if variant != int8_variants.get(model_name):
+                        model = None
+                if model is None:
+                    model = loaded[model_name] = engine.load_model(models[name], precision=precision or "fp32")
+                    if precision == "int8":
+                        int8_variants[model_name] = variant
+                engine.process(
+                    model,
+                    progress_callback=lambda stats: results.put(("progress", job_id, stats)),
+                    **kwargs,
+                )
+            results.put(("done", job_id, None))
+        except Exception:
+            results.put(("error", job_id, traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self, index: int, process, tasks, results):
+        self.index = index
+        self.process = process
+        self.tasks = tasks
+        # Fila de resultados própria: encerrar o processo no meio de uma escrita
+        # não corrompe a comunicação com os outros workers
+        self.results = results
+        self.job_id: Optional[str] = None
+        self.retired = False
+
+
+class WorkerPool:
+    """Pool de workers com modelos quentes, usado pelo ``process_video``"""
+
+    def __init__(self, models: Dict[str, str], size: int):
+        self.models = models
+        self.size = size
+        self._ctx = mp.get_context("spawn")
+        self._workers: Dict[int, _Worker] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._progress: Dict[str, Callable[[dict], None]] = {}
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._running = False
+        # Serializa a troca de workers (cancelamento no event loop, morte detectada pelo listener)
+        self._lock = threading.Lock()
+
+    def _spawn(self, index: int) -> _Worker:
+        tasks = self._ctx.Queue()
+        results = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.models, tasks, results),
+            name=f"cut-media-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        worker = _Worker(index, process, tasks, results)
+        threading.Thread(target=self._listen, args=(worker,), name=f"worker-pool-listener-{index}", daemon=True).start()
+        return worker
+
+    def start(self):
+        """Inicia os processos workers (deve ser chamado dentro do event loop)"""
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        self._running = True
+
+        for index in range(self.size):
+            self._workers[index] = self._spawn(index)
+            self._idle.put_nowait(index)
+
+        print(f"🧠 Pool de workers iniciado com {self.size} processo(s)")
+
+    def stop(self):
+        """Encerra os workers"""
+        self._running = False
+        for worker in self._workers.values():
+            worker.tasks.put(None)
+        for worker in self._workers.values():
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers.clear()
+
+    async def submit(self, job_id: str, model_name: str, log_path: str,
+                     on_progress: Optional[Callable[[dict], None]] = None, **kwargs):
+        """Executa um job no primeiro worker livre e aguarda o resultado
+
+        ``on_progress`` é chamado no event loop com as estatísticas do engine
+        (frames processados, fps, ETA...) enquanto o job está rodando.
+        """
+        index = await self._idle.get()
+        worker = self._workers[index]
+        future = self._loop.create_future()
+        self._futures[job_id] = future
+        if on_progress is not None:
+            self._progress[job_id] = on_progress
+        worker.job_id = job_id
+
+        try:
+            worker.tasks.put((job_id, model_name, kwargs, log_path))
+            await future
+        except asyncio.CancelledError:
+            print(f"🛑 Job {job_id} cancelado, encerrando o worker {index}")
+            await self._loop.run_in_executor(None, self._replace, worker)
+            raise
+        finally:
+            self._futures.pop(job_id, None)
+            self._progress.pop(job_id, None)
+            worker.job_id = None
+            self._idle.put_nowait(index)
+
+    def _resolve(self, job_id: str, error: Optional[str]):
+        future = self._futures.get(job_id)
+        if future is None or future.done():
+            return
+        if error:
+            future.set_exception(Exception(error))
+        else:
+            future.set_result(None)
+
+    def _listen(self, worker: _Worker):
+        """Thread que recebe as mensagens de um worker e resolve os futures"""
+        while self._running and not worker.retired:
+            try:
+                kind, job_id, payload = worker.results.get(timeout=1)
+            except queue.Empty:
+                if not worker.process.is_alive():
+                    self._worker_died(worker)
+                continue
+
+            if kind == "ready":
+                print(f"🧠 Worker {payload} pronto")
+            elif kind == "progress":
+                callback = self._progress.get(job_id)
+                if callback is not None:
+                    self._loop.call_soon_threadsafe(callback, payload)
+            elif kind == "done":
+                self._loop.call_soon_threadsafe(self._resolve, job_id, None)
+            elif kind == "error":
+                self._loop.call_soon_threadsafe(self._resolve, job_id, payload)
+
+    def _replace(self, worker: _Worker):
+        """Encerra o processo de ``worker`` e cria outro no mesmo slot"""
+        with self._lock:
+            if worker.retired or not self._running:
+                return
+            worker.retired = True
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._workers[worker.index] = self._spawn(worker.index)
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.kill()
+
+    def _worker_died(self, worker: _Worker):
+        """Recria um worker que morreu e falha o job que estava nele"""
+        if worker.retired or not self._running:
+            return
+        print(f"⚠️ Worker {worker.index} terminou inesperadamente (código {worker.process.exitcode}), recriando")
+        if worker.job_id:
+            self._loop.call_soon_threadsafe(
+                self._resolve, worker.job_id, f"Worker terminou inesperadamente (código {worker.process.exitcode})"
+            )
+        self._replace(worker)